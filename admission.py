@@ -0,0 +1,187 @@
+import itertools
+import queue
+import threading
+import time
+
+
+class QueueFull(Exception):
+    """Raised when a lane is at its depth limit; callers should answer 429"""
+
+    def __init__(self, depth, retry_after):
+        self.depth = depth
+        self.retry_after = retry_after
+        super().__init__(f"Admission queue full ({depth} waiting)")
+
+
+class Job:
+    """One generation, shared by every request that asked for the same prompt
+
+    The worker appends Ollama chunks as they arrive; any number of waiters
+    can replay them with stream() (late joiners start from the first
+    chunk) or block for the combined result with result().
+
+    A job stops early, closing the Ollama stream so the model stops
+    generating, once its `deadline` (absolute time) passes or every
+    waiter has left; what was generated so far is kept and `partial` is
+    set.
+    """
+
+    def __init__(self, fn, key, deadline=None):
+        self.fn = fn
+        self.key = key
+        self.deadline = deadline
+        self.waiters = 1
+        self.chunks = []
+        self.done = False
+        self.partial = False
+        self.cancelled = False
+        self.error = None
+        self._cond = threading.Condition()
+
+    def expired(self):
+        return self.cancelled or (self.deadline is not None and time.time() >= self.deadline)
+
+    def run(self):
+        chunks = None
+        try:
+            if self.expired():
+                raise TimeoutError("Cancelled while queued" if self.cancelled else "Deadline passed while queued")
+            chunks = self.fn()
+            for chunk in chunks:
+                with self._cond:
+                    self.chunks.append(chunk)
+                    self._cond.notify_all()
+                if self.expired() and not chunk.get('done'):
+                    self.partial = True
+                    break
+        except Exception as e:
+            self.error = e
+        finally:
+            if chunks is not None and hasattr(chunks, 'close'):
+                chunks.close()
+            with self._cond:
+                self.done = True
+                self._cond.notify_all()
+
+    def leave(self):
+        """A waiter is gone (e.g. its client disconnected); cancel if it was the last"""
+        with self._cond:
+            self.waiters -= 1
+            if self.waiters <= 0 and not self.done:
+                self.cancelled = True
+
+    def stream(self, heartbeat=None):
+        """Yield every chunk of the generation, waiting for new ones
+
+        With `heartbeat` (seconds), None is yielded whenever that long
+        passes without a new chunk, so the caller can keep its client
+        connection alive (and notice when it is gone).
+        """
+        idx = 0
+        while True:
+            with self._cond:
+                if idx >= len(self.chunks) and not self.done:
+                    self._cond.wait(heartbeat)
+                new = self.chunks[idx:]
+                finished = self.done
+            if not new and not finished:
+                yield None
+                continue
+            for chunk in new:
+                yield chunk
+            idx += len(new)
+            if finished and idx >= len(self.chunks):
+                if self.error is not None:
+                    raise self.error
+                return
+
+    def result(self):
+        """Block until done; return the full text and the final 'done' chunk"""
+        tokens = []
+        final = {}
+        for chunk in self.stream():
+            tokens.append(chunk.get('response', ''))
+            if chunk.get('done'):
+                final = chunk
+        return ''.join(tokens), final
+
+
+class AdmissionQueue:
+    """Bounded, prioritized work queue in front of the local Ollama
+
+    `workers` generations run at once (match it to OLLAMA_NUM_PARALLEL);
+    everything else waits in the queue, interactive requests ahead of
+    batch ones. A lane that already has its limit of queued jobs rejects
+    new ones with QueueFull so the frontend can back off or try another
+    replica. Requests whose key matches a queued or running job join it
+    instead of starting a second identical generation.
+    """
+
+    PRIORITIES = {'interactive': 0, 'batch': 1}
+
+    def __init__(self, workers=1, max_depth=8, batch_depth=4, retry_after=5):
+        self.workers = workers
+        self.limits = {'interactive': max_depth, 'batch': batch_depth}
+        self.retry_after = retry_after
+        self.depth = {'interactive': 0, 'batch': 0}
+        self.running = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self._jobs = {}  # key -> Job, while queued or running
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        for _ in range(workers):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def submit(self, fn, key=None, priority='interactive', deadline=None):
+        """Queue `fn` (a callable returning an iterator of Ollama chunks)
+
+        `deadline` is the absolute time after which the generation is
+        cut short (or skipped if it has not started yet).
+        """
+        lane = priority if priority in self.PRIORITIES else 'interactive'
+        with self._lock:
+            job = self._jobs.get(key) if key else None
+            if job is not None and not job.cancelled:
+                with job._cond:
+                    job.waiters += 1
+                    # The shared job runs until the most patient waiter's deadline
+                    job.deadline = None if deadline is None or job.deadline is None else max(job.deadline, deadline)
+                self.coalesced += 1
+                return job
+            if self.depth[lane] >= self.limits[lane]:
+                self.rejected += 1
+                raise QueueFull(self.depth[lane], self.retry_after)
+            job = Job(fn, key, deadline)
+            if key:
+                self._jobs[key] = job
+            self.depth[lane] += 1
+            self._queue.put((self.PRIORITIES[lane], next(self._seq), lane, job))
+        return job
+
+    def _work(self):
+        while True:
+            _, _, lane, job = self._queue.get()
+            with self._lock:
+                self.depth[lane] -= 1
+                self.running += 1
+            try:
+                job.run()
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    if job.key and self._jobs.get(job.key) is job:
+                        del self._jobs[job.key]
+
+    def stats(self):
+        """Counters for /health and heartbeats"""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'running': self.running,
+                'queued': dict(self.depth),
+                'limits': dict(self.limits),
+                'coalesced': self.coalesced,
+                'rejected': self.rejected
+            }
@@ -0,0 +1,216 @@
+"""Combine Stage 2 reviews into one verdict on the answers
+
+Reviewers label answers "Answer_<n>" by their 1-based position in the
+answers list and never rank their own, so every ranking is partial.
+Only answers a review actually ranked count for it:
+
+  - Borda: each review gives its answers (m-1-pos)/(m-1) points, averaged
+    over the reviews that ranked the answer
+  - Condorcet: the answer preferred to each other answer by a strict
+    majority of the reviews that ranked both
+  - Kendall tau: mean rank correlation between pairs of reviews over the
+    answers they both ranked (None when no two reviews share two answers)
+  - top agreement: share of the reviews that compared the Borda winner
+    with another answer and put it first
+
+When the reviews did not compare every pair of answers (a review plan
+gave each reviewer a subset, see review_plan.py), Borda means depend on
+which answers happened to share a review. The winner is then the answer
+with the highest Bradley-Terry strength fitted on the pairwise wins, and
+a Condorcet winner only has to beat the others through the pairs some
+review compared.
+
+`decide` turns these into the Stage 3 policy: return the winning answer
+as is, have the chairman lightly edit it, or run the full synthesis.
+"""
+import re
+from itertools import combinations
+
+
+def answer_index(label):
+    """'Answer_3' -> 2, or None if the label has no number"""
+    match = re.search(r'(\d+)', str(label))
+    return int(match.group(1)) - 1 if match else None
+
+
+def ranked_indices(review, n_answers):
+    """A review's ranking as answer indices, unknown and repeated labels dropped"""
+    indices = []
+    for label in review.get('ranking', []):
+        idx = answer_index(label)
+        if idx is not None and 0 <= idx < n_answers and idx not in indices:
+            indices.append(idx)
+    return indices
+
+
+def borda_points(n_answers, reviews):
+    """Summed Borda points per answer (m - pos for a ranking of m answers)"""
+    points = [0.0] * n_answers
+    for review in reviews:
+        ranking = ranked_indices(review, n_answers)
+        for pos, idx in enumerate(ranking):
+            points[idx] += len(ranking) - pos
+    return points
+
+
+def borda_means(n_answers, rankings):
+    """Normalized Borda score per answer, None for answers no review compared"""
+    totals = [0.0] * n_answers
+    counts = [0] * n_answers
+    for ranking in rankings:
+        if len(ranking) < 2:
+            continue
+        for pos, idx in enumerate(ranking):
+            totals[idx] += (len(ranking) - 1 - pos) / (len(ranking) - 1)
+            counts[idx] += 1
+    return [totals[i] / counts[i] if counts[i] else None for i in range(n_answers)]
+
+
+def pairwise_wins(n_answers, rankings):
+    """wins[i][j]: reviews that ranked answer i above answer j"""
+    wins = [[0] * n_answers for _ in range(n_answers)]
+    for ranking in rankings:
+        for pos, better in enumerate(ranking):
+            for worse in ranking[pos + 1:]:
+                wins[better][worse] += 1
+    return wins
+
+
+def condorcet_winner(n_answers, rankings, partial=False):
+    """Index of the answer beating every other head to head, or None
+
+    With `partial`, pairs no review compared are skipped: the winner is
+    the answer no other beats that beats every other ranked answer
+    directly or through a chain of head-to-head wins.
+    """
+    wins = pairwise_wins(n_answers, rankings)
+    if not partial:
+        for i in range(n_answers):
+            if n_answers > 1 and all(wins[i][j] > wins[j][i] for j in range(n_answers) if j != i):
+                return i
+        return None
+    ranked = {idx for ranking in rankings for idx in ranking}
+    for i in ranked:
+        if any(wins[j][i] >= wins[i][j] for j in ranked if j != i and wins[i][j] + wins[j][i]):
+            continue
+        reached = {i}
+        frontier = [i]
+        while frontier:
+            a = frontier.pop()
+            for b in ranked - reached:
+                if wins[a][b] > wins[b][a]:
+                    reached.add(b)
+                    frontier.append(b)
+        if len(ranked) > 1 and reached == ranked:
+            return i
+    return None
+
+
+def bradley_terry(n_answers, wins, iterations=100, prior=0.5):
+    """Strength per answer fitted on pairwise wins (MM algorithm)
+
+    Each answer also gets `prior` wins and losses against a virtual
+    answer of strength 1, which keeps strengths finite for unbeaten
+    answers and comparable across disconnected comparisons.
+    """
+    strength = [1.0] * n_answers
+    for _ in range(iterations):
+        updated = []
+        for i in range(n_answers):
+            won = prior + sum(wins[i])
+            games = 2 * prior / (strength[i] + 1.0) + sum(
+                (wins[i][j] + wins[j][i]) / (strength[i] + strength[j])
+                for j in range(n_answers) if j != i and wins[i][j] + wins[j][i]
+            )
+            updated.append(won / games)
+        strength = updated
+    return strength
+
+
+def kendall_tau(first, second):
+    """Rank correlation (-1..1) of two rankings over their common answers"""
+    common = [idx for idx in first if idx in second]
+    if len(common) < 2:
+        return None
+    position = {idx: pos for pos, idx in enumerate(second)}
+    concordant = discordant = 0
+    for a, b in combinations(common, 2):
+        # `common` keeps the first ranking's order, so a is above b there
+        if position[a] < position[b]:
+            concordant += 1
+        else:
+            discordant += 1
+    return (concordant - discordant) / (concordant + discordant)
+
+
+def mean_scores(n_answers, reviews):
+    """Mean 0-10 review score per answer (structured reviews), None if unscored"""
+    totals = [0.0] * n_answers
+    counts = [0] * n_answers
+    for review in reviews:
+        for label, score in (review.get('scores') or {}).items():
+            idx = answer_index(label)
+            if idx is not None and 0 <= idx < n_answers:
+                totals[idx] += score
+                counts[idx] += 1
+    return [totals[i] / counts[i] if counts[i] else None for i in range(n_answers)]
+
+
+def aggregate(answers, reviews):
+    """Agreement statistics of the reviews over `answers`"""
+    n = len(answers)
+    rankings = [ranked_indices(review, n) for review in reviews]
+    comparing = [r for r in rankings if len(r) >= 2]
+    borda = borda_means(n, rankings)
+    scores = mean_scores(n, reviews)
+    taus = [t for t in (kendall_tau(a, b) for a, b in combinations(comparing, 2)) if t is not None]
+
+    wins = pairwise_wins(n, comparing)
+    ranked = [i for i in range(n) if borda[i] is not None]
+    pairs = list(combinations(ranked, 2))
+    compared = sum(1 for i, j in pairs if wins[i][j] + wins[j][i])
+    partial = compared < len(pairs)
+    strength = bradley_terry(n, wins)
+
+    winner = None
+    if ranked and partial:
+        winner = max(ranked, key=lambda i: (strength[i], scores[i] or 0))
+    elif ranked:
+        winner = max(ranked, key=lambda i: (borda[i], scores[i] or 0))
+    condorcet = condorcet_winner(n, comparing, partial)
+    # Reviews that saw the winner next to another answer, and how many put it first
+    saw_winner = [r for r in comparing if winner in r]
+    top_votes = sum(1 for r in saw_winner if r[0] == winner)
+
+    def member(idx):
+        return None if idx is None else answers[idx].get('member_id')
+
+    return {
+        'winner': member(winner),
+        'winner_index': winner,
+        'condorcet_winner': member(condorcet),
+        'top_agreement': top_votes / len(saw_winner) if saw_winner else 0.0,
+        'kendall_tau': sum(taus) / len(taus) if taus else None,
+        'reviews_compared': len(saw_winner),
+        'pair_coverage': compared / len(pairs) if pairs else 0.0,
+        'borda': {member(i): borda[i] for i in range(n)},
+        'strength': {member(i): strength[i] for i in range(n)},
+        'mean_scores': {member(i): scores[i] for i in range(n)}
+    }
+
+
+def decide(stats, direct_threshold=None, light_edit_threshold=None, min_reviews=2):
+    """Stage 3 policy: 'direct', 'light_edit' or 'synthesize'
+
+    Consensus needs a Condorcet winner that is also the Borda winner, at
+    least `min_reviews` reviews that compared it with another answer,
+    and a top agreement of at least the threshold (None disables a mode).
+    """
+    if (stats['winner'] is None or stats['condorcet_winner'] != stats['winner']
+            or stats['reviews_compared'] < min_reviews):
+        return 'synthesize'
+    if direct_threshold is not None and stats['top_agreement'] >= direct_threshold:
+        return 'direct'
+    if light_edit_threshold is not None and stats['top_agreement'] >= light_edit_threshold:
+        return 'light_edit'
+    return 'synthesize'
@@ -1,204 +1,926 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, send_file
 from flask_cors import CORS
-import requests
 import config
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from backends import Backend, NodeBusy, get_backend
+from batch import BatchRun, load_queries
+from cluster_state import ClusterState, StatusChannel
+from hedging import FirstTokenTracker, HedgedCall
+import aggregation
+import cascade
+import local_nodes
+from metrics import METRICS, CONTENT_TYPE, register_cache_metrics
+from registry import MemberRegistry
+from review_plan import MemberSpeeds, ReviewPlan
+from ollama_client import to_ndjson
+from response_cache import ResponseCache, make_key
+from session_store import SessionStore
+import functools
+import json
+import os
+import queue
+import re
+import threading
 import time
+import uuid
 
 app = Flask(__name__)
 CORS(app)
 
-# Use configuration from config.py
-COUNCIL_MEMBERS = config.COUNCIL_MEMBERS
-CHAIRMAN_URL = config.CHAIRMAN_URL
+# Wire format of calls to remote nodes (see wire.py)
+Backend.BLOB_REFS = config.WIRE_BLOB_REFS
+Backend.COMPRESS_MIN_BYTES = config.WIRE_COMPRESS_MIN_BYTES
+Backend.SENT_TTL = config.WIRE_SENT_TTL
 
-print("\n" + "="*60)
-print("FRONTEND STARTING WITH CONFIGURATION:")
-print("="*60)
-config.print_config()
-print("\n")
+# Use configuration from config.py; in single-node mode (or for nodes whose
+# URL is "local") members and chairman run in this process instead
+COUNCIL_MEMBERS = [
+    dict(member, url=local_nodes.host_member(member)) if local_nodes.is_local(member['url']) else member
+    for member in config.COUNCIL_MEMBERS
+]
+CHAIRMAN_URL = local_nodes.host_chairman() if local_nodes.is_local(config.CHAIRMAN_URL) else config.CHAIRMAN_URL
+
+# One executor shared by every session and health check, instead of fresh
+# thread pools per request
+executor = ThreadPoolExecutor(max_workers=config.ORCHESTRATOR_WORKERS)
+
+# Whole-session cache in front of the full three-stage pipeline
+SESSION_CACHE = None
+if config.CACHE_ENABLED:
+    SESSION_CACHE = ResponseCache(
+        config.CACHE_PATH,
+        max_entries=config.CACHE_MAX_ENTRIES,
+        max_bytes=config.CACHE_MAX_BYTES,
+        ttl=config.CACHE_TTL
+    )
+
+# Near-duplicate query cache over query embeddings (numpy is only
+# imported when it is enabled)
+SEMANTIC_CACHE = None
+if config.SEMANTIC_CACHE_ENABLED:
+    from semantic_cache import SemanticCache, embed
+    SEMANTIC_CACHE = SemanticCache(
+        threshold=config.SEMANTIC_THRESHOLD,
+        max_entries=config.SEMANTIC_MAX_ENTRIES,
+        approx_threshold=config.SEMANTIC_APPROX_THRESHOLD
+    )
+
+# Live status: nodes push their health (members with their /register
+# heartbeat, the chairman to /heartbeat), the rest is probed in the
+# background; changes and session progress go out on /events
+CHANNEL = StatusChannel()
+CLUSTER = ClusterState(
+    stale_after=config.HEALTH_STALE_AFTER,
+    on_change=lambda url: CHANNEL.publish({'type': 'cluster', 'data': cluster_health()})
+)
+
+# Append-only log of every session, for status polling and resuming
+SESSION_STORE = SessionStore(config.SESSION_DIR, config.SESSION_MAX_AGE) if config.SESSIONS_ENABLED else None
+
+# Recorded sessions with a run in this process; a recorded session that is
+# neither finished nor in here was interrupted (e.g. by a restart)
+RUNNING_SESSIONS = set()
+RUNNING_LOCK = threading.Lock()
+
+# Councils running in this process, which a draining server waits for,
+# and whether it is draining (set by begin_drain(), see serve.py)
+ACTIVE_COUNCILS = 0
+ACTIVE_LOCK = threading.Lock()
+DRAINING = threading.Event()
+
+def backend_for(node_id, url):
+    """Shared keep-alive session + concurrency limit for a member/chairman"""
+    return get_backend(node_id, url, config.BACKEND_MAX_CONCURRENCY)
+
+# Time to first token of each member replica, which sets its hedge delay
+FIRST_TOKEN = FirstTokenTracker()
+
+# Answer time of each member, which sets its share of the reviews (review_plan.py)
+MEMBER_SPEEDS = MemberSpeeds()
+
+# Council membership: config.py members are static replicas, more can
+# register themselves at runtime (see /register)
+REGISTRY = MemberRegistry(
+    heartbeat_ttl=config.HEARTBEAT_TTL,
+    max_concurrent=config.BACKEND_MAX_CONCURRENCY
+)
+for member in COUNCIL_MEMBERS:
+    REGISTRY.register(member['id'], member['model'], member['url'], static=True)
+
+# Prometheus-style metrics, scraped from /metrics
+NODE_REQUEST_SECONDS = METRICS.histogram(
+    'council_node_request_seconds', "Wall time of one call to a member or the chairman", ['node', 'stage'])
+NODE_ERRORS = METRICS.counter(
+    'council_node_errors_total', "Failed calls to a member or the chairman", ['node', 'stage', 'kind'])
+STAGE_SECONDS = METRICS.histogram(
+    'council_stage_seconds', "Duration of each council stage, and of the whole session", ['stage'])
+SESSIONS = METRICS.counter(
+    'council_sessions_total', "Council sessions by outcome", ['outcome'])
+STAGE3_DECISIONS = METRICS.counter(
+    'council_stage3_decisions_total', "How Stage 3 produced the final answer", ['decision'])
+CASCADES = METRICS.counter(
+    'council_cascades_total', "Cascade sessions answered by one member or escalated to the council", ['outcome'])
+HEDGES = METRICS.counter(
+    'council_hedges_total', "Hedged member calls ('fired') and those the hedge won ('won')", ['member', 'result'])
+METRICS.gauge('council_replica_in_flight', "Calls in flight to each member replica", ['member', 'url'],
+              fn=lambda: {(('member', r['member_id']), ('url', r['url'])): r['in_flight'] for r in REGISTRY.snapshot()})
+METRICS.gauge('council_replica_latency_ewma_seconds', "Latency EWMA of each member replica", ['member', 'url'],
+              fn=lambda: {(('member', r['member_id']), ('url', r['url'])): r['latency_ewma'] or 0.0
+                          for r in REGISTRY.snapshot()})
+METRICS.gauge('council_sessions_running', "Councils running in this process",
+              fn=lambda: {(): ACTIVE_COUNCILS})
+register_cache_metrics({'session': SESSION_CACHE, 'semantic': SEMANTIC_CACHE})
+
+# Routes through which nodes keep their status; everything else POSTed starts new work
+NODE_ENDPOINTS = ('register_member', 'deregister_member', 'heartbeat')
+
+@app.before_request
+def refuse_while_draining():
+    """New councils get a 503 once the server is shutting down"""
+    if DRAINING.is_set() and request.method == 'POST' and request.endpoint not in NODE_ENDPOINTS:
+        return jsonify({'error': 'Frontend is shutting down'}), 503, {'Retry-After': '5'}
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/health_check', methods=['GET'])
-def health_check():
-    """Check health of all services in parallel"""
+def cluster_health():
+    """Health of every member replica and of the chairman, from the cached cluster state"""
     results = {
         'council_members': [],
-        'chairman': None
+        'chairman': CLUSTER.get(CHAIRMAN_URL),
+        'cache': SESSION_CACHE.stats() if SESSION_CACHE else None,
+        'semantic_cache': SEMANTIC_CACHE.stats() if SEMANTIC_CACHE else None
     }
+    # Grouped per member slot: a slot is healthy if any of its replicas is
+    checks = {}
+    for replica in REGISTRY.replicas():
+        checks.setdefault(replica.member_id, []).append(dict(CLUSTER.get(replica.url), url=replica.url))
+    for member in REGISTRY.members():
+        replicas = checks.get(member['id'], [])
+        healthy = [r for r in replicas if r['status'] == 'healthy']
+        results['council_members'].append({
+            'id': member['id'],
+            'status': 'healthy' if healthy else (replicas[0]['status'] if replicas else 'unreachable'),
+            'data': healthy[0]['data'] if healthy else None,
+            'replicas': replicas
+        })
+    return results
+
+def probe(url, backend, replica=None):
+    """Fetch a node's /health into the cluster state (for nodes that don't push)"""
+    try:
+        response = backend.get("/health", timeout=5)
+        data = response.json()
+        if response.status_code == 200:
+            CLUSTER.update(url, 'healthy', data, source='probe')
+        else:
+            CLUSTER.update(url, 'unhealthy', data, source='probe', error=data.get('error'))
+        if replica is not None:
+            # Static replicas don't heartbeat: this is how we learn their model state
+            replica.model_state = data.get('model_state')
+    except Exception as e:
+        CLUSTER.update(url, 'unreachable', source='probe', error=str(e))
+
+def probe_loop():
+    """Probe, every HEALTH_PROBE_INTERVAL seconds, the nodes whose pushed status went stale"""
+    while True:
+        futures = [
+            executor.submit(probe, replica.url, replica.backend, replica)
+            for replica in REGISTRY.replicas() if CLUSTER.is_stale(replica.url)
+        ]
+        if CLUSTER.is_stale(CHAIRMAN_URL):
+            futures.append(executor.submit(probe, CHAIRMAN_URL, backend_for('chairman', CHAIRMAN_URL)))
+        wait(futures, timeout=10)
+        time.sleep(config.HEALTH_PROBE_INTERVAL)
+
+def start_background_tasks():
+    """Keep in-process models warm and node health fresh; run once per serving process"""
+    print("\n" + "="*60)
+    print("FRONTEND STARTING WITH CONFIGURATION:")
+    print("="*60)
+    config.print_config()
+    print("\n")
+    local_nodes.start()
+    threading.Thread(target=probe_loop, daemon=True).start()
+
+def begin_drain():
+    """Refuse new councils (503) and end the /events streams; running councils finish"""
+    DRAINING.set()
+    CHANNEL.publish({'type': 'shutdown'})
+
+def in_flight():
+    """Councils still running (including background sessions and batches)"""
+    return ACTIVE_COUNCILS
+
+def counted(fn):
+    """Count the calls of `fn` in progress in ACTIVE_COUNCILS"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        global ACTIVE_COUNCILS
+        with ACTIVE_LOCK:
+            ACTIVE_COUNCILS += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with ACTIVE_LOCK:
+                ACTIVE_COUNCILS -= 1
+    return wrapper
+
+def node_status(health):
+    return 'healthy' if health.get('status', 'healthy') == 'healthy' else 'unhealthy'
+
+@app.route('/health_check', methods=['GET'])
+def health_check():
+    """Cluster health as last pushed by the nodes (or probed, for those that don't push)"""
+    return jsonify(cluster_health())
+
+@app.route('/heartbeat', methods=['POST'])
+def heartbeat():
+    """Status pushed by a node that is not a member replica (the chairman)"""
+    data = request.json or {}
+    health = data.get('health') or {}
+    if data.get('role') != 'chairman':
+        return jsonify({'error': 'Members heartbeat through /register'}), 400
+    # Stored under the URL we call the chairman on, whatever address it reports
+    CLUSTER.update(CHAIRMAN_URL, node_status(health), health, error=health.get('error'))
+    return jsonify({'status': 'ok', 'stale_after': CLUSTER.stale_after})
+
+@app.route('/events', methods=['GET'])
+def status_events():
+    """Server-sent events: cluster health changes and progress of every session
+
+    Events: 'cluster' (the /health_check payload, on connect and whenever
+    a node's status, model state or load changes), 'session' (a session
+    started or ended) and 'progress' (a session's stage started or a node
+    delivered its result). The stream ends with 'shutdown' when the
+    server drains; browsers reconnect on their own.
+
+    Each stream holds a request thread while it is open, so there are at
+    most config.MAX_EVENT_STREAMS of them; beyond that this answers 503.
+    """
+    subscription = CHANNEL.subscribe(limit=config.MAX_EVENT_STREAMS)
+    if subscription is None:
+        return jsonify({'error': 'Too many event streams, poll /health_check'}), 503, {'Retry-After': '30'}
+
+    def generate():
+        try:
+            yield sse({'type': 'cluster', 'data': cluster_health()})
+            with RUNNING_LOCK:
+                running = sorted(RUNNING_SESSIONS)
+            yield sse({'type': 'sessions', 'running': running})
+            while not DRAINING.is_set():
+                # Keep-alives every few seconds also free the slot of a
+                # closed tab soon: the server only notices it on a write
+                try:
+                    yield sse(subscription.get(timeout=5))
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+        finally:
+            CHANNEL.unsubscribe(subscription)
     
-    def check_member(member):
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Also when the stream never started (the generator's finally then never runs)
+    response.call_on_close(lambda: CHANNEL.unsubscribe(subscription))
+    return response
+
+def sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of the frontend's metrics"""
+    return Response(METRICS.render(), content_type=CONTENT_TYPE)
+
+@app.route('/register', methods=['POST'])
+def register_member():
+    """Register a member replica, or refresh it (members heartbeat through here)"""
+    data = request.json or {}
+    member_id = data.get('member_id')
+    model = data.get('model')
+    url = data.get('url')
+    
+    if not member_id or not model or not url:
+        return jsonify({'error': 'member_id, model and url are required'}), 400
+    
+    REGISTRY.register(member_id, model, url.rstrip('/'), reported=data)
+    health = data.get('health') or {}
+    CLUSTER.update(url.rstrip('/'), node_status(health), health or None, error=health.get('error'))
+    return jsonify({'status': 'registered', 'heartbeat_ttl': REGISTRY.heartbeat_ttl})
+
+@app.route('/deregister', methods=['POST'])
+def deregister_member():
+    """Remove a member replica (sent by members on shutdown)"""
+    data = request.json or {}
+    url = data.get('url', '')
+    if not REGISTRY.deregister(url.rstrip('/')):
+        return jsonify({'error': 'Unknown replica'}), 404
+    CLUSTER.forget(url.rstrip('/'))
+    CHANNEL.publish({'type': 'cluster', 'data': cluster_health()})
+    return jsonify({'status': 'deregistered'})
+
+@app.route('/members', methods=['GET'])
+def list_members():
+    """Current council slots and every known replica with its load"""
+    return jsonify({
+        'members': REGISTRY.members(),
+        'replicas': REGISTRY.snapshot()
+    })
+
+class CouncilError(Exception):
+    """Raised when the council cannot produce a result (e.g. no answers)"""
+
+
+def answers_payload(answers, reviewer=None, assigned=None):
+    """Answers as nodes read them
+
+    A reviewer's own answer is sent without its text, and so are answers
+    not among the `assigned` indices of its review plan (marked
+    'assigned': False), so they keep their positions and IDs.
+    """
+    payload = []
+    for idx, ans in enumerate(answers):
+        # The review prompt skips the reviewer's own answer
+        skipped = ans['member_id'] == reviewer or (assigned is not None and idx not in assigned)
+        entry = {'member_id': ans['member_id'], 'model': ans.get('model'), 'answer': '' if skipped else ans.get('answer', '')}
+        if assigned is not None and idx not in assigned:
+            entry['assigned'] = False
+        payload.append(entry)
+    return payload
+
+
+def reviews_payload(reviews):
+    """What the chairman reads from a review (not the full review text)"""
+    return [
+        {
+            'member_id': rev.get('member_id'),
+            'ranking': rev.get('ranking', []),
+            'scores': rev.get('scores', {}),
+            'reasoning': rev.get('reasoning', '')
+        }
+        for rev in reviews
+    ]
+
+
+def post_to_node(backend, path, payload, timeout, stage, emit=None, deadline=None,
+                 cancelled=None, on_first_token=None):
+    """Call a member/chairman endpoint and return its JSON result
+
+    Remote nodes are POSTed to; in-process ones (single-node mode) are
+    called directly with the same payload. The node is always asked to stream: each token is forwarded to `emit`
+    (if given) as a 'token' event and the final 'done' line is returned as
+    the result. With a `deadline` (absolute time), the node gets the
+    remaining budget and is given up on DEADLINE_GRACE seconds after it.
+    The call is also abandoned (returning None) once `cancelled()` is
+    true, or when `on_first_token()` returns False (a lost hedge race).
+    """
+    started = time.time()
+    try:
+        result = _post_to_node(backend, path, payload, timeout, stage, emit, deadline, cancelled, on_first_token)
+    except NodeBusy:
+        NODE_ERRORS.inc(node=backend.node_id, stage=stage, kind='busy')
+        raise
+    except Exception:
+        NODE_ERRORS.inc(node=backend.node_id, stage=stage, kind='exception')
+        raise
+    NODE_REQUEST_SECONDS.observe(time.time() - started, node=backend.node_id, stage=stage)
+    if result is None:
+        kind = 'cancelled' if cancelled is not None and cancelled() else 'bad_response'
+        NODE_ERRORS.inc(node=backend.node_id, stage=stage, kind=kind)
+    return result
+
+
+def _post_to_node(backend, path, payload, timeout, stage, emit, deadline, cancelled, on_first_token):
+    payload = dict(payload, stream=True)
+    if deadline is not None:
+        payload['deadline'] = max(deadline - time.time(), 0)
+        timeout = payload['deadline'] + config.DEADLINE_GRACE
+
+    events = backend.events(path, payload, timeout, deadline)
+    first_token = True
+    try:
+        for event in events:
+            # Members also send heartbeat events, so these checks run even
+            # while a call waits in a member's queue
+            if cancelled is not None and cancelled():
+                return None
+            if deadline is not None and time.time() > deadline + config.DEADLINE_GRACE:
+                print(f"  ✗ {backend.node_id} missed its deadline")
+                return None
+            if 'error' in event:
+                print(f"  ✗ Stream error from {backend.node_id}: {event['error']}")
+                return None
+            if event.get('done'):
+                event.pop('done')
+                return event
+            if 'token' in event:
+                if first_token:
+                    first_token = False
+                    if on_first_token is not None and not on_first_token():
+                        return None
+                if emit is not None:
+                    emit({'type': 'token', 'stage': stage, 'node': backend.node_id, 'token': event['token']})
+    finally:
+        # Closing the stream is what makes the node stop generating
+        events.close()
+    return None
+
+
+def call_replica(member, replica, path, payload, stage, emit, deadline, cancelled, exclude):
+    """Call one replica, hedging on another replica of the member if it is slow to start
+
+    The hedge is sent once the replica has gone without a first token for
+    its HEDGE_PERCENTILE time to first token. The first replica to start
+    answering wins; the other call is cancelled.
+    """
+    def attempt(target, on_first_token, attempt_cancelled):
+        started = time.time()
+
+        def first_token():
+            FIRST_TOKEN.observe(target.url, time.time() - started)
+            return on_first_token()
+
+        return post_to_node(
+            target.backend, path, payload, 300, stage, emit, deadline,
+            lambda: attempt_cancelled() or (cancelled is not None and cancelled()),
+            first_token
+        )
+
+    # Nothing to hedge on with a single replica
+    if not config.HEDGE_ENABLED or len(REGISTRY.replicas(member['id'])) < 2:
+        return attempt(replica, lambda: True, lambda: False)
+
+    delay = FIRST_TOKEN.percentile(replica.url, config.HEDGE_PERCENTILE, config.HEDGE_MIN_SAMPLES)
+    delay = max(config.HEDGE_DEFAULT_DELAY if delay is None else delay, config.HEDGE_MIN_DELAY)
+
+    def pick_backup():
+        if deadline is not None and time.time() >= deadline:
+            return None
+        return REGISTRY.pick(member['id'], exclude=set(exclude) | {replica.url})
+
+    def on_hedge(backup):
+        print(f"  ⇉ No first token from {replica.url} after {delay:.1f}s, hedging on {backup.url}")
+        HEDGES.inc(member=member['id'], result='fired')
+
+    call = HedgedCall(attempt, executor)
+    winner, outcome = call.run(replica, delay, pick_backup, on_hedge)
+    if winner is not None:
+        if winner is not replica:
+            HEDGES.inc(member=member['id'], result='won')
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    # No attempt produced a token: take any result, else report the first call's error
+    for started in call.started:
+        if outcome[started.url] is not None and not isinstance(outcome[started.url], Exception):
+            return outcome[started.url]
+    if isinstance(outcome[replica.url], Exception):
+        raise outcome[replica.url]
+    return None
+
+
+def call_member(member, path, payload, stage, emit=None, deadline=None, cancelled=None):
+    """Send a member call to its least-loaded replica
+
+    A replica answering 429 is skipped for this call; once every replica
+    is busy we wait for the advertised Retry-After and start over, up to
+    config.BUSY_RETRIES rounds (and not past the deadline).
+    """
+    for _ in range(config.BUSY_RETRIES + 1):
+        busy = set()
+        retry_after = None
+        while True:
+            replica = REGISTRY.pick(member['id'], exclude=busy)
+            if replica is None:
+                break
+            print(f"  → Requesting {path[1:]} from {member['id']} ({replica.url})...")
+            try:
+                return call_replica(member, replica, path, payload, stage, emit, deadline, cancelled, busy)
+            except NodeBusy as e:
+                print(f"  … {e}")
+                busy.add(replica.url)
+                retry_after = e.retry_after if retry_after is None else min(retry_after, e.retry_after)
+        if not busy:
+            print(f"  ✗ No live replica for {member['id']}")
+            return None
+        if deadline is not None and time.time() + retry_after >= deadline:
+            print(f"  ✗ {member['id']} stays busy past the deadline")
+            return None
+        time.sleep(retry_after)
+    return None
+
+
+@counted
+def run_council(query, emit=None, use_cache=True, priority='interactive', record=None, resume=None):
+    """Run the three council stages and return the full session result
+
+    Stages are pipelined rather than separated by hard barriers: reviews
+    start once config.REVIEW_QUORUM answers are in (or REVIEW_WAIT seconds
+    after the first answer), and each member reviews as soon as its own
+    answer is done. The chairman starts once SYNTHESIS_QUORUM reviews are
+    in (or SYNTHESIS_WAIT seconds after the first review). Each stage also
+    has a deadline (ANSWER/REVIEW/SYNTHESIS_DEADLINE): nodes cut their
+    generation there, and the session goes on with the results in hand.
+
+    `emit`, if given, receives progress events (stage starts, tokens and
+    per-node results) as they happen. With `use_cache` False, both the
+    session cache and the members'/chairman's caches are bypassed.
+    `priority` selects the members' admission lane ('interactive'/'batch').
+    
+    `record(event, **fields)`, if given, is told each stage start and each
+    answer, review and synthesis the session keeps (see session_store.py).
+    `resume` is a recorded session's state: its answers, reviews and
+    synthesis are reused and only the missing ones are generated.
+
+    With config.CASCADE_ENABLED, one member answers first and the council
+    only convenes if a verifier is not confident in it (see cascade.py).
+    """
+    def notify(event):
+        if emit is not None:
+            emit(event)
+        if record is not None and event['type'] == 'stage':
+            record('stage', stage=event['stage'])
+    
+    def keep(kind, result):
+        """Add an answer or review to the session (in the order reviews index answers)"""
+        (answers if kind == 'answer' else reviews).append(result)
+        if kind == 'review':
+            plan.observe(result, len(answers))
+        if record is not None:
+            record(kind, data=result)
+
+    print(f"\n{'='*60}")
+    print(f"NEW QUERY: {query}")
+    print(f"{'='*60}\n")
+    
+    members = REGISTRY.members()
+    if not members:
+        SESSIONS.inc(outcome='failed')
+        raise CouncilError('No council members registered')
+    
+    # A bypassed (fresh) run still refreshes the stored session
+    # Both caches only answer for the same council (member and chairman models)
+    council_models = ",".join(sorted(m['model'] for m in members) + [config.CHAIRMAN_MODEL])
+    session_key = None
+    if SESSION_CACHE is not None:
+        session_key = make_key('session', council_models, query)
+        hit = SESSION_CACHE.get(session_key) if use_cache else None
+        if hit is not None:
+            print("✓ Served from session cache\n")
+            SESSIONS.inc(outcome='cached')
+            return dict(hit, cached=True)
+    
+    query_vector = None
+    if SEMANTIC_CACHE is not None:
         try:
-            response = requests.get(f"{member['url']}/health", timeout=5)
-            if response.status_code == 200:
-                return {
-                    'id': member['id'],
-                    'status': 'healthy',
-                    'data': response.json()
-                }
-            else:
-                return {
-                    'id': member['id'],
-                    'status': 'unhealthy'
-                }
+            query_vector = embed(config.OLLAMA_HOST, config.EMBEDDING_MODEL, query)
         except Exception as e:
-            return {
-                'id': member['id'],
-                'status': 'unreachable',
-                'error': str(e)
-            }
+            print(f"  ✗ Embedding failed, semantic cache skipped: {e}")
+        if query_vector is not None and use_cache:
+            match = SEMANTIC_CACHE.lookup(query_vector, council_models)
+            if match:
+                hit, matched_query, similarity = match
+                print(f"✓ Served from semantic cache (similarity {similarity:.3f} to: {matched_query})\n")
+                SESSIONS.inc(outcome='semantic')
+                return dict(hit, cached=True, semantic_match={
+                    'query': matched_query,
+                    'similarity': similarity
+                })
+    
+    start_time = time.time()
+    answer_deadline = start_time + config.ANSWER_DEADLINE if config.ANSWER_DEADLINE else None
+    review_deadline = None
+    # Set when the session is over, so calls still running are abandoned
+    session_done = threading.Event()
+    review_quorum = min(config.REVIEW_QUORUM or len(members), len(members))
+    synthesis_quorum = min(config.SYNTHESIS_QUORUM or len(members), len(members))
+    keep_late = config.LATE_RESULTS == 'append'
+    
+    # ============================================
+    # Stage 1: Collect answers in PARALLEL
+    # ============================================
+    print("STAGE 1: Collecting answers from council members (PARALLEL)...")
+    notify({'type': 'stage', 'stage': 1})
     
-    def check_chairman():
+    def get_answer(member):
+        started = time.time()
         try:
-            response = requests.get(f"{CHAIRMAN_URL}/health", timeout=5)
-            if response.status_code == 200:
-                return {
-                    'status': 'healthy',
-                    'data': response.json()
-                }
+            answer = call_member(
+                member, "/answer",
+                {'query': query, 'no_cache': not use_cache, 'priority': priority}, 1, emit,
+                answer_deadline, session_done.is_set
+            )
+            if answer and answer.get('partial') and not answer.get('answer', '').strip():
+                print(f"  ✗ No answer from {member['id']} before the deadline")
+                return None
+            if answer:
+                if not answer.get('cached') and not answer.get('partial'):
+                    MEMBER_SPEEDS.observe(member['id'], time.time() - started)
+                print(f"  ✓ Received answer from {member['id']}")
+                notify({'type': 'result', 'stage': 1, 'node': member['id'], 'data': answer})
+                return answer
             else:
-                return {'status': 'unhealthy'}
+                print(f"  ✗ Bad response from {member['id']}")
+                return None
         except Exception as e:
-            return {
-                'status': 'unreachable',
-                'error': str(e)
-            }
+            print(f"  ✗ Error from {member['id']}: {e}")
+            return None
     
-    # Parallel health checks
-    with ThreadPoolExecutor(max_workers=len(COUNCIL_MEMBERS) + 1) as executor:
-        # Submit all member checks
-        member_futures = {executor.submit(check_member, member): member for member in COUNCIL_MEMBERS}
-        chairman_future = executor.submit(check_chairman)
-        
-        # Collect member results
-        for future in as_completed(member_futures):
-            results['council_members'].append(future.result())
-        
-        # Get chairman result
-        results['chairman'] = chairman_future.result()
+    # ============================================
+    # Stage 2: Get reviews, pipelined with Stage 1
+    # ============================================
+    def get_review(member, answers_to_review, assigned):
+        payload = {'query': query, 'answers': answers_payload(answers_to_review, member['id'], assigned), 'no_cache': not use_cache, 'priority': priority}
+        # Lets the member continue from its own answer's Ollama context (kv_context.py)
+        own = [ans for ans in answers_to_review if ans['member_id'] == member['id'] and ans.get('context_id')]
+        if own:
+            payload['context_id'] = own[0]['context_id']
+        try:
+            review = call_member(
+                member, "/review", payload, 2, emit,
+                review_deadline, session_done.is_set
+            )
+            if review and review.get('partial') and not review.get('ranking'):
+                print(f"  ✗ No review from {member['id']} before the deadline")
+                return None
+            if review and review.get('review_status') == 'invalid':
+                # Nothing usable to tell the chairman, even after the member's repair attempt
+                print(f"  ✗ Unusable review from {member['id']}")
+                return None
+            if review:
+                print(f"  ✓ Received review from {member['id']}")
+                notify({'type': 'result', 'stage': 2, 'node': member['id'], 'data': review})
+                return review
+            else:
+                print(f"  ✗ Bad response from {member['id']}")
+                return None
+        except Exception as e:
+            print(f"  ✗ Error from {member['id']}: {e}")
+            return None
     
-    return jsonify(results)
+    # A resumed session starts from its recorded answers and reviews
+    answers = list(resume['answers']) if resume else []
+    reviews = list(resume['reviews']) if resume else []
+    reviewed = {rev['member_id'] for rev in reviews}
+    answered = [member for member in members if any(ans['member_id'] == member['id'] for ans in answers)]
+    review_snapshot = None  # answers in hand when the review quorum was reached
+    # Which answers each member reviews, so Stage 2 does not grow as n² (review_plan.py)
+    member_ids = [member['id'] for member in members]
+    plan = ReviewPlan(config.REVIEW_PLAN, member_ids, len(members), config.REVIEWS_PER_ANSWER,
+                      MEMBER_SPEEDS.weights(member_ids), config.REVIEW_PLAN_FULL_UP_TO)
+    for rev in reviews:
+        plan.add(rev, len(answers))
+    first_answer_at = start_time if answers else None
+    first_review_at = start_time if reviews else None
+    if resume:
+        print(f"Resuming with {len(answers)} answers and {len(reviews)} reviews already done\n")
 
-@app.route('/submit_query', methods=['POST'])
-def submit_query():
-    """Handle the full council workflow with parallelization"""
-    try:
-        data = request.json
-        query = data.get('query', '')
-        
-        if not query:
-            return jsonify({'error': 'No query provided'}), 400
-        
-        print(f"\n{'='*60}")
-        print(f"NEW QUERY: {query}")
-        print(f"{'='*60}\n")
-        
-        start_time = time.time()
-        
-        # ============================================
-        # Stage 1: Collect answers in PARALLEL
-        # ============================================
-        print("STAGE 1: Collecting answers from council members (PARALLEL)...")
-        
-        def get_answer(member):
+    # Cleared when a node failed or a stage went on without every result
+    # (quorum, deadline): such a session is returned but not cached
+    complete = True
+
+    def finish(result):
+        for stage, seconds in result['timing'].items():
+            STAGE_SECONDS.observe(seconds, stage=stage)
+        SESSIONS.inc(outcome='error' if 'error' in result['stage3_synthesis'] else 'complete')
+        parts = result['stage1_answers'] + result['stage2_reviews'] + [result['stage3_synthesis']]
+        if 'error' not in result['stage3_synthesis'] and complete and not any(part.get('partial') for part in parts):
+            if session_key:
+                SESSION_CACHE.put(session_key, result)
+            if query_vector is not None:
+                SEMANTIC_CACHE.add(query_vector, query, result, council_models)
+        return result
+
+    # ============================================
+    # Cascade: one member answers, the council only if it is not verified
+    # ============================================
+    cascade_info = None
+    if config.CASCADE_ENABLED and not resume:
+        answerer, verifier = cascade.pick_members(
+            members, MEMBER_SPEEDS.weights([m['id'] for m in members]),
+            config.CASCADE_MEMBER, config.CASCADE_VERIFIER)
+        print(f"CASCADE: {answerer['id']} answers, {verifier['id']} verifies")
+        answer = get_answer(answerer)
+        answered.append(answerer)
+        complete = answer is not None
+        answer_time = time.time() - start_time
+        verification = None
+        if answer:
+            keep('answer', answer)
+            first_answer_at = time.time()
             try:
-                print(f"  → Requesting answer from {member['id']}...")
-                response = requests.post(
-                    f"{member['url']}/answer",
-                    json={'query': query},
-                    timeout=300
+                verification = call_member(
+                    verifier, "/verify",
+                    {'query': query, 'answer': answer['answer'], 'no_cache': not use_cache, 'priority': priority},
+                    'verify', None, answer_deadline, session_done.is_set
                 )
-                if response.status_code == 200:
-                    answer = response.json()
-                    print(f"  ✓ Received answer from {member['id']}")
-                    return answer
-                else:
-                    print(f"  ✗ Bad response from {member['id']}")
-                    return None
             except Exception as e:
-                print(f"  ✗ Error from {member['id']}: {e}")
-                return None
-        
-        answers = []
-        with ThreadPoolExecutor(max_workers=len(COUNCIL_MEMBERS)) as executor:
-            future_to_member = {executor.submit(get_answer, member): member for member in COUNCIL_MEMBERS}
+                print(f"  ✗ Verification by {verifier['id']} failed: {e}")
+        confidence = (verification or {}).get('confidence')
+        escalated = confidence is None or confidence < config.CASCADE_THRESHOLD
+        path = [f"{answerer['id']} answered" if answer else f"{answerer['id']} failed to answer"]
+        if answer:
+            path.append(f"{verifier['id']} verified with confidence {confidence:.2f}" if confidence is not None
+                        else f"{verifier['id']} could not verify")
+        path.append('escalated to the council' if escalated else 'answered without the council')
+        cascade_info = {
+            'member': answerer['id'],
+            'verifier': verifier['id'],
+            'confidence': confidence,
+            'threshold': config.CASCADE_THRESHOLD,
+            'issues': (verification or {}).get('issues', ''),
+            'escalated': escalated,
+            'path': path
+        }
+        CASCADES.inc(outcome='escalated' if escalated else 'answered')
+        print(f"  {' → '.join(path)}\n")
+        notify({'type': 'cascade', 'data': cascade_info})
+        if record is not None:
+            record('cascade', data=cascade_info)
+
+        if not escalated:
+            chairman_result = {
+                'role': 'chairman',
+                'model': answer.get('model'),
+                'final_answer': answer['answer'],
+                'mode': 'cascade',
+                'source': 'cascade',
+                'cascade_member': answerer['id'],
+                'confidence': confidence
+            }
+            if record is not None:
+                record('synthesis', data=chairman_result)
+            notify({'type': 'result', 'stage': 3, 'node': 'chairman', 'data': chairman_result})
+            session_done.set()
+            total_time = time.time() - start_time
+            return finish({
+                'query': query,
+                'stage1_answers': answers,
+                'stage2_reviews': [],
+                'stage3_synthesis': chairman_result,
+                'cascade': cascade_info,
+                'timing': {
+                    'total': total_time,
+                    'stage1': answer_time,
+                    'stage2': total_time - answer_time,
+                    'stage3': 0.0
+                }
+            })
+    
+    def answers_for_review():
+        return list(answers) if keep_late else list(review_snapshot)
+    
+    def start_review(member):
+        if member['id'] not in reviewed:
+            to_review = answers_for_review()
+            assigned = plan.assign(member['id'], to_review)
+            pending[executor.submit(get_review, member, to_review, set(assigned))] = ('review', member)
+    
+    pending = {
+        executor.submit(get_answer, member): ('answer', member)
+        for member in members if member not in answered
+    }
+    # With recorded results the quorums are checked before waiting on anything
+    check_now = bool(answers)
+    try:
+        while pending or check_now:
+            deadline = None
+            if review_snapshot is None:
+                if first_answer_at is not None and config.REVIEW_WAIT is not None:
+                    deadline = first_answer_at + config.REVIEW_WAIT
+                stage_deadline = answer_deadline
+            else:
+                if first_review_at is not None and config.SYNTHESIS_WAIT is not None:
+                    deadline = first_review_at + config.SYNTHESIS_WAIT
+                stage_deadline = review_deadline
+            # Past the stage deadline (plus grace for partial results) we stop waiting
+            cutoff = None if stage_deadline is None else stage_deadline + config.DEADLINE_GRACE
+            wake_at = min([t for t in (deadline, cutoff) if t is not None], default=None)
+            timeout = None if wake_at is None else max(0, wake_at - time.time())
             
-            for future in as_completed(future_to_member):
+            if check_now:
+                check_now = False
+                timeout = 0
+            done = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)[0] if pending else set()
+            for future in done:
+                kind, member = pending.pop(future)
                 result = future.result()
-                if result:
-                    answers.append(result)
-        
-        if not answers:
-            return jsonify({'error': 'No answers received from council'}), 500
-        
-        stage1_time = time.time() - start_time
-        print(f"\nStage 1 complete: {len(answers)} answers in {stage1_time:.1f}s\n")
-        
-        # ============================================
-        # Stage 2: Get reviews in PARALLEL
-        # ============================================
-        print("STAGE 2: Collecting reviews (PARALLEL)...")
-        
-        def get_review(member):
-            try:
-                print(f"  → Requesting review from {member['id']}...")
-                response = requests.post(
-                    f"{member['url']}/review",
-                    json={'query': query, 'answers': answers},
-                    timeout=300
-                )
-                if response.status_code == 200:
-                    review = response.json()
-                    print(f"  ✓ Received review from {member['id']}")
-                    return review
-                else:
-                    print(f"  ✗ Bad response from {member['id']}")
-                    return None
-            except Exception as e:
-                print(f"  ✗ Error from {member['id']}: {e}")
-                return None
-        
-        reviews = []
-        with ThreadPoolExecutor(max_workers=len(COUNCIL_MEMBERS)) as executor:
-            future_to_member = {executor.submit(get_review, member): member for member in COUNCIL_MEMBERS}
+                if not result:
+                    complete = False
+                if kind == 'answer':
+                    answered.append(member)
+                    if result:
+                        if first_answer_at is None:
+                            first_answer_at = time.time()
+                        if review_snapshot is None or keep_late:
+                            keep('answer', result)
+                        else:
+                            print(f"  ✗ Dropping late answer from {member['id']}")
+                    if review_snapshot is not None:
+                        # Stage 2 already running: this member reviews now that its box is free
+                        start_review(member)
+                elif result:
+                    if first_review_at is None:
+                        first_review_at = time.time()
+                    keep('review', result)
             
-            for future in as_completed(future_to_member):
-                result = future.result()
-                if result:
-                    reviews.append(result)
+            deadline_passed = deadline is not None and time.time() >= deadline
+            cutoff_passed = cutoff is not None and time.time() >= cutoff
+            
+            if review_snapshot is None:
+                answers_left = any(kind == 'answer' for kind, _ in pending.values())
+                if len(answers) >= review_quorum or not answers_left or (deadline_passed and answers) or cutoff_passed:
+                    if not answers:
+                        SESSIONS.inc(outcome='failed')
+                        raise CouncilError('No answers received from council')
+                    if answers_left:
+                        complete = False
+                    if cutoff_passed and answers_left:
+                        print(f"\nAnswer deadline reached, going on with {len(answers)} answers")
+                    review_snapshot = list(answers)
+                    if config.REVIEW_DEADLINE:
+                        review_deadline = time.time() + config.REVIEW_DEADLINE
+                    stage1_time = time.time() - start_time
+                    print(f"\nStage 1 quorum reached: {len(answers)} answers in {stage1_time:.1f}s\n")
+                    print(f"STAGE 2: Collecting reviews (PIPELINED, {plan.mode} review plan)...")
+                    notify({'type': 'stage', 'stage': 2})
+                    for member in answered:
+                        start_review(member)
+            elif len(reviews) >= synthesis_quorum or not pending or (deadline_passed and reviews):
+                complete = complete and not pending
+                break
+            elif cutoff_passed:
+                print(f"\nReview deadline reached, going on with {len(reviews)} reviews")
+                complete = False
+                break
         
         stage2_time = time.time() - start_time - stage1_time
-        print(f"\nStage 2 complete: {len(reviews)} reviews in {stage2_time:.1f}s\n")
+        print(f"\nStage 2 quorum reached: {len(reviews)} reviews in {stage2_time:.1f}s\n")
         
         # ============================================
         # Stage 3: Get chairman synthesis
         # ============================================
         print("STAGE 3: Getting chairman synthesis...")
-        try:
-            print(f"  → Requesting synthesis from chairman...")
-            chairman_response = requests.post(
-                f"{CHAIRMAN_URL}/synthesize",
-                json={
+        notify({'type': 'stage', 'stage': 3})
+        # When the reviews agree on a best answer the chairman is skipped, or
+        # only asked to polish that answer
+        stats = aggregation.aggregate(answers, reviews)
+        decision = aggregation.decide(
+            stats, config.CONSENSUS_DIRECT, config.CONSENSUS_LIGHT_EDIT, config.CONSENSUS_MIN_REVIEWS)
+        print(f"  Reviews: winner {stats['winner']}, top agreement {stats['top_agreement']:.2f} → {decision}")
+        stored = resume.get('synthesis') if resume else None
+        if stored and 'error' in stored:
+            stored = None
+        if stored is None:
+            STAGE3_DECISIONS.inc(decision=decision)
+        if stored is not None:
+            chairman_result = stored
+            print(f"  ✓ Synthesis already recorded")
+        elif decision == 'direct':
+            best = answers[stats['winner_index']]
+            chairman_result = {
+                'role': 'chairman',
+                'model': best.get('model'),
+                'final_answer': best['answer'],
+                'mode': 'direct',
+                'source': 'consensus',
+                'consensus_member': best['member_id']
+            }
+            print(f"  ✓ Returning {best['member_id']}'s answer as is")
+        else:
+            try:
+                print(f"  → Requesting {'light edit' if decision == 'light_edit' else 'synthesis'} from chairman...")
+                payload = {
                     'query': query,
-                    'answers': answers,
-                    'reviews': reviews
-                },
-                timeout=400
-            )
+                    'answers': answers_payload(answers),
+                    'reviews': reviews_payload(reviews),
+                    'no_cache': not use_cache,
+                    'priority': priority
+                }
+                if decision == 'light_edit':
+                    payload.update(mode='light_edit', winner=stats['winner'])
+                chairman_result = post_to_node(
+                    backend_for('chairman', CHAIRMAN_URL), "/synthesize", payload,
+                    400, 3, emit,
+                    time.time() + config.SYNTHESIS_DEADLINE if config.SYNTHESIS_DEADLINE else None
+                )
             
-            if chairman_response.status_code == 200:
-                chairman_result = chairman_response.json()
-                print(f"  ✓ Synthesis complete")
-            else:
-                chairman_result = {'error': 'Chairman synthesis failed'}
-                print(f"  ✗ Synthesis failed")
-        except Exception as e:
-            chairman_result = {'error': str(e)}
-            print(f"  ✗ Error: {e}")
-        
+                if chairman_result:
+                    print(f"  ✓ Synthesis complete")
+                else:
+                    chairman_result = {'error': 'Chairman synthesis failed'}
+                    print(f"  ✗ Synthesis failed")
+            except Exception as e:
+                chairman_result = {'error': str(e)}
+                print(f"  ✗ Error: {e}")
+        if record is not None and stored is None:
+            record('synthesis', data=chairman_result)
+        notify({'type': 'result', 'stage': 3, 'node': 'chairman', 'data': chairman_result})
+    
         total_time = time.time() - start_time
         print(f"\n{'='*60}")
         print(f"COUNCIL WORKFLOW COMPLETE in {total_time:.1f}s")
@@ -206,23 +928,336 @@ def submit_query():
         print(f"  Stage 2 (reviews): {stage2_time:.1f}s")
         print(f"  Stage 3 (synthesis): {total_time - stage1_time - stage2_time:.1f}s")
         print(f"{'='*60}\n")
+    
+        # Late results that finished while the chairman worked are kept for display
+        if keep_late:
+            for future, (kind, member) in list(pending.items()):
+                if future.done() and future.result():
+                    keep(kind, future.result())
+    finally:
+        # Calls that never started are not worth running any more, and
+        # running ones are abandoned (their nodes stop generating)
+        session_done.set()
+        for future in pending:
+            future.cancel()
+    
+    result = {
+        'query': query,
+        'stage1_answers': answers,
+        'stage2_reviews': reviews,
+        'stage3_synthesis': chairman_result,
+        'aggregation': dict(stats, decision=decision),
+        'review_plan': plan.summary(answers),
+        'cascade': cascade_info,
+        'timing': {
+            'total': total_time,
+            'stage1': stage1_time,
+            'stage2': stage2_time,
+            'stage3': total_time - stage1_time - stage2_time
+        }
+    }
+    return finish(result)
+
+def new_session(query, use_cache=True, priority='interactive'):
+    """Record a new session; returns its id (None with sessions disabled)"""
+    if SESSION_STORE is None:
+        return None
+    return SESSION_STORE.create(query, use_cache=use_cache, priority=priority)
+
+
+def run_session(session_id, query, emit=None, use_cache=True, priority='interactive', resume=None):
+    """run_council for a recorded session (or an unrecorded one if session_id is None)
+
+    Every stage result is appended to the session as it completes, then
+    'complete', or 'error' if the session failed or the chairman did
+    (a resume then only redoes the synthesis). Stage starts and node
+    results also go out as 'progress' events on /events.
+    """
+    if session_id is None:
+        return run_council(query, emit, use_cache, priority)
+    record = SESSION_STORE.recorder(session_id)
+    
+    def progress(event):
+        if event['type'] != 'token':
+            CHANNEL.publish({'type': 'progress', 'session_id': session_id, 'event': event['type'],
+                             'stage': event.get('stage'), 'node': event.get('node')})
+        if emit is not None:
+            emit(event)
+    
+    with RUNNING_LOCK:
+        RUNNING_SESSIONS.add(session_id)
+    CHANNEL.publish({'type': 'session', 'session_id': session_id, 'status': 'running'})
+    status = 'error'
+    try:
+        result = dict(run_council(query, progress, use_cache, priority, record, resume), session_id=session_id)
+        if 'error' in result['stage3_synthesis']:
+            record('error', error=result['stage3_synthesis']['error'])
+        else:
+            record('complete', result=result)
+            status = 'complete'
+        return result
+    except Exception as e:
+        record('error', error=str(e))
+        raise
+    finally:
+        with RUNNING_LOCK:
+            RUNNING_SESSIONS.discard(session_id)
+        CHANNEL.publish({'type': 'session', 'session_id': session_id, 'status': status})
+
+
+def start_session(session_id, query, use_cache=True, priority='interactive', resume=None):
+    """Run a recorded session in the background"""
+    def worker():
+        try:
+            run_session(session_id, query, use_cache=use_cache, priority=priority, resume=resume)
+        except Exception as e:
+            print(f"ERROR in session {session_id}: {e}")
+    
+    with RUNNING_LOCK:
+        RUNNING_SESSIONS.add(session_id)
+    threading.Thread(target=worker, daemon=True).start()
+
+
+def session_state(session_id):
+    """Recorded state of a session, with 'interrupted' for dead runs"""
+    state = SESSION_STORE.load(session_id) if SESSION_STORE is not None else None
+    if state is not None and state['status'] == 'running':
+        with RUNNING_LOCK:
+            if session_id not in RUNNING_SESSIONS:
+                state['status'] = 'interrupted'
+    return state
+
+
+@app.route('/submit_query', methods=['POST'])
+def submit_query():
+    """Handle the full council workflow with parallelization"""
+    session_id = None
+    try:
+        data = request.json
+        query = data.get('query', '')
         
-        return jsonify({
-            'query': query,
-            'stage1_answers': answers,
-            'stage2_reviews': reviews,
-            'stage3_synthesis': chairman_result,
-            'timing': {
-                'total': total_time,
-                'stage1': stage1_time,
-                'stage2': stage2_time,
-                'stage3': total_time - stage1_time - stage2_time
-            }
-        })
+        if not query:
+            return jsonify({'error': 'No query provided'}), 400
+        
+        use_cache = not data.get('no_cache')
+        session_id = new_session(query, use_cache)
+        return jsonify(run_session(session_id, query, use_cache=use_cache))
         
     except Exception as e:
         print(f"ERROR: {e}")
-        return jsonify({'error': str(e)}), 500
+        return jsonify({'error': str(e), 'session_id': session_id}), 500
+
+@app.route('/submit_query_stream', methods=['POST'])
+def submit_query_stream():
+    """Same workflow as /submit_query, streamed as NDJSON events
+
+    Events: 'session' (the session id, first), 'stage' (a stage starts),
+    'token' (one token from a node), 'result' (a node finished), then
+    'complete' with the same payload /submit_query returns, or 'error'.
+    The session keeps running if the client disconnects; its result can
+    then be fetched from /sessions/<id>/result.
+    """
+    data = request.json or {}
+    query = data.get('query', '')
+    
+    if not query:
+        return jsonify({'error': 'No query provided'}), 400
+    
+    use_cache = not data.get('no_cache')
+    session_id = new_session(query, use_cache)
+    events = queue.Queue()
+    if session_id is not None:
+        events.put({'type': 'session', 'session_id': session_id})
+    
+    def worker():
+        try:
+            result = run_session(session_id, query, emit=events.put, use_cache=use_cache)
+            events.put({'type': 'complete', 'data': result})
+        except Exception as e:
+            print(f"ERROR: {e}")
+            events.put({'type': 'error', 'error': str(e)})
+    
+    def generate():
+        threading.Thread(target=worker, daemon=True).start()
+        while True:
+            event = events.get()
+            yield to_ndjson(event)
+            if event['type'] in ('complete', 'error'):
+                break
+    
+    return Response(generate(), mimetype='application/x-ndjson', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/sessions', methods=['POST'])
+def submit_session():
+    """Start a council session in the background and return its id at once
+
+    Poll /sessions/<id> for progress and /sessions/<id>/result for the
+    results so far.
+    """
+    if SESSION_STORE is None:
+        return jsonify({'error': 'Sessions are disabled'}), 404
+    data = request.json or {}
+    query = data.get('query', '')
+    
+    if not query:
+        return jsonify({'error': 'No query provided'}), 400
+    
+    use_cache = not data.get('no_cache')
+    session_id = new_session(query, use_cache)
+    start_session(session_id, query, use_cache)
+    return jsonify({
+        'session_id': session_id,
+        'status_url': f"/sessions/{session_id}",
+        'result_url': f"/sessions/{session_id}/result"
+    }), 202
+
+@app.route('/sessions/<session_id>', methods=['GET'])
+def session_status(session_id):
+    """Progress of a session: running, complete, error or interrupted"""
+    state = session_state(session_id)
+    if state is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    return jsonify({
+        'session_id': session_id,
+        'query': state['query'],
+        'status': state['status'],
+        'stage': state['stage'],
+        'answers': len(state['answers']),
+        'reviews': len(state['reviews']),
+        'synthesis': state['synthesis'] is not None and 'error' not in state['synthesis'],
+        'error': state['error'],
+        'created': state['created'],
+        'updated': state['updated']
+    })
+
+@app.route('/sessions/<session_id>/result', methods=['GET'])
+def session_result(session_id):
+    """Full result of a complete session, else the stage results so far"""
+    state = session_state(session_id)
+    if state is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    if state['status'] == 'complete':
+        return jsonify(dict(state['result'], status='complete'))
+    return jsonify({
+        'session_id': session_id,
+        'query': state['query'],
+        'status': state['status'],
+        'partial': True,
+        'stage1_answers': state['answers'],
+        'stage2_reviews': state['reviews'],
+        'stage3_synthesis': state['synthesis'],
+        'error': state['error']
+    })
+
+@app.route('/sessions/<session_id>/resume', methods=['POST'])
+def resume_session(session_id):
+    """Finish an interrupted or failed session from its last completed results"""
+    state = session_state(session_id)
+    if state is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    if state['status'] == 'complete':
+        return jsonify(dict(state['result'], status='complete'))
+    with RUNNING_LOCK:
+        if state['status'] == 'running' or session_id in RUNNING_SESSIONS:
+            return jsonify({'error': 'Session is still running', 'session_id': session_id}), 409
+        RUNNING_SESSIONS.add(session_id)
+    
+    SESSION_STORE.append(session_id, 'resumed')
+    options = state['options']
+    start_session(session_id, state['query'], options.get('use_cache', True),
+                  options.get('priority', 'interactive'), resume=state)
+    return jsonify({
+        'session_id': session_id,
+        'resumed_from': {'answers': len(state['answers']), 'reviews': len(state['reviews'])},
+        'status_url': f"/sessions/{session_id}",
+        'result_url': f"/sessions/{session_id}/result"
+    }), 202
+
+# Batch runs started through /submit_batch, by id
+BATCHES = {}
+BATCHES_LOCK = threading.Lock()
+
+@app.route('/submit_batch', methods=['POST'])
+def submit_batch():
+    """Start a batch run over a JSONL file of queries (upload as 'file' or raw body)
+
+    Passing an existing ?batch_id= without a file resumes that batch from
+    its checkpoint (already answered queries are skipped).
+    """
+    multipart = (request.content_type or '').startswith('multipart/form-data')
+    raw = b'' if multipart else request.get_data()
+    batch_id = request.args.get('batch_id') or (multipart and request.form.get('batch_id')) or uuid.uuid4().hex[:12]
+    if not re.fullmatch(r'[A-Za-z0-9_-]+', batch_id):
+        return jsonify({'error': 'Invalid batch_id'}), 400
+    
+    # Held from the 'already running' check until the run is marked started,
+    # so two submits of one batch_id cannot both start it
+    with BATCHES_LOCK:
+        run = BATCHES.get(batch_id)
+        if run is not None and run.status()['running']:
+            return jsonify({'error': 'Batch already running', 'batch_id': batch_id}), 409
+    
+        batch_dir = os.path.join(config.BATCH_DIR, batch_id)
+        input_path = os.path.join(batch_dir, 'input.jsonl')
+        output_path = os.path.join(batch_dir, 'results.jsonl')
+        os.makedirs(batch_dir, exist_ok=True)
+    
+        if multipart and 'file' in request.files:
+            request.files['file'].save(input_path)
+        elif raw.strip():
+            with open(input_path, 'wb') as f:
+                f.write(raw)
+        elif not os.path.exists(input_path):
+            return jsonify({'error': 'No queries provided'}), 400
+    
+        try:
+            count = len(load_queries(input_path))
+        except Exception as e:
+            return jsonify({'error': f"Invalid JSONL: {e}"}), 400
+    
+        use_cache = request.args.get('no_cache') not in ('1', 'true')
+    
+        def run_fn(query):
+            # Left as errors when draining, so resuming the batch redoes them
+            if DRAINING.is_set():
+                raise RuntimeError('Frontend is shutting down')
+            return run_council(query, use_cache=use_cache, priority='batch')
+    
+        run = BatchRun(input_path, output_path, run_fn, config.BATCH_CONCURRENCY)
+        BATCHES[batch_id] = run
+        run.start()
+    
+    return jsonify({
+        'batch_id': batch_id,
+        'queries': count,
+        'status_url': f"/batch/{batch_id}",
+        'results_url': f"/batch/{batch_id}/results"
+    }), 202
+
+@app.route('/batch/<batch_id>', methods=['GET'])
+def batch_status(batch_id):
+    """Progress of a batch run"""
+    run = BATCHES.get(batch_id)
+    if run is None:
+        return jsonify({'error': 'Unknown batch'}), 404
+    return jsonify(dict(run.status(), batch_id=batch_id))
+
+@app.route('/batch/<batch_id>/results', methods=['GET'])
+def batch_results(batch_id):
+    """Results written so far, as JSONL"""
+    if not re.fullmatch(r'[A-Za-z0-9_-]+', batch_id):
+        return jsonify({'error': 'Invalid batch_id'}), 400
+    output_path = os.path.join(config.BATCH_DIR, batch_id, 'results.jsonl')
+    if not os.path.exists(output_path):
+        return jsonify({'error': 'No results yet'}), 404
+    return send_file(os.path.abspath(output_path), mimetype='application/x-ndjson')
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=config.FRONTEND_PORT, debug=True)
\ No newline at end of file
+    # Development server; use `python serve.py frontend` in production
+    # Under the debug reloader only the child process (WERKZEUG_RUN_MAIN) serves requests
+    if os.getenv('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_tasks()
+    app.run(host='0.0.0.0', port=config.FRONTEND_PORT, debug=True)
@@ -0,0 +1,311 @@
+import heapq
+import itertools
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from admission import AdmissionQueue, QueueFull
+from ollama_client import iter_ndjson
+from wire import BlobStore, encode_json, pack_answers
+
+
+class NodeBusy(Exception):
+    """Raised when a node's admission queue is full (HTTP 429) or it is draining (503 with Retry-After)"""
+
+    def __init__(self, node_id, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f"{node_id} is busy, retry after {retry_after}s")
+
+
+class Slots:
+    """A node's generation slots, handed out interactive calls first
+
+    Like a semaphore, but waiters are served by admission lane then
+    arrival, so batch calls never hold up an interactive one waiting for
+    the same node, and a wait can be bounded.
+    """
+
+    def __init__(self, count):
+        self.free = count
+        self._cond = threading.Condition()
+        self._waiting = []  # heap of (lane rank, seq)
+        self._seq = itertools.count()
+
+    def acquire(self, priority='interactive', timeout=None):
+        """Take a slot; False if none came free within `timeout` seconds"""
+        entry = (AdmissionQueue.PRIORITIES.get(priority, 0), next(self._seq))
+        give_up = None if timeout is None else time.time() + timeout
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while not (self.free and self._waiting[0] == entry):
+                    remaining = None if give_up is None else give_up - time.time()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+                self.free -= 1
+                return True
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                # The next waiter in line may take a slot now
+                self._cond.notify_all()
+
+    def release(self):
+        with self._cond:
+            self.free += 1
+            self._cond.notify_all()
+
+
+class Backend:
+    """One remote node (member or chairman) as seen by the frontend
+
+    Every backend owns a keep-alive connection pool that is shared by all
+    council sessions, and a semaphore capping how many generations the
+    frontend sends it at once so a single Ollama box is never flooded
+    (interactive calls are given a free slot before batch ones).
+    It also tracks its in-flight calls, an EWMA of call latency and recent
+    connection failures, which the member registry uses for routing.
+    """
+
+    LATENCY_ALPHA = 0.3
+    FAILURE_COOLDOWN = 30  # seconds a backend is skipped after a connection error
+    # Wire format (see wire.py): send answers the node already has by
+    # reference, and gzip bodies from this size (None = never)
+    BLOB_REFS = True
+    COMPRESS_MIN_BYTES = 1024
+    SENT_TTL = 600  # seconds a sent text is assumed to still be on the node
+
+    def __init__(self, node_id, url, max_concurrent):
+        self.node_id = node_id
+        self.url = url
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+        self.latency_ewma = None
+        self.failed_until = 0.0
+        self._stats_lock = threading.Lock()
+        self.slots = Slots(max_concurrent)
+        self.sent = BlobStore(ttl=self.SENT_TTL)  # hashes of the texts this node was sent
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrent + 1)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get(self, path, **kwargs):
+        """Lightweight call (health, status) that does not take a slot"""
+        return self.session.get(f"{self.url}{path}", **kwargs)
+
+    def mark_failed(self, cooldown):
+        """Keep the router away from this backend for `cooldown` seconds"""
+        self.failed_until = time.time() + cooldown
+
+    def is_failed(self):
+        return time.time() < self.failed_until
+
+    def load_score(self):
+        """Expected wait for a new call: queue length times typical latency"""
+        return (self.in_flight + 1) * (self.latency_ewma or 1.0)
+
+    def _begin(self, priority='interactive', deadline=None):
+        """Take a slot; the start time, or None if `deadline` (absolute) passed first"""
+        with self._stats_lock:
+            self.in_flight += 1
+        started = time.time()
+        if not self.slots.acquire(priority, None if deadline is None else deadline - started):
+            with self._stats_lock:
+                self.in_flight -= 1
+            return None
+        return started
+
+    def _begin_call(self, payload, timeout, deadline):
+        """Take a slot for a generation call
+
+        Returns (started, payload, timeout) with the payload's deadline
+        budget and the timeout shortened by the time spent waiting, or
+        None if `deadline` passed before a slot came free.
+        """
+        started = self._begin(payload.get('priority', 'interactive'), deadline)
+        if started is None:
+            return None
+        if deadline is not None:
+            timeout -= time.time() - started
+            payload = dict(payload, deadline=max(deadline - time.time(), 0))
+        return started, payload, timeout
+
+    def _finish(self, started):
+        elapsed = time.time() - started
+        with self._stats_lock:
+            self.in_flight -= 1
+            if self.latency_ewma is None:
+                self.latency_ewma = elapsed
+            else:
+                self.latency_ewma += self.LATENCY_ALPHA * (elapsed - self.latency_ewma)
+        self.slots.release()
+
+    def _send(self, path, **kwargs):
+        """POST without taking a slot; a connection error marks the backend failed"""
+        try:
+            return self.session.post(f"{self.url}{path}", **kwargs)
+        except requests.ConnectionError:
+            self.mark_failed(self.FAILURE_COOLDOWN)
+            raise
+
+    def post(self, path, **kwargs):
+        """Generation call; blocks until one of the backend's slots is free
+
+        The caller must close streamed responses, which releases the slot.
+        """
+        started = self._begin()
+        try:
+            response = self._send(path, **kwargs)
+        except Exception:
+            self._finish(started)
+            raise
+        if not kwargs.get('stream'):
+            self._finish(started)
+            return response
+        close = response.close
+        released = []
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                if not released:
+                    released.append(True)
+                    self._finish(started)
+
+        response.close = close_and_release
+        return response
+
+    def events(self, path, payload, timeout, deadline=None):
+        """Streamed generation call, yielding the node's events as dicts
+
+        The call first waits for one of the backend's slots, by the
+        payload's 'priority' lane. With a `deadline` (absolute time) it
+        stops waiting then, yielding an error; otherwise the payload's
+        deadline budget and the timeout are recomputed once it has a slot.
+        Answer texts the node was already sent go by reference; if it no
+        longer has some of them (409), the call is repeated with those
+        inlined. Raises NodeBusy if the node answers 429, or 503 with a
+        Retry-After (it is shutting down). Closing the
+        generator closes the connection, which makes the node stop
+        generating.
+        """
+        call = self._begin_call(payload, timeout, deadline)
+        if call is None:
+            yield {'error': 'no free slot before the deadline'}
+            return
+        started, payload, timeout = call
+        try:
+            include = []
+            for _ in range(2):
+                body, inlined = pack_answers(payload, self.sent if self.BLOB_REFS else (), include)
+                data, headers = encode_json(body, self.COMPRESS_MIN_BYTES)
+                response = self._send(path, data=data, headers=headers, stream=True, timeout=timeout)
+                if response.status_code != 409:
+                    break
+                include = response.json().get('missing', [])
+                response.close()
+            try:
+                if response.status_code == 429 or (response.status_code == 503 and 'Retry-After' in response.headers):
+                    raise NodeBusy(self.node_id, float(response.headers.get('Retry-After', 1)))
+                if response.status_code != 200:
+                    yield {'error': f"HTTP {response.status_code}"}
+                    return
+                for key in inlined:
+                    self.sent.add(key, True)
+                yield from iter_ndjson(response)
+            finally:
+                response.close()
+        finally:
+            self._finish(started)
+
+
+class LocalResponse:
+    """The bits of a requests.Response the frontend reads from a local node"""
+
+    def __init__(self, data, status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+class LocalBackend(Backend):
+    """A member or chairman hosted in the frontend's own process
+
+    Same slots and statistics as a remote Backend, but calls go straight
+    to the node object (MemberNode / ChairmanNode): no HTTP round-trip and
+    no JSON encoding of the answers between stages.
+    """
+
+    def __init__(self, node_id, url, max_concurrent, node):
+        super().__init__(node_id, url, max_concurrent)
+        self.node = node
+
+    def get(self, path, **kwargs):
+        if path != '/health':
+            return LocalResponse({'error': 'Not found'}, 404)
+        return LocalResponse(self.node.health())
+
+    def post(self, path, json=None, timeout=None, **kwargs):
+        """Non-streamed call, answered like the node's HTTP endpoint
+
+        Drains events() (which takes the slot) and returns the final
+        event; the payload is passed as `json`.
+        """
+        try:
+            for event in self.events(path, dict(json or {}, stream=True), timeout):
+                if 'error' in event:
+                    return LocalResponse({'error': event['error']}, 500)
+                if event.get('done'):
+                    return LocalResponse({k: v for k, v in event.items() if k != 'done'})
+        except NodeBusy as e:
+            return LocalResponse({'error': str(e)}, 429, {'Retry-After': str(e.retry_after)})
+        return LocalResponse({'error': 'No result from the node'}, 500)
+
+    def events(self, path, payload, timeout, deadline=None):
+        call = self._begin_call(payload, timeout, deadline)
+        if call is None:
+            yield {'error': 'no free slot before the deadline'}
+            return
+        started, payload, timeout = call
+        try:
+            try:
+                events = self.node.handle(path, payload)
+            except QueueFull as e:
+                raise NodeBusy(self.node_id, e.retry_after)
+            except ValueError as e:
+                yield {'error': str(e)}
+                return
+            try:
+                yield from events
+            finally:
+                events.close()
+        finally:
+            self._finish(started)
+
+
+_backends = {}
+_lock = threading.Lock()
+
+
+def get_backend(node_id, url, max_concurrent):
+    """Return the shared Backend for a node URL, creating it on first use"""
+    with _lock:
+        backend = _backends.get(url)
+        if backend is None:
+            backend = Backend(node_id, url, max_concurrent)
+            _backends[url] = backend
+        return backend
+
+
+def add_local_backend(node_id, node, max_concurrent):
+    """Host `node` in-process; returns the local:// URL it is reachable at"""
+    url = f"local://{node_id}"
+    with _lock:
+        _backends[url] = LocalBackend(node_id, url, max_concurrent, node)
+    return url
@@ -0,0 +1,155 @@
+"""Batch / offline council evaluation over a JSONL file of queries
+
+Usage:
+    python batch.py queries.jsonl results.jsonl [--concurrency 4] [--no-cache]
+
+Each input line is {"query": "..."} with an optional "id" (defaults to
+the line number). Results are appended to the output file as soon as
+each session finishes, so the output doubles as the checkpoint: running
+the same command again skips every id that already has a successful
+result and only redoes the rest.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def load_queries(path):
+    """Read (id, query) pairs from a JSONL file, skipping blank lines"""
+    queries = []
+    with open(path, encoding='utf-8') as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {'query': item}
+            queries.append((str(item.get('id', line_no)), item['query']))
+    return queries
+
+
+def completed_ids(output_path):
+    """Ids that already have a successful result in the output file"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn last line from a crash
+            if 'error' not in record:
+                done.add(record['id'])
+    return done
+
+
+class BatchRun:
+    """Runs every pending query through `run_fn`, `concurrency` sessions at a time
+
+    Several sessions in flight at once is what pipelines the batch: while
+    one query waits on the chairman, the members are already answering
+    the next ones. Member calls are sent on the 'batch' admission lane so
+    interactive users keep priority.
+    """
+
+    def __init__(self, input_path, output_path, run_fn, concurrency=4):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.run_fn = run_fn
+        self.concurrency = concurrency
+        self.total = 0
+        self.skipped = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def _write(self, record):
+        with self._lock:
+            with open(self.output_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            if 'error' in record:
+                self.failed += 1
+            else:
+                self.succeeded += 1
+
+    def _run_one(self, query_id, query):
+        try:
+            result = self.run_fn(query)
+            record = {'id': query_id, 'query': query, 'result': result}
+            if 'error' in result.get('stage3_synthesis', {}):
+                record['error'] = result['stage3_synthesis']['error']
+        except Exception as e:
+            record = {'id': query_id, 'query': query, 'error': str(e)}
+        self._write(record)
+        return record
+
+    def start(self):
+        """Run in a background thread; status() reports it running from now on"""
+        self.started_at = time.time()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        self.started_at = self.started_at or time.time()
+        queries = load_queries(self.input_path)
+        done = completed_ids(self.output_path)
+        pending = [(qid, q) for qid, q in queries if qid not in done]
+        self.total = len(queries)
+        self.skipped = len(queries) - len(pending)
+        print(f"BATCH: {len(pending)} queries to run ({self.skipped} already done), concurrency {self.concurrency}")
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = [pool.submit(self._run_one, qid, q) for qid, q in pending]
+            for future in as_completed(futures):
+                record = future.result()
+                mark = '✗' if 'error' in record else '✓'
+                print(f"  {mark} [{self.succeeded + self.failed}/{len(pending)}] {record['id']}")
+
+        self.finished_at = time.time()
+        print(f"BATCH COMPLETE: {self.succeeded} ok, {self.failed} failed in {self.finished_at - self.started_at:.1f}s")
+        return self.status()
+
+    def status(self):
+        end = self.finished_at or time.time()
+        return {
+            'input': self.input_path,
+            'output': self.output_path,
+            'total': self.total,
+            'skipped': self.skipped,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'running': self.started_at is not None and self.finished_at is None,
+            'elapsed': end - self.started_at if self.started_at else 0.0
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the LLM council over a JSONL file of queries")
+    parser.add_argument('input', help="JSONL file, one {\"query\": ...} per line")
+    parser.add_argument('output', help="JSONL results file (appended to; re-run to resume)")
+    parser.add_argument('--concurrency', type=int, default=None, help="sessions in flight at once")
+    parser.add_argument('--no-cache', action='store_true', help="bypass the response caches")
+    args = parser.parse_args()
+
+    # Imported here so `import batch` from app.py doesn't import app twice
+    import app
+    import config
+    # In-process models' keepers and tuners, and health probes of the nodes
+    app.start_background_tasks()
+
+    def run_fn(query):
+        return app.run_council(query, use_cache=not args.no_cache, priority='batch')
+
+    BatchRun(args.input, args.output, run_fn, args.concurrency or config.BATCH_CONCURRENCY).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,411 @@
+"""Load test of the council's orchestration layer against a mock Ollama
+
+Usage:
+    python benchmark.py closed --concurrency 4 --duration 30
+    python benchmark.py open --rate 2 --duration 30
+    python benchmark.py closed --target http://<frontend-ip>:8080   # existing deployment
+
+Unless --target is given, a local cluster is started on --base-port and
+up: mock_ollama.py (see its options below), one council_member.py per
+--members, chairman.py and the frontend, all with caches off (with
+--single-node, only the frontend, hosting them in-process). Every
+session sends a distinct query to /submit_query with "no_cache": true.
+
+  closed: --concurrency clients, each sending its next query as soon as
+          the previous one finished (measures capacity)
+  open:   sessions arrive at --rate per second (Poisson), whether or not
+          earlier ones finished (measures latency under a given load)
+
+The report gives p50/p95/p99 per stage, sessions/sec, and orchestration
+overhead: the time spent on top of the model generations themselves,
+taken from the members' and chairman's /metrics.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+QUERY_TOPICS = [
+    "the causes of the French Revolution", "how vaccines train the immune system",
+    "why the sky is blue", "the difference between TCP and UDP", "how compound interest works",
+    "what a hash table is", "the water cycle", "how a transistor works"
+]
+
+
+def percentile(values, p):
+    """p-th percentile (0-100) with linear interpolation"""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = (len(values) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def serve(module, port):
+    """Entry point of the child processes: run a service without the debug reloader
+
+    Frontend config overrides come as JSON in BENCH_CONFIG.
+    """
+    sys.path.insert(0, HERE)
+    import config
+    for key, value in json.loads(os.getenv('BENCH_CONFIG', '{}')).items():
+        setattr(config, key, value)
+    service = __import__(module)
+    service.start_background_tasks()
+    service.app.run(host='127.0.0.1', port=port, threaded=True)
+
+
+class LocalCluster:
+    """Mock Ollama + members + chairman + frontend on consecutive local ports"""
+
+    def __init__(self, args):
+        self.args = args
+        self.procs = []
+        self.log_dir = tempfile.mkdtemp(prefix='council-bench-')
+        base = args.base_port
+        self.ollama_url = f"http://127.0.0.1:{base}"
+        self.chairman_url = f"http://127.0.0.1:{base + 1}"
+        self.member_urls = [f"http://127.0.0.1:{base + 2 + i}" for i in range(args.members)]
+        self.frontend_url = f"http://127.0.0.1:{base + 2 + args.members}"
+
+    def _spawn(self, name, cmd, env=None):
+        log = open(os.path.join(self.log_dir, f"{name}.log"), 'w')
+        proc = subprocess.Popen(
+            cmd, cwd=HERE, stdout=log, stderr=subprocess.STDOUT,
+            env=dict(os.environ, **(env or {})), start_new_session=True
+        )
+        self.procs.append(proc)
+
+    def _wait_ready(self, url, timeout=30):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                if requests.get(url, timeout=1).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"{url} did not come up (logs in {self.log_dir})")
+
+    def __enter__(self):
+        args = self.args
+        python = sys.executable
+        self._spawn('ollama', [
+            python, 'mock_ollama.py', '--port', str(args.base_port),
+            '--token-rate', str(args.token_rate), '--ttft', str(args.ttft),
+            '--jitter', str(args.jitter), '--failure-rate', str(args.failure_rate),
+            '--tokens', str(args.tokens), '--load-time', str(args.load_time),
+            '--bad-review-rate', str(args.bad_review_rate),
+            '--review-agreement', str(args.review_agreement),
+            '--prefill-rate', str(args.prefill_rate),
+            '--confident-rate', str(args.confident_rate)
+        ])
+        self._wait_ready(f"{self.ollama_url}/api/tags")
+
+        frontend_config = {
+            'OLLAMA_HOST': self.ollama_url,
+            'CHAIRMAN_URL': self.chairman_url,
+            'CHAIRMAN_MODEL': 'mock-chairman',
+            'COUNCIL_MEMBERS': [
+                {'id': f"member{i + 1}", 'url': url, 'model': f"mock-{i + 1}"}
+                for i, url in enumerate(self.member_urls)
+            ],
+            'CACHE_ENABLED': False,
+            'SEMANTIC_CACHE_ENABLED': False,
+            'TUNING_ENABLED': args.tuning,
+            'TUNING_DIR': self.log_dir,
+            'CONTEXT_REUSE': not args.no_context_reuse,
+            'REVIEW_PLAN': args.review_plan,
+            'REVIEWS_PER_ANSWER': args.reviews_per_answer,
+            'CASCADE_ENABLED': args.cascade,
+            'SESSION_DIR': os.path.join(self.log_dir, 'sessions')
+        }
+        if args.single_node:
+            # Members and chairman inside the frontend: only it has to come up
+            frontend_config.update(SINGLE_NODE=True, LOCAL_WORKERS=args.member_workers)
+            self.chairman_url = None
+            self.member_urls = []
+            self._spawn('frontend', [python, 'benchmark.py', '--serve', 'app', self.frontend_url.rsplit(':', 1)[1]],
+                        {'BENCH_CONFIG': json.dumps(frontend_config)})
+            self._wait_ready(f"{self.frontend_url}/members")
+            print(f"Single-node frontend up at {self.frontend_url} (logs in {self.log_dir})")
+            return self
+
+        common = {'OLLAMA_HOST': self.ollama_url, 'CACHE_ENABLED': '0', 'TUNING': '1' if args.tuning else '0',
+                  'CONTEXT_REUSE': '0' if args.no_context_reuse else '1'}
+        self._spawn('chairman', [python, 'benchmark.py', '--serve', 'chairman', str(args.base_port + 1)],
+                    dict(common, MODEL_NAME='mock-chairman',
+                         TUNING_PROFILE=os.path.join(self.log_dir, 'profile_chairman.json')))
+        for i, url in enumerate(self.member_urls):
+            self._spawn(f"member{i + 1}", [python, 'benchmark.py', '--serve', 'council_member', url.rsplit(':', 1)[1]],
+                        dict(common, MEMBER_ID=f"member{i + 1}", MODEL_NAME=f"mock-{i + 1}",
+                             TUNING_PROFILE=os.path.join(self.log_dir, f"profile_member{i + 1}.json"),
+                             WORKERS=str(args.member_workers)))
+        self._spawn('frontend', [python, 'benchmark.py', '--serve', 'app', self.frontend_url.rsplit(':', 1)[1]],
+                    {'BENCH_CONFIG': json.dumps(frontend_config)})
+
+        for url in [self.chairman_url] + self.member_urls:
+            self._wait_ready(f"{url}/health")
+        self._wait_ready(f"{self.frontend_url}/members")
+        print(f"Local cluster up: frontend {self.frontend_url}, {len(self.member_urls)} members (logs in {self.log_dir})")
+        return self
+
+    @property
+    def node_urls(self):
+        """Services whose /metrics hold the generation times"""
+        if self.args.single_node:
+            return [self.frontend_url]
+        return [self.chairman_url] + self.member_urls
+
+    def __exit__(self, *exc):
+        for proc in self.procs:
+            try:
+                os.killpg(proc.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for proc in self.procs:
+            proc.wait(timeout=10)
+
+
+def generation_times(node_urls):
+    """Sum and count of council_generation_seconds per stage over all nodes"""
+    totals = {}
+    pattern = re.compile(r'^council_generation_seconds_(sum|count)\{stage="(\w+)"\} (\S+)$')
+    for url in node_urls:
+        try:
+            text = requests.get(f"{url}/metrics", timeout=5).text
+        except requests.RequestException as e:
+            print(f"  ✗ Could not scrape {url}/metrics: {e}")
+            continue
+        for line in text.splitlines():
+            match = pattern.match(line)
+            if match:
+                kind, stage, value = match.groups()
+                stage_totals = totals.setdefault(stage, {'sum': 0.0, 'count': 0.0})
+                stage_totals[kind] += float(value)
+    return totals
+
+
+def run_session(url, session_id, timeout):
+    """Send one council query and time it from the client side"""
+    topic = QUERY_TOPICS[session_id % len(QUERY_TOPICS)]
+    query = f"[bench {session_id}] Explain {topic} in two sentences."
+    started = time.time()
+    record = {'id': session_id, 'started': started}
+    try:
+        response = requests.post(
+            f"{url}/submit_query", json={'query': query, 'no_cache': True}, timeout=timeout
+        )
+        record['latency'] = time.time() - started
+        data = response.json()
+        if response.status_code != 200 or 'error' in data:
+            record['error'] = data.get('error', f"HTTP {response.status_code}")
+        elif 'error' in data.get('stage3_synthesis', {}):
+            record['error'] = data['stage3_synthesis']['error']
+        else:
+            record['timing'] = data['timing']
+    except Exception as e:
+        record['latency'] = time.time() - started
+        record['error'] = str(e)
+    return record
+
+
+def closed_loop(url, concurrency, duration, max_sessions, timeout):
+    """`concurrency` clients back to back until the duration or session count is reached"""
+    records = []
+    lock = threading.Lock()
+    counter = iter(range(sys.maxsize))
+    stop_at = time.time() + duration
+
+    def client():
+        while time.time() < stop_at:
+            with lock:
+                session_id = next(counter)
+            if max_sessions and session_id >= max_sessions:
+                return
+            record = run_session(url, session_id, timeout)
+            with lock:
+                records.append(record)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return records
+
+
+def open_loop(url, rate, duration, max_sessions, timeout):
+    """Poisson arrivals at `rate` sessions/sec for `duration` seconds"""
+    futures = []
+    stop_at = time.time() + duration
+    with ThreadPoolExecutor(max_workers=256) as pool:
+        session_id = 0
+        next_at = time.time()
+        while next_at < stop_at and not (max_sessions and session_id >= max_sessions):
+            time.sleep(max(next_at - time.time(), 0))
+            futures.append(pool.submit(run_session, url, session_id, timeout))
+            session_id += 1
+            next_at += random.expovariate(rate)
+        return [f.result() for f in futures]
+
+
+def summarize(records, wall_time, gen_before=None, gen_after=None):
+    """Latency percentiles per stage, throughput and orchestration overhead"""
+    ok = [r for r in records if 'timing' in r]
+    series = {
+        'stage1': [r['timing']['stage1'] for r in ok],
+        'stage2': [r['timing']['stage2'] for r in ok],
+        'stage3': [r['timing']['stage3'] for r in ok],
+        'server_total': [r['timing']['total'] for r in ok],
+        'client_total': [r['latency'] for r in ok]
+    }
+    report = {
+        'sessions': len(records),
+        'succeeded': len(ok),
+        'failed': len(records) - len(ok),
+        'wall_time': wall_time,
+        'sessions_per_sec': len(ok) / wall_time if wall_time else 0.0,
+        'latency': {
+            name: {
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95),
+                'p99': percentile(values, 99),
+                'mean': sum(values) / len(values) if values else None
+            }
+            for name, values in series.items()
+        },
+        'errors': sorted({r['error'] for r in records if 'error' in r})[:10]
+    }
+
+    if gen_before is not None and gen_after is not None and ok:
+        # Mean generation time per stage during the run (answer / review / synthesis)
+        generation = {}
+        for stage, after in gen_after.items():
+            before = gen_before.get(stage, {'sum': 0.0, 'count': 0.0})
+            count = after['count'] - before['count']
+            if count:
+                generation[stage] = (after['sum'] - before['sum']) / count
+        model_time = sum(generation.get(stage, 0.0) for stage in ('answer', 'review', 'synthesis'))
+        mean = report['latency']
+        report['generation'] = generation
+        report['overhead'] = {
+            'stage1': mean['stage1']['mean'] - generation.get('answer', 0.0),
+            'stage2': mean['stage2']['mean'] - generation.get('review', 0.0),
+            'stage3': mean['stage3']['mean'] - generation.get('synthesis', 0.0),
+            'http': mean['client_total']['mean'] - mean['server_total']['mean'],
+            'total': mean['client_total']['mean'] - model_time
+        }
+    return report
+
+
+def print_report(report):
+    def fmt(value):
+        return '   -   ' if value is None else f"{value:7.3f}"
+
+    print(f"\n{'='*60}")
+    print(f"Sessions: {report['succeeded']} ok, {report['failed']} failed in {report['wall_time']:.1f}s "
+          f"-> {report['sessions_per_sec']:.2f} sessions/sec")
+    print(f"\n{'latency (s)':<14}{'p50':>8}{'p95':>8}{'p99':>8}{'mean':>8}")
+    for name, stats in report['latency'].items():
+        print(f"{name:<14}{fmt(stats['p50'])} {fmt(stats['p95'])} {fmt(stats['p99'])} {fmt(stats['mean'])}")
+    if 'overhead' in report:
+        print("\nMean model generation time (s): " +
+              ", ".join(f"{stage} {seconds:.3f}" for stage, seconds in report['generation'].items()))
+        print("Orchestration overhead (s, mean): " +
+              ", ".join(f"{name} {seconds:.3f}" for name, seconds in report['overhead'].items()))
+    for error in report['errors']:
+        print(f"  ✗ {error}")
+    print(f"{'='*60}\n")
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == '--serve':
+        serve(sys.argv[2], int(sys.argv[3]))
+        return
+
+    parser = argparse.ArgumentParser(description="Load test the LLM council against a mock Ollama")
+    parser.add_argument('profile', choices=['closed', 'open'], help="closed-loop clients or open-loop arrivals")
+    parser.add_argument('--concurrency', type=int, default=4, help="closed loop: clients in flight")
+    parser.add_argument('--rate', type=float, default=1.0, help="open loop: sessions per second")
+    parser.add_argument('--duration', type=float, default=30, help="seconds of load")
+    parser.add_argument('--sessions', type=int, default=0, help="stop after this many sessions (0 = no limit)")
+    parser.add_argument('--warmup', type=int, default=2, help="sessions run (and discarded) before measuring")
+    parser.add_argument('--timeout', type=float, default=600, help="per-session timeout")
+    parser.add_argument('--json', help="also write the report to this file")
+    parser.add_argument('--target', help="benchmark an already running frontend instead of a local cluster")
+
+    cluster = parser.add_argument_group('local cluster')
+    cluster.add_argument('--base-port', type=int, default=18400)
+    cluster.add_argument('--members', type=int, default=2)
+    cluster.add_argument('--single-node', action='store_true',
+                         help="host members and chairman inside the frontend (config.SINGLE_NODE)")
+    cluster.add_argument('--member-workers', type=int, default=1, help="WORKERS of each member")
+    cluster.add_argument('--token-rate', type=float, default=50.0, help="mock tokens per second")
+    cluster.add_argument('--ttft', type=float, default=0.2, help="mock seconds to first token")
+    cluster.add_argument('--jitter', type=float, default=0.1, help="mock +/- fraction on every delay")
+    cluster.add_argument('--failure-rate', type=float, default=0.0, help="mock fraction of failed generations")
+    cluster.add_argument('--tokens', type=int, default=40, help="mock tokens per answer")
+    cluster.add_argument('--load-time', type=float, default=0.0, help="mock cold start (model load) seconds")
+    cluster.add_argument('--bad-review-rate', type=float, default=0.0, help="mock fraction of unusable reviews")
+    cluster.add_argument('--tuning', action='store_true',
+                         help="let the nodes benchmark the mock and cap num_predict (TUNING=1)")
+    cluster.add_argument('--review-agreement', type=float, default=1.0,
+                         help="mock fraction of reviews ranking answers in order (the others shuffle)")
+    cluster.add_argument('--prefill-rate', type=float, default=0.0,
+                         help="mock prompt tokens per second (0: prompt processing is part of --ttft)")
+    cluster.add_argument('--review-plan', default='auto', choices=['all', 'sampled', 'pairwise', 'auto'],
+                         help="which answers each member reviews (config.REVIEW_PLAN)")
+    cluster.add_argument('--reviews-per-answer', type=int, default=3, help="reviewers per answer with --review-plan sampled")
+    cluster.add_argument('--cascade', action='store_true',
+                         help="one member answers, the council only runs when it is not verified (CASCADE_ENABLED)")
+    cluster.add_argument('--confident-rate', type=float, default=0.7,
+                         help="mock fraction of cascade verifications that are confident")
+    cluster.add_argument('--no-context-reuse', action='store_true',
+                         help="reviews prefill their whole prompt instead of continuing the answer (CONTEXT_REUSE=0)")
+    args = parser.parse_args()
+
+    def benchmark(url, node_urls):
+        for i in range(args.warmup):
+            run_session(url, -1 - i, args.timeout)
+        gen_before = generation_times(node_urls) if node_urls else None
+        print(f"Running {args.profile}-loop load for {args.duration:.0f}s "
+              f"({'concurrency ' + str(args.concurrency) if args.profile == 'closed' else str(args.rate) + ' sessions/sec'})...")
+        started = time.time()
+        if args.profile == 'closed':
+            records = closed_loop(url, args.concurrency, args.duration, args.sessions, args.timeout)
+        else:
+            records = open_loop(url, args.rate, args.duration, args.sessions, args.timeout)
+        wall_time = time.time() - started
+        gen_after = generation_times(node_urls) if node_urls else None
+        return summarize(records, wall_time, gen_before, gen_after)
+
+    if args.target:
+        report = benchmark(args.target.rstrip('/'), None)
+    else:
+        with LocalCluster(args) as local:
+            report = benchmark(local.frontend_url, local.node_urls)
+
+    report['settings'] = {k: v for k, v in vars(args).items() if k != 'json'}
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Confidence cascade: the fastest member answers alone, the council only when needed
+
+In cascade mode the frontend first asks a single member (the fastest
+one, or config.CASCADE_MEMBER) for an answer, then has a verifier (the
+next fastest member, or config.CASCADE_VERIFIER) score it with a short
+structured generation:
+
+    {"confidence": 0-10, "issues": "..."}
+
+A confidence of at least the threshold returns that answer as the
+session's result. Anything else (low confidence, an unusable or failed
+verification) escalates to the full three-stage council, which keeps
+the cheap answer as one of its Stage 1 answers.
+"""
+import json
+from kv_context import question_prefix
+
+CONFIDENCE_MAX = 10
+
+
+def verify_schema():
+    """JSON schema passed as Ollama's `format` for a verification"""
+    return {
+        'type': 'object',
+        'properties': {
+            'confidence': {'type': 'number', 'minimum': 0, 'maximum': CONFIDENCE_MAX},
+            'issues': {'type': 'string'}
+        },
+        'required': ['confidence', 'issues']
+    }
+
+
+def build_verify_prompt(query, answer):
+    """Prompt asking a member how sure it is that an answer is right"""
+    return question_prefix(query) + f"""PROPOSED ANSWER:
+{answer}
+
+Check the proposed answer for factual errors, missing key points and misunderstandings of the question. Rate how confident you are that it fully and correctly answers the question, from 0 (wrong) to {CONFIDENCE_MAX} (certainly right and complete). Be strict: anything you cannot confirm lowers the score.
+
+Respond with a JSON object only:
+{{"confidence": <0-{CONFIDENCE_MAX}>, "issues": "<the problems you found, or an empty string>"}}"""
+
+
+def parse_verification(text):
+    """(confidence in 0..1 or None, issues) from a verifier's output"""
+    start, end = text.find('{'), text.rfind('}')
+    try:
+        data = json.loads(text[start:end + 1]) if 0 <= start < end else None
+        confidence = float(data['confidence'])
+    except (ValueError, TypeError, KeyError):
+        return None, ''
+    return min(max(confidence, 0), CONFIDENCE_MAX) / CONFIDENCE_MAX, str(data.get('issues', ''))
+
+
+def pick_members(members, weights, answerer_id=None, verifier_id=None):
+    """(answerer, verifier) for a cascade, fastest members first
+
+    `weights` are relative speeds (review_plan.MemberSpeeds). Configured
+    ids win when they are registered; a lone member verifies itself.
+    """
+    by_speed = sorted(members, key=lambda m: -weights.get(m['id'], 0))
+    answerer = next((m for m in members if m['id'] == answerer_id), by_speed[0])
+    others = [m for m in by_speed if m['id'] != answerer['id']]
+    verifier = next((m for m in members if m['id'] == verifier_id), others[0] if others else answerer)
+    return answerer, verifier
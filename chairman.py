@@ -1,9 +1,19 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import requests
 import os
+import socket
+import threading
 import traceback
 import sys
+from chairman_node import ChairmanNode
+from context_budget import ContextBudget
+from metrics import METRICS, CONTENT_TYPE, register_cache_metrics, register_model_metrics
+from model_keeper import ModelKeeper, parse_keep_alive
+from model_tuning import Tuner, candidate_grid, parse_seconds, parse_values
+from ollama_client import OllamaError, to_ndjson
+from response_cache import ResponseCache
+from wire import BlobStore, MissingBlobs, read_json, unpack_answers
 
 app = Flask(__name__)
 CORS(app)
@@ -13,117 +23,173 @@ OLLAMA_HOST = os.getenv('OLLAMA_HOST', 'http://localhost:11434')
 MODEL_NAME = os.getenv('MODEL_NAME', 'phi')
 PORT = int(os.getenv('PORT', 5000))
 
-print(f"\n{'='*40}")
-print(f"CHAIRMAN STARTING...")
-print(f"Model: {MODEL_NAME}")
-print(f"Port: {PORT}")
-print(f"Ollama: {OLLAMA_HOST}")
-print(f"{'='*40}\n")
+# Response cache (set CACHE_ENABLED=0 to turn it off)
+CACHE = None
+if os.getenv('CACHE_ENABLED', '1') == '1':
+    CACHE = ResponseCache(
+        os.getenv('CACHE_PATH', "cache_chairman.sqlite3"),
+        max_entries=int(os.getenv('CACHE_MAX_ENTRIES', 1000)),
+        max_bytes=int(os.getenv('CACHE_MAX_BYTES', 50 * 1024 * 1024)),
+        ttl=float(os.getenv('CACHE_TTL', 7 * 24 * 3600))
+    )
+
+# Model residency: preload MODEL_NAME at startup and keep it loaded for
+# KEEP_ALIVE (Ollama duration, -1 = forever), reloading it if Ollama unloads it
+KEEP_ALIVE = parse_keep_alive(os.getenv('KEEP_ALIVE', '30m'))
+KEEPER = ModelKeeper(
+    OLLAMA_HOST, MODEL_NAME, KEEP_ALIVE,
+    preload=os.getenv('PRELOAD', '1') == '1',
+    keep_warm=os.getenv('KEEP_WARM', '1') == '1',
+    check_interval=float(os.getenv('WARM_CHECK_INTERVAL', 15))
+)
+
+# Context budget: the prompt is shrunk (see context_budget.py) until it fits,
+# then the smallest of CONTEXT_SIZES that holds it plus RESERVED_OUTPUT_TOKENS is used
+BUDGET = ContextBudget(
+    context_sizes=[int(x) for x in os.getenv('CONTEXT_SIZES', '2048,4096,8192').split(',')],
+    reserve_tokens=int(os.getenv('RESERVED_OUTPUT_TOKENS', 512)),
+    chars_per_token=float(os.getenv('CHARS_PER_TOKEN', 3.5)),
+    strategies=os.getenv('BUDGET_STRATEGIES', 'reasoning,drop,summarize,truncate').split(','),
+    min_answers=int(os.getenv('MIN_ANSWERS', 2))
+)
+
+# Per-box tuning (TUNING=0 to turn it off), measured at the budget's context
+# sizes: options and a num_predict cap meant to finish the synthesis within
+# LATENCY_TARGET_SYNTHESIS seconds (or the request's deadline)
+TUNER = None
+if os.getenv('TUNING', '1') == '1':
+    TUNER = Tuner(
+        OLLAMA_HOST, MODEL_NAME, os.getenv('TUNING_PROFILE', "profile_chairman.json"),
+        targets={
+            'synthesis': parse_seconds(os.getenv('LATENCY_TARGET_SYNTHESIS', '90')),
+            'light_edit': parse_seconds(os.getenv('LATENCY_TARGET_LIGHT_EDIT', '60'))
+        },
+        grid=candidate_grid(
+            BUDGET.context_sizes,
+            parse_values(os.getenv('TUNE_NUM_THREAD', 'default')),
+            parse_values(os.getenv('TUNE_NUM_BATCH', 'default'))
+        ),
+        min_predict={'synthesis': 128, 'light_edit': 128}
+    )
+
+# Push-based health: with REGISTRY_URL set (the frontend's URL), the chairman
+# sends its status to the frontend's /heartbeat every HEARTBEAT_INTERVAL
+# seconds, so the frontend doesn't have to poll it
+REGISTRY_URL = os.getenv('REGISTRY_URL')
+PUBLIC_URL = os.getenv('PUBLIC_URL')  # how the frontend reaches us, defaults to http://<our ip>:<port>
+HEARTBEAT_INTERVAL = float(os.getenv('HEARTBEAT_INTERVAL', 10))
+
+# Set by begin_drain() when the server shuts down (see serve.py): new
+# syntheses get a 503, the ones in flight finish
+DRAINING = threading.Event()
+
+# Answer texts received from the frontend, referenced by hash when they
+# are sent again (see wire.py)
+BLOBS = BlobStore(
+    max_entries=int(os.getenv('BLOB_MAX_ENTRIES', 2000)),
+    ttl=float(os.getenv('BLOB_TTL', 1800))
+)
+
+# The synthesis logic; the routes below only translate HTTP to and from it
+NODE = ChairmanNode(MODEL_NAME, OLLAMA_HOST, BUDGET, cache=CACHE, keeper=KEEPER, keep_alive=KEEP_ALIVE, tuner=TUNER)
+
+register_cache_metrics({'chairman': CACHE})
+register_model_metrics({'chairman': KEEPER})
+
+def node_health():
+    """The chairman's status, as served on /health and pushed with heartbeats
+
+    Ollama is only asked directly when the model keeper has no recent
+    answer from its periodic check.
+    """
+    ollama_status = KEEPER.ollama_status()
+    if ollama_status is None:
+        try:
+            response = requests.get(f"{OLLAMA_HOST}/api/tags", timeout=5)
+            ollama_status = 'connected' if response.status_code == 200 else 'error'
+        except Exception:
+            ollama_status = 'unreachable'
+    health = dict(NODE.health(), ollama_status=ollama_status, blobs=BLOBS.stats())
+    if ollama_status != 'connected':
+        health.update(status='unhealthy', error=f"Ollama {ollama_status}")
+    if DRAINING.is_set():
+        health.update(status='draining', error='Shutting down')
+    return health
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Check if the chairman service is running"""
-    try:
-        # Test connection to Ollama
-        response = requests.get(f"{OLLAMA_HOST}/api/tags", timeout=5)
-        if response.status_code == 200:
-            return jsonify({
-                'status': 'healthy',
-                'role': 'chairman',
-                'model': MODEL_NAME,
-                'ollama_status': 'connected'
-            }), 200
-        else:
-            return jsonify({
-                'status': 'unhealthy',
-                'role': 'chairman',
-                'error': 'Ollama responded but with error'
-            }), 503
-    except Exception as e:
-        return jsonify({
-            'status': 'unhealthy',
-            'role': 'chairman',
-            'error': str(e)
-        }), 503
+    health = node_health()
+    return jsonify(health), 200 if health['status'] == 'healthy' else 503
+
+def public_url():
+    """How the frontend reaches us"""
+    return PUBLIC_URL or f"http://{socket.gethostbyname(socket.gethostname())}:{PORT}"
+
+def push_health(url):
+    """Send our status to the frontend's /heartbeat; True if it took it"""
+    response = requests.post(f"{REGISTRY_URL}/heartbeat", json={
+        'role': 'chairman',
+        'url': url,
+        'health': node_health()
+    }, timeout=5)
+    return response.status_code == 200
+
+def heartbeat_loop(url):
+    """Push our status to the frontend every HEARTBEAT_INTERVAL seconds until draining"""
+    reachable = False
+    while not DRAINING.is_set():
+        try:
+            ok = push_health(url)
+            if ok and not reachable:
+                print(f"✓ Sending heartbeats to {REGISTRY_URL} as {url}")
+            reachable = ok
+        except Exception as e:
+            if reachable:
+                print(f"✗ Heartbeat to {REGISTRY_URL} failed: {e}")
+            reachable = False
+        DRAINING.wait(HEARTBEAT_INTERVAL)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of the chairman's metrics"""
+    return Response(METRICS.render(), content_type=CONTENT_TYPE)
 
 @app.route('/synthesize', methods=['POST'])
 def synthesize():
     """Synthesize all answers and reviews into a final response"""
+    if DRAINING.is_set():
+        return jsonify({'error': 'Chairman is shutting down'}), 503, {'Retry-After': '1'}
     try:
         print("\n--- NEW SYNTHESIS REQUEST RECEIVED ---")
         
-        data = request.json
+        data = read_json(request)
         if not data:
             return jsonify({'error': 'No JSON data received'}), 400
+        try:
+            unpack_answers(data, BLOBS)
+        except MissingBlobs as e:
+            return jsonify({'error': str(e), 'missing': e.missing}), 409
 
-        query = data.get('query', '')
-        answers = data.get('answers', [])
-        reviews = data.get('reviews', [])
-        
-        print(f"Query: {query}")
-        print(f"Answers received: {len(answers)}")
-        print(f"Reviews received: {len(reviews)}")
-
-        if not query:
-            return jsonify({'error': 'No query provided'}), 400
-        
-        # Build synthesis prompt
-        answers_text = "\n\n".join([
-            f"Response from {ans.get('member_id', 'Unknown')} (Model: {ans.get('model', 'Unknown')}):\n{ans.get('answer', 'No text')}"
-            for ans in answers
-        ])
-        
-        reviews_text = "\n\n".join([
-            f"Review by {rev.get('member_id', 'Unknown')}:\nRanking: {', '.join(rev.get('ranking', []))}\nReasoning: {rev.get('reasoning', 'N/A')}"
-            for rev in reviews
-        ])
-        
-        synthesis_prompt = f"""You are the Chairman of an LLM Council. 
-ORIGINAL QUESTION: {query}
-
-COUNCIL RESPONSES:
-{answers_text}
+        try:
+            synthesis = NODE.prepare(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        print(f"Waiting for generation (Timeout: {synthesis.timeout():.0f}s)...")
 
-PEER REVIEWS:
-{reviews_text}
-
-Based on these responses and reviews, provide a final, synthesized answer that represents the best collective wisdom.
-Your final answer:"""
-
-        print(f"Sending prompt to Ollama ({len(synthesis_prompt)} chars)...")
-        print("Waiting for generation (Timeout: 300s)...")
+        if data.get('stream'):
+            return Response(
+                (to_ndjson(event) for event in NODE.stream(synthesis)),
+                mimetype='application/x-ndjson'
+            )
 
         # Call Ollama for synthesis
-        ollama_response = requests.post(
-            f"{OLLAMA_HOST}/api/generate",
-            json={
-                'model': MODEL_NAME,
-                'prompt': synthesis_prompt,
-                'stream': False,
-                # Options pour éviter de dépasser la mémoire
-                'options': {
-                    'num_ctx': 2048, # Contexte large pour lire toutes les réponses
-                    'temperature': 0.7
-                }
-            },
-            timeout=300  # 5 minutes timeout
-        )
-        
-        if ollama_response.status_code == 200:
-            result = ollama_response.json()
-            generated_text = result.get('response', '')
-            print("✓ Synthesis generated successfully!")
-            
-            return jsonify({
-                'role': 'chairman',
-                'model': MODEL_NAME,
-                'final_answer': generated_text
-            }), 200
-        else:
+        try:
+            return jsonify(NODE.generate(synthesis)), 200
+        except OllamaError as e:
             # GESTION D'ERREUR DETAILLEE
-            error_msg = f"Ollama Error ({ollama_response.status_code}): {ollama_response.text}"
-            print(f"!!! {error_msg} !!!")
-            return jsonify({'error': error_msg}), 500
+            print(f"!!! {e} !!!")
+            return jsonify({'error': str(e)}), 500
             
     except Exception as e:
         # GESTION DE CRASH PYTHON
@@ -131,5 +197,38 @@ Your final answer:"""
         traceback.print_exc()
         return jsonify({'error': f"Server Exception: {str(e)}"}), 500
 
+def start_background_tasks():
+    """Model residency, tuning and heartbeats; run once per serving process"""
+    print(f"\n{'='*40}")
+    print(f"CHAIRMAN STARTING...")
+    print(f"Model: {MODEL_NAME}")
+    print(f"Port: {PORT}")
+    print(f"Ollama: {OLLAMA_HOST}")
+    print(f"{'='*40}\n")
+    KEEPER.start()
+    if TUNER:
+        TUNER.start()
+    if REGISTRY_URL:
+        threading.Thread(target=heartbeat_loop, args=(public_url(),), daemon=True).start()
+
+def begin_drain():
+    """Stop taking syntheses (503) and tell the frontend; those in flight finish"""
+    if DRAINING.is_set():
+        return
+    DRAINING.set()
+    if REGISTRY_URL:
+        try:
+            push_health(public_url())
+        except Exception:
+            pass
+
+def in_flight():
+    """Syntheses still being generated"""
+    return NODE.in_flight
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=PORT, debug=True)
\ No newline at end of file
+    # Development server; use `python serve.py chairman` in production
+    # Under the debug reloader only the child process (WERKZEUG_RUN_MAIN) serves requests
+    if os.getenv('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_tasks()
+    app.run(host='0.0.0.0', port=PORT, debug=True)
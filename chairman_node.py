@@ -0,0 +1,276 @@
+import threading
+import time
+import ollama_client
+from kv_context import question_prefix
+from metrics import METRICS, GENERATION_ERRORS, instrument_stream, record_generation
+from ollama_client import OllamaError
+from response_cache import cache_options, make_key
+
+PROMPTS_SHRUNK = METRICS.counter(
+    'council_chairman_prompts_shrunk_total', "Synthesis prompts the context budget had to shrink")
+
+# Options pour éviter de dépasser la mémoire
+# (num_ctx et num_predict sont choisis par requête par le budget de contexte)
+SYNTHESIS_OPTIONS = {
+    'temperature': 0.7
+}
+
+
+def build_synthesis_prompt(query, answers, reviews):
+    """Build the chairman prompt from all answers and reviews"""
+    answers_text = "\n\n".join([
+        f"Response from {ans.get('member_id', 'Unknown')} (Model: {ans.get('model', 'Unknown')}):\n{ans.get('answer', 'No text')}"
+        for ans in answers
+    ])
+
+    def review_text(rev):
+        text = f"Review by {rev.get('member_id', 'Unknown')}:\nRanking: {', '.join(rev.get('ranking', []))}"
+        if rev.get('scores'):
+            text += "\nScores: " + ", ".join(f"{k} {v:g}/10" for k, v in rev['scores'].items())
+        return text + f"\nReasoning: {rev.get('reasoning', 'N/A')}"
+
+    reviews_text = "\n\n".join([review_text(rev) for rev in reviews])
+
+    return question_prefix(query) + f"""You are the Chairman of an LLM Council.
+
+COUNCIL RESPONSES:
+{answers_text}
+
+PEER REVIEWS:
+{reviews_text}
+
+Based on these responses and reviews, provide a final, synthesized answer that represents the best collective wisdom.
+Your final answer:"""
+
+
+def build_light_edit_prompt(query, answers, reviews):
+    """Short chairman prompt when the reviewers agree on one answer
+
+    `answers` holds just the winning answer; the reviews only contribute
+    their reasoning.
+    """
+    best = answers[0]
+    notes = "\n".join([
+        f"- {rev.get('member_id', 'Unknown')}: {rev.get('reasoning', '')}"
+        for rev in reviews if rev.get('reasoning')
+    ])
+
+    return question_prefix(query) + f"""You are the Chairman of an LLM Council. The council's reviewers agree that the answer below is the best one.
+
+BEST ANSWER (from {best.get('member_id', 'Unknown')}):
+{best.get('answer', '')}
+
+REVIEWERS' NOTES:
+{notes or '- none'}
+
+Lightly edit this answer: fix errors or unclear wording the notes point out, keep its content and structure, and do not add new sections.
+Your final answer:"""
+
+
+class Synthesis:
+    """One prepared synthesis request: prompt, options and deadline"""
+
+    def __init__(self, prompt, options, budget, cache_key, deadline, mode='synthesize'):
+        self.prompt = prompt
+        self.options = options
+        self.budget = budget
+        self.cache_key = cache_key
+        self.deadline = deadline
+        self.mode = mode
+
+    @property
+    def stage(self):
+        """Metrics label of the generation"""
+        return 'light_edit' if self.mode == 'light_edit' else 'synthesis'
+
+    def timeout(self):
+        return 300 if self.deadline is None else max(min(300, self.deadline - time.time()), 1)
+
+
+class ChairmanNode:
+    """The chairman's synthesis logic, independent of HTTP
+
+    chairman.py serves one of these over Flask; in single-node mode the
+    frontend hosts it in-process and calls handle() directly with the
+    same request dict /synthesize takes.
+    """
+
+    def __init__(self, model, ollama_host, budget, cache=None, keeper=None, keep_alive=None, tuner=None):
+        self.model = model
+        self.ollama_host = ollama_host
+        self.budget = budget
+        self.cache = cache
+        self.keeper = keeper
+        self.keep_alive = keep_alive
+        self.tuner = tuner
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def _track(self, delta):
+        with self._lock:
+            self.in_flight += delta
+
+    def summarize_answer(self, text, max_words, use_cache=True):
+        """Map step of the map-reduce budget strategy: shorten one answer"""
+        prompt = f"Summarize the following answer in at most {max_words} words, keeping every key fact:\n\n{text}\n\nSummary:"
+        options = {'num_ctx': self.budget.context_sizes[-1], 'num_predict': max_words * 2, 'temperature': 0.2}
+        cache_key = make_key('summary', self.model, prompt, cache_options(options)) if self.cache is not None and use_cache else None
+        started = time.time()
+        try:
+            result = ollama_client.generate(
+                self.ollama_host, self.model, prompt, options=options,
+                timeout=120, cache=self.cache, cache_key=cache_key, keep_alive=self.keep_alive
+            )
+        except OllamaError:
+            GENERATION_ERRORS.inc(stage='summary')
+            raise
+        record_generation('summary', result, time.time() - started)
+        return result.get('response', '').strip()
+
+    def prepare(self, data):
+        """Fit a /synthesize request into the context budget
+
+        Raises ValueError when there is no query. `data['deadline']` is
+        the frontend's remaining time budget in seconds.
+        """
+        deadline = None
+        if data.get('deadline') is not None:
+            deadline = time.time() + float(data['deadline'])
+
+        query = data.get('query', '')
+        answers = data.get('answers', [])
+        reviews = data.get('reviews', [])
+
+        print(f"Query: {query}")
+        print(f"Answers received: {len(answers)}")
+        print(f"Reviews received: {len(reviews)}")
+
+        if not query:
+            raise ValueError('No query provided')
+
+        # 'light_edit': the reviewers agree on data['winner'], whose answer
+        # only needs polishing instead of a synthesis of all of them
+        mode = data.get('mode', 'synthesize')
+        build_prompt = build_synthesis_prompt
+        if mode == 'light_edit':
+            answers = [ans for ans in answers if ans.get('member_id') == data.get('winner')][:1]
+            if not answers:
+                raise ValueError('Winner not among the answers')
+            build_prompt = build_light_edit_prompt
+
+        # Fit the prompt into the context budget before choosing num_ctx
+        prompt, num_ctx, budget = self.budget.fit(
+            query, answers, reviews, build_prompt,
+            summarize_fn=lambda text, max_words: self.summarize_answer(text, max_words, not data.get('no_cache'))
+        )
+        options = dict(SYNTHESIS_OPTIONS, num_ctx=num_ctx, num_predict=self.budget.reserve_tokens)
+        for action in budget['actions']:
+            print(f"Budget: {action}")
+        if budget['actions']:
+            PROMPTS_SHRUNK.inc()
+
+        print(f"Sending prompt to Ollama ({len(prompt)} chars, ~{budget['estimated_prompt_tokens']} tokens, num_ctx {num_ctx})...")
+
+        synthesis = Synthesis(prompt, options, budget, None, deadline, mode)
+        if self.tuner is not None:
+            # Keeps the budget's num_ctx; caps num_predict to the latency target
+            synthesis.options = self.tuner.options(
+                synthesis.stage, budget['estimated_prompt_tokens'], base=options, remaining=data.get('deadline'))
+        # Keyed on the options the generation actually runs with
+        if self.cache is not None and not data.get('no_cache'):
+            synthesis.cache_key = make_key('synthesis', self.model, prompt, cache_options(synthesis.options))
+        return synthesis
+
+    def stream(self, synthesis):
+        """Yield Ollama's tokens as events, then a final 'done' event
+
+        Past the deadline the generation is stopped and the text so far
+        is sent as the final answer, marked partial.
+        """
+        tokens = []
+        cached = False
+        partial = False
+        self._track(1)
+        chunks = ollama_client.generate_stream(
+            self.ollama_host, self.model, synthesis.prompt,
+            options=synthesis.options,
+            timeout=synthesis.timeout(),
+            cache=self.cache, cache_key=synthesis.cache_key, keep_alive=self.keep_alive
+        )
+        if self.tuner is not None:
+            chunks = self.tuner.observe_stream(chunks, synthesis.options)
+        chunks = instrument_stream(chunks, synthesis.stage)
+        try:
+            for chunk in chunks:
+                token = chunk.get('response', '')
+                cached = cached or chunk.get('cached', False)
+                if token:
+                    tokens.append(token)
+                    yield {'role': 'chairman', 'token': token}
+                if synthesis.deadline is not None and time.time() >= synthesis.deadline and not chunk.get('done'):
+                    print("Deadline reached, sending the synthesis so far")
+                    partial = True
+                    break
+            print("✓ Synthesis streamed successfully!")
+            yield {
+                'done': True,
+                'role': 'chairman',
+                'model': self.model,
+                'final_answer': ''.join(tokens),
+                'cached': cached,
+                'partial': partial,
+                'mode': synthesis.mode,
+                'budget': synthesis.budget
+            }
+        except Exception as e:
+            print(f"!!! {e} !!!")
+            yield {'role': 'chairman', 'error': str(e)}
+        finally:
+            # Closing the stream is what makes Ollama stop generating
+            chunks.close()
+            self._track(-1)
+
+    def generate(self, synthesis):
+        """Blocking synthesis; raises OllamaError if Ollama fails"""
+        started = time.time()
+        self._track(1)
+        try:
+            result = ollama_client.generate(
+                self.ollama_host, self.model, synthesis.prompt,
+                options=synthesis.options,
+                timeout=synthesis.timeout(),
+                cache=self.cache, cache_key=synthesis.cache_key, keep_alive=self.keep_alive
+            )
+        except OllamaError:
+            GENERATION_ERRORS.inc(stage=synthesis.stage)
+            raise
+        finally:
+            self._track(-1)
+        record_generation(synthesis.stage, result, time.time() - started)
+        if self.tuner is not None:
+            self.tuner.observe(synthesis.options, result)
+        print("✓ Synthesis generated successfully!")
+        return {
+            'role': 'chairman',
+            'model': self.model,
+            'final_answer': result.get('response', ''),
+            'cached': result.get('cached', False),
+            'mode': synthesis.mode,
+            'budget': synthesis.budget
+        }
+
+    def handle(self, path, data):
+        """In-process equivalent of a streamed POST to /synthesize"""
+        return self.stream(self.prepare(data))
+
+    def health(self):
+        return {
+            'status': 'healthy',
+            'role': 'chairman',
+            'model': self.model,
+            'model_state': self.keeper.state if self.keeper else None,
+            'in_flight': self.in_flight,
+            'residency': self.keeper.stats() if self.keeper else None,
+            'tuning': self.tuner.stats() if self.tuner else None,
+            'cache': self.cache.stats() if self.cache else None
+        }
@@ -0,0 +1,101 @@
+"""Cached cluster health and the live status channel of the frontend
+
+Nodes push their status (members with their /register heartbeat, the
+chairman through /heartbeat), so reading the cluster's health is a
+dictionary lookup instead of a round of HTTP calls to every node and
+every Ollama. Nodes that do not push (no REGISTRY_URL set) are probed
+in the background, and only when their last status is older than
+`stale_after`.
+
+StatusChannel fans events (cluster changes, session progress) out to
+every subscriber, e.g. the /events server-sent events stream.
+"""
+import queue
+import threading
+import time
+
+
+class StatusChannel:
+    """Publish/subscribe of status events; slow subscribers lose events, not the publisher"""
+
+    def __init__(self, max_queued=100):
+        self.max_queued = max_queued
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, limit=None):
+        """A new subscriber queue, or None if `limit` subscribers are already there"""
+        q = queue.Queue(maxsize=self.max_queued)
+        with self._lock:
+            if limit is not None and len(self._subscribers) >= limit:
+                return None
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                pass
+
+    def subscribers(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+def _summary(status):
+    """The parts of a node status whose change is worth telling subscribers"""
+    data = status.get('data') or {}
+    queue_stats = data.get('queue') or {}
+    return (status.get('status'), data.get('model_state'), data.get('in_flight'),
+            queue_stats.get('running'), str(queue_stats.get('queued')))
+
+
+class ClusterState:
+    """Latest status of each node, by URL
+
+    A status is {'status': 'healthy' / 'unhealthy' / 'unreachable',
+    'data': the node's /health payload, 'source': 'push' or 'probe',
+    'updated': time}. `on_change(url)` is called when a node's status,
+    model state or load changes.
+    """
+
+    def __init__(self, stale_after=30, on_change=None):
+        self.stale_after = stale_after
+        self.on_change = on_change
+        self._nodes = {}
+        self._lock = threading.Lock()
+
+    def update(self, url, status, data=None, source='push', error=None):
+        entry = {'status': status, 'data': data, 'source': source, 'updated': time.time()}
+        if error is not None:
+            entry['error'] = error
+        with self._lock:
+            previous = self._nodes.get(url)
+            self._nodes[url] = entry
+        if self.on_change is not None and (previous is None or _summary(previous) != _summary(entry)):
+            self.on_change(url)
+        return entry
+
+    def get(self, url):
+        with self._lock:
+            entry = self._nodes.get(url)
+        if entry is None:
+            return {'status': 'unknown', 'data': None}
+        return dict(entry, age=time.time() - entry['updated'])
+
+    def is_stale(self, url):
+        with self._lock:
+            entry = self._nodes.get(url)
+        return entry is None or time.time() - entry['updated'] > self.stale_after
+
+    def forget(self, url):
+        with self._lock:
+            self._nodes.pop(url, None)
@@ -39,6 +39,158 @@ COUNCIL_MEMBERS = [
     }
 ]
 
+# Single-node mode: the members and the chairman run inside the frontend's
+# process against OLLAMA_HOST, with no HTTP hop between stages. A single
+# member (or the chairman) can also be hosted in-process by setting its URL
+# to "local"; the others stay remote.
+SINGLE_NODE = False
+LOCAL_WORKERS = 1          # generations each in-process node runs at once (match OLLAMA_NUM_PARALLEL)
+LOCAL_QUEUE_DEPTH = 8      # requests waiting per in-process member before it reports busy
+LOCAL_KEEP_ALIVE = "30m"   # how long Ollama keeps their models loaded
+
+# Per-box tuning of the in-process nodes (remote members and the chairman
+# read the same settings from TUNING, LATENCY_TARGET_<STAGE> and TUNE_*
+# environment variables): each node measures its model over the option
+# grid at startup (profile kept in TUNING_DIR/profile_<node>.json), then
+# requests get the fastest options and a num_predict cap meant to finish
+# within the stage's target in seconds (None = no cap)
+TUNING_ENABLED = True
+TUNING_DIR = "."
+LATENCY_TARGETS = {'answer': 60, 'review': 60, 'synthesis': 90, 'light_edit': 60}
+TUNE_NUM_CTX = [2048, 4096]   # members; the chairman uses its context budget's sizes
+TUNE_NUM_THREAD = [None]      # None = Ollama's default
+TUNE_NUM_BATCH = [None]
+
+# KV context reuse: each member keeps the Ollama context of its answers (at
+# most CONTEXT_STORE_TOKENS tokens, each for CONTEXT_STORE_TTL seconds after
+# its last use) and generates its review as a continuation of its answer,
+# so the question is not prefilled again. Remote members read CONTEXT_REUSE,
+# CONTEXT_STORE_TOKENS, CONTEXT_STORE_TTL and OLLAMA_NUM_CTX from the environment.
+CONTEXT_REUSE = True
+CONTEXT_STORE_TOKENS = 200000
+CONTEXT_STORE_TTL = 600
+OLLAMA_NUM_CTX = 2048      # Ollama's context window when tuning does not choose one
+
+# Cascade mode (see cascade.py): the fastest member (or CASCADE_MEMBER)
+# answers alone and a verifier (the next fastest, or CASCADE_VERIFIER)
+# scores its confidence; at CASCADE_THRESHOLD (0-1) or above that answer
+# is the result, below it the full council runs, reusing the answer
+CASCADE_ENABLED = False
+CASCADE_MEMBER = None
+CASCADE_VERIFIER = None
+CASCADE_THRESHOLD = 0.8
+
+# Review plan (see review_plan.py): 'all' has every member review every
+# other answer (Stage 2 grows as n² with the council), 'sampled' has each
+# answer reviewed by about REVIEWS_PER_ANSWER members (faster members
+# review more), 'pairwise' has each member compare two answers, and
+# 'auto' is 'all' up to REVIEW_PLAN_FULL_UP_TO members, 'sampled' above
+REVIEW_PLAN = 'auto'
+REVIEWS_PER_ANSWER = 3
+REVIEW_PLAN_FULL_UP_TO = 5
+
+# Stage pipelining: each stage starts as soon as its quorum is reached
+# instead of waiting for every member. None means "wait for all".
+REVIEW_QUORUM = None       # answers needed before reviews start
+REVIEW_WAIT = None         # or start reviews this many seconds after the first answer
+SYNTHESIS_QUORUM = None    # reviews needed before the chairman starts
+SYNTHESIS_WAIT = None      # or start synthesis this many seconds after the first review
+LATE_RESULTS = 'append'    # 'append' keeps stragglers in the result, 'drop' discards them
+
+# Stage 3 shortcut: when the reviews agree on a best answer (it is also the
+# Condorcet winner and at least CONSENSUS_MIN_REVIEWS reviews compared it),
+# return it as is from a top-1 agreement of CONSENSUS_DIRECT, or have the
+# chairman only lightly edit it from CONSENSUS_LIGHT_EDIT; otherwise run the
+# full synthesis. None disables a shortcut. Needs 3+ members: with 2, every
+# review sees a single answer and nothing is compared.
+CONSENSUS_DIRECT = 1.0
+CONSENSUS_LIGHT_EDIT = 0.6
+CONSENSUS_MIN_REVIEWS = 2
+
+# Per-stage deadlines (seconds from the start of the stage). Members and the
+# chairman get the remaining budget, stop generating when it runs out and
+# return what they have (marked 'partial'); the session then goes on with
+# the results in hand. None means no deadline.
+ANSWER_DEADLINE = 120
+REVIEW_DEADLINE = 120
+SYNTHESIS_DEADLINE = 240
+DEADLINE_GRACE = 5         # extra seconds to wait for a node's partial result
+
+# Hedged requests: if a member replica has not sent its first token after
+# its usual time to first token (HEDGE_PERCENTILE of recent calls), the same
+# call is also sent to another replica of that member; the first one to
+# start answering wins and the other is cancelled
+HEDGE_ENABLED = True
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_SAMPLES = 20     # fewer samples than this: wait HEDGE_DEFAULT_DELAY
+HEDGE_DEFAULT_DELAY = 10.0
+HEDGE_MIN_DELAY = 0.5
+
+# Frontend concurrency: one shared worker pool for all sessions, and at most
+# this many simultaneous generation requests sent to each member/chairman
+ORCHESTRATOR_WORKERS = 64
+BACKEND_MAX_CONCURRENCY = 2
+
+# Wire format to remote nodes: answers a node was already sent go by
+# content hash instead of in full (nodes keep them BLOB_TTL seconds), and
+# request bodies from WIRE_COMPRESS_MIN_BYTES on are gzipped (None = never)
+WIRE_BLOB_REFS = True
+WIRE_COMPRESS_MIN_BYTES = 1024
+WIRE_SENT_TTL = 600        # keep below the nodes' BLOB_TTL
+
+# Whole-session response cache on the frontend (SQLite file, LRU + TTL)
+CACHE_ENABLED = True
+CACHE_PATH = "cache_frontend.sqlite3"
+CACHE_MAX_ENTRIES = 1000
+CACHE_MAX_BYTES = 50 * 1024 * 1024
+CACHE_TTL = 7 * 24 * 3600  # seconds
+
+# Semantic cache: serve a stored session when a new query is close enough
+# to a previous one (needs: ollama pull nomic-embed-text on the frontend PC).
+# Off by default: a close query is not always the same question, and a hit
+# returns the other question's answer. Entries only match the council
+# (member and chairman models) that produced them.
+SEMANTIC_CACHE_ENABLED = False
+EMBEDDING_MODEL = "nomic-embed-text"
+SEMANTIC_THRESHOLD = 0.92          # cosine similarity needed for a hit
+SEMANTIC_MAX_ENTRIES = 5000
+SEMANTIC_APPROX_THRESHOLD = 2000   # use the approximate (LSH) index above this size, None = always exact
+
+# Dynamic membership: extra member replicas register with the frontend and
+# must heartbeat at least this often (seconds) to keep receiving work
+HEARTBEAT_TTL = 30
+
+# Node health is pushed by the nodes (members started with REGISTRY_URL
+# heartbeat through /register, the chairman through /heartbeat). Nodes whose
+# last status is older than HEALTH_STALE_AFTER seconds are probed instead,
+# checked every HEALTH_PROBE_INTERVAL seconds
+HEALTH_STALE_AFTER = 30
+HEALTH_PROBE_INTERVAL = 15
+
+# Every open /events stream (one per browser tab) holds a request thread of
+# the frontend for as long as it is open, as does every streamed query.
+# Beyond MAX_EVENT_STREAMS, /events answers 503 and the page polls
+# /health_check instead; run `serve.py frontend` with --threads above
+# MAX_EVENT_STREAMS plus the streamed queries you expect at once
+MAX_EVENT_STREAMS = 16
+
+# How many times to wait out a member whose every replica answered 429 (busy)
+BUSY_RETRIES = 3
+
+# Session log: every council session gets an id and its answers, reviews
+# and synthesis are appended to SESSION_DIR/<id>.jsonl as they complete, so
+# an interrupted session can be resumed (POST /sessions/<id>/resume)
+# without regenerating them. Files untouched for SESSION_MAX_AGE seconds
+# are deleted at startup.
+SESSIONS_ENABLED = True
+SESSION_DIR = "sessions"
+SESSION_MAX_AGE = 7 * 24 * 3600
+
+# Batch mode (python batch.py or POST /submit_batch): council sessions kept
+# in flight at once, and where /submit_batch keeps inputs and results
+BATCH_CONCURRENCY = 4
+BATCH_DIR = "batches"
+
 def print_config():
     """Print current configuration for verification"""
     print("=" * 60)
@@ -62,8 +214,27 @@ def print_config():
     print(f"  Model: {CHAIRMAN_MODEL}")
     print(f"  URL:   {CHAIRMAN_URL}")
     
+    if SINGLE_NODE:
+        print(f"\nSingle-node mode: members and chairman run in-process on {OLLAMA_HOST}")
+        print(f"  Tuning: {'targets ' + str(LATENCY_TARGETS) if TUNING_ENABLED else 'disabled'}")
+    
+    print(f"\nPipelining:")
+    print(f"  Review quorum:    {REVIEW_QUORUM or 'all'} (max wait: {REVIEW_WAIT or 'none'})")
+    print(f"  Synthesis quorum: {SYNTHESIS_QUORUM or 'all'} (max wait: {SYNTHESIS_WAIT or 'none'})")
+    print(f"  Late results:     {LATE_RESULTS}")
+    print(f"  Deadlines:        answers {ANSWER_DEADLINE or 'none'}, reviews {REVIEW_DEADLINE or 'none'}, synthesis {SYNTHESIS_DEADLINE or 'none'}")
+    print(f"  Cascade:          {'threshold ' + str(CASCADE_THRESHOLD) if CASCADE_ENABLED else 'disabled'}")
+    print(f"  Review plan:      {REVIEW_PLAN} ({REVIEWS_PER_ANSWER} reviews per answer when sampled)")
+    print(f"  Consensus:        direct at {CONSENSUS_DIRECT or 'never'}, light edit at {CONSENSUS_LIGHT_EDIT or 'never'}")
+    print(f"  Hedging:          {'p' + str(HEDGE_PERCENTILE) + ' time to first token' if HEDGE_ENABLED else 'disabled'}")
+    
     print(f"\nFrontend:")
     print(f"  Port:  {FRONTEND_PORT}")
+    print(f"  Workers: {ORCHESTRATOR_WORKERS} (max {BACKEND_MAX_CONCURRENCY} calls per node)")
+    print(f"  Event streams: max {MAX_EVENT_STREAMS}")
+    print(f"  Cache: {CACHE_PATH if CACHE_ENABLED else 'disabled'}")
+    print(f"  Sessions: {SESSION_DIR if SESSIONS_ENABLED else 'not recorded'}")
+    print(f"  Semantic cache: {EMBEDDING_MODEL + ' @ ' + str(SEMANTIC_THRESHOLD) if SEMANTIC_CACHE_ENABLED else 'disabled'}")
     print(f"  Access: http://{MEMBER1_IP}:{FRONTEND_PORT}")
     print("=" * 60)
 
@@ -0,0 +1,119 @@
+from concurrent.futures import ThreadPoolExecutor
+from aggregation import borda_points
+
+
+def estimate_tokens(text, chars_per_token=3.5):
+    """Cheap token estimate; 3.5 chars/token errs on the large side for English"""
+    return int(len(text) / chars_per_token) + 1
+
+
+def truncate_text(text, max_chars):
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(' ', 1)[0] + " [...]"
+
+
+class ContextBudget:
+    """Fits the synthesis prompt into the smallest context window possible
+
+    The prompt is rebuilt after each strategy until it fits in the largest
+    allowed `num_ctx` minus the tokens reserved for the answer:
+      - 'reasoning': shorten each review's reasoning
+      - 'drop':      drop the lowest-ranked answers (Stage 2 Borda score)
+      - 'summarize': pre-summarize long answers in parallel (map-reduce)
+      - 'truncate':  hard-cut answers to an equal share of the budget
+    The smallest size in `context_sizes` that holds the result is used,
+    so short councils keep paying for a short context.
+    """
+
+    def __init__(self, context_sizes=(2048, 4096, 8192), reserve_tokens=512,
+                 chars_per_token=3.5, strategies=('reasoning', 'drop', 'summarize', 'truncate'),
+                 min_answers=2, reasoning_chars=300):
+        self.context_sizes = sorted(context_sizes)
+        self.reserve_tokens = reserve_tokens
+        self.chars_per_token = chars_per_token
+        self.strategies = strategies
+        self.min_answers = min_answers
+        self.reasoning_chars = reasoning_chars
+
+    def tokens(self, text):
+        return estimate_tokens(text, self.chars_per_token)
+
+    def fit(self, query, answers, reviews, build_prompt, summarize_fn=None):
+        """Return (prompt, num_ctx, report) for the given council output
+
+        `summarize_fn(text, max_words)` backs the 'summarize' strategy; it
+        is skipped when not given.
+        """
+        limit = self.context_sizes[-1] - self.reserve_tokens
+        answers = list(answers)
+        reviews = list(reviews)
+        actions = []
+        prompt = build_prompt(query, answers, reviews)
+        original_tokens = self.tokens(prompt)
+
+        for strategy in self.strategies:
+            if self.tokens(prompt) <= limit:
+                break
+
+            if strategy == 'reasoning':
+                reviews = [
+                    dict(rev, reasoning=truncate_text(rev.get('reasoning', ''), self.reasoning_chars))
+                    for rev in reviews
+                ]
+                actions.append('truncated review reasoning')
+
+            elif strategy == 'drop':
+                scores = borda_points(len(answers), reviews)
+                order = sorted(range(len(answers)), key=lambda i: scores[i])
+                keep = set(range(len(answers)))
+                for idx in order:
+                    if len(keep) <= self.min_answers:
+                        break
+                    if self.tokens(build_prompt(query, [answers[i] for i in sorted(keep)], reviews)) <= limit:
+                        break
+                    keep.discard(idx)
+                    actions.append(f"dropped answer from {answers[idx].get('member_id', idx)}")
+                answers = [answers[i] for i in sorted(keep)]
+
+            elif strategy in ('summarize', 'truncate'):
+                share = self._answer_share(query, answers, reviews, build_prompt, limit)
+                long_ones = [i for i, ans in enumerate(answers) if len(ans.get('answer', '')) > share]
+                if not long_ones:
+                    continue
+                if strategy == 'summarize' and summarize_fn is not None:
+                    max_words = max(int(share / 6), 20)
+                    with ThreadPoolExecutor(max_workers=len(long_ones)) as pool:
+                        summaries = list(pool.map(
+                            lambda i: summarize_fn(answers[i].get('answer', ''), max_words),
+                            long_ones
+                        ))
+                    for i, summary in zip(long_ones, summaries):
+                        answers[i] = dict(answers[i], answer=truncate_text(summary, share))
+                    actions.append(f"summarized {len(long_ones)} answers")
+                elif strategy == 'truncate':
+                    for i in long_ones:
+                        answers[i] = dict(answers[i], answer=truncate_text(answers[i].get('answer', ''), share))
+                    actions.append(f"truncated {len(long_ones)} answers")
+
+            prompt = build_prompt(query, answers, reviews)
+
+        prompt_tokens = self.tokens(prompt)
+        num_ctx = next(
+            (size for size in self.context_sizes if prompt_tokens + self.reserve_tokens <= size),
+            self.context_sizes[-1]
+        )
+        return prompt, num_ctx, {
+            'estimated_prompt_tokens': prompt_tokens,
+            'original_prompt_tokens': original_tokens,
+            'num_ctx': num_ctx,
+            'answers_used': len(answers),
+            'actions': actions
+        }
+
+    def _answer_share(self, query, answers, reviews, build_prompt, limit):
+        """Characters each answer may use once the fixed prompt parts are paid for"""
+        empty = [dict(ans, answer='') for ans in answers]
+        overhead = self.tokens(build_prompt(query, empty, reviews))
+        per_answer = max(limit - overhead, 0) / max(len(answers), 1)
+        return max(int(per_answer * self.chars_per_token), 200)
@@ -1,7 +1,19 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import requests
+import atexit
 import os
+import socket
+import threading
+from admission import AdmissionQueue, QueueFull
+from member_node import MemberNode
+from kv_context import ContextStore
+from metrics import METRICS, CONTENT_TYPE, register_cache_metrics, register_model_metrics
+from model_keeper import ModelKeeper, parse_keep_alive
+from model_tuning import Tuner, candidate_grid, parse_seconds, parse_values
+from ollama_client import to_ndjson
+from response_cache import ResponseCache
+from wire import BlobStore, MissingBlobs, read_json, unpack_answers
 
 app = Flask(__name__)
 CORS(app)
@@ -9,57 +21,168 @@ CORS(app)
 OLLAMA_HOST = os.getenv('OLLAMA_HOST', 'http://localhost:11434')
 MODEL_NAME = os.getenv('MODEL_NAME', 'llama2')
 MEMBER_ID = os.getenv('MEMBER_ID', 'member1')
+PORT = int(os.getenv('PORT', 5001))
+
+# Model residency: preload MODEL_NAME at startup and keep it loaded for
+# KEEP_ALIVE (Ollama duration, -1 = forever), reloading it if Ollama unloads it
+KEEP_ALIVE = parse_keep_alive(os.getenv('KEEP_ALIVE', '30m'))
+KEEPER = ModelKeeper(
+    OLLAMA_HOST, MODEL_NAME, KEEP_ALIVE,
+    preload=os.getenv('PRELOAD', '1') == '1',
+    keep_warm=os.getenv('KEEP_WARM', '1') == '1',
+    check_interval=float(os.getenv('WARM_CHECK_INTERVAL', 15))
+)
+
+# Dynamic membership: with REGISTRY_URL set (the frontend's URL), this member
+# registers itself and heartbeats so the frontend can route work to it
+REGISTRY_URL = os.getenv('REGISTRY_URL')
+PUBLIC_URL = os.getenv('PUBLIC_URL')  # how the frontend reaches us, defaults to http://<our ip>:<port>
+HEARTBEAT_INTERVAL = float(os.getenv('HEARTBEAT_INTERVAL', 10))
+
+# Set by begin_drain() when the server shuts down (see serve.py): new
+# generations get a 503, the ones in flight finish
+DRAINING = threading.Event()
+
+# Admission control: WORKERS generations run at once (match OLLAMA_NUM_PARALLEL),
+# at most MAX_QUEUE_DEPTH interactive / BATCH_QUEUE_DEPTH batch requests wait
+# behind them, and anything beyond that gets a 429
+ADMISSION = AdmissionQueue(
+    workers=int(os.getenv('WORKERS', 1)),
+    max_depth=int(os.getenv('MAX_QUEUE_DEPTH', 8)),
+    batch_depth=int(os.getenv('BATCH_QUEUE_DEPTH', 4))
+)
+
+# Response cache (set CACHE_ENABLED=0 to turn it off)
+CACHE = None
+if os.getenv('CACHE_ENABLED', '1') == '1':
+    CACHE = ResponseCache(
+        os.getenv('CACHE_PATH', f"cache_{MEMBER_ID}.sqlite3"),
+        max_entries=int(os.getenv('CACHE_MAX_ENTRIES', 1000)),
+        max_bytes=int(os.getenv('CACHE_MAX_BYTES', 50 * 1024 * 1024)),
+        ttl=float(os.getenv('CACHE_TTL', 7 * 24 * 3600))
+    )
+
+# Answer texts received from the frontend, which later requests of the
+# session reference by hash instead of re-sending them (see wire.py)
+BLOBS = BlobStore(
+    max_entries=int(os.getenv('BLOB_MAX_ENTRIES', 2000)),
+    ttl=float(os.getenv('BLOB_TTL', 1800))
+)
+
+# Per-box tuning (TUNING=0 to turn it off): at startup the model is measured
+# over the TUNE_* option grid (profile kept in TUNING_PROFILE), then each
+# request gets the fastest options and a num_predict cap meant to finish
+# within LATENCY_TARGET_<STAGE> seconds (or the request's deadline)
+TUNER = None
+if os.getenv('TUNING', '1') == '1':
+    TUNER = Tuner(
+        OLLAMA_HOST, MODEL_NAME, os.getenv('TUNING_PROFILE', f"profile_{MEMBER_ID}.json"),
+        targets={
+            'answer': parse_seconds(os.getenv('LATENCY_TARGET_ANSWER', '60')),
+            'review': parse_seconds(os.getenv('LATENCY_TARGET_REVIEW', '60'))
+        },
+        grid=candidate_grid(
+            parse_values(os.getenv('TUNE_NUM_CTX', '2048,4096')),
+            parse_values(os.getenv('TUNE_NUM_THREAD', 'default')),
+            parse_values(os.getenv('TUNE_NUM_BATCH', 'default'))
+        ),
+        min_predict={'answer': 64, 'review': 256}
+    )
+
+# Ollama contexts of this member's answers, so its review continues from its
+# answer instead of prefilling the question again (CONTEXT_REUSE=0 to turn it
+# off). OLLAMA_NUM_CTX is Ollama's context window when tuning does not set one.
+CONTEXTS = None
+if os.getenv('CONTEXT_REUSE', '1') == '1':
+    CONTEXTS = ContextStore(
+        max_tokens=int(os.getenv('CONTEXT_STORE_TOKENS', 200000)),
+        ttl=float(os.getenv('CONTEXT_STORE_TTL', 600))
+    )
+
+# The generation logic; the routes below only translate HTTP to and from it
+# Reviews that come out unusable get one short repair generation (REVIEW_REPAIR=0 to skip)
+NODE = MemberNode(
+    MEMBER_ID, MODEL_NAME, OLLAMA_HOST, ADMISSION, cache=CACHE, keeper=KEEPER, keep_alive=KEEP_ALIVE,
+    repair=os.getenv('REVIEW_REPAIR', '1') == '1', tuner=TUNER,
+    contexts=CONTEXTS, context_window=int(os.getenv('OLLAMA_NUM_CTX', 2048))
+)
+
+# Prometheus-style metrics, scraped from /metrics
+METRICS.gauge('council_member_in_flight', "Generations currently being served",
+              fn=lambda: {(): NODE.in_flight})
+METRICS.gauge('council_member_queue_depth', "Requests waiting in the admission queue", ['lane'],
+              fn=lambda: {(('lane', lane),): n for lane, n in ADMISSION.stats()['queued'].items()})
+METRICS.gauge('council_member_running', "Generations running on Ollama",
+              fn=lambda: {(): ADMISSION.stats()['running']})
+METRICS.gauge('council_member_coalesced', "Requests that joined an identical queued or running generation",
+              fn=lambda: {(): ADMISSION.stats()['coalesced']})
+register_cache_metrics({'member': CACHE})
+register_model_metrics({MEMBER_ID: KEEPER})
+
+def node_health():
+    """This member's status, as served on /health and pushed with heartbeats
+
+    Whether Ollama is up comes from the model keeper's periodic check, so
+    health reads don't add requests to a busy Ollama; Ollama is only
+    asked directly when the keeper has no recent answer.
+    """
+    ollama_status = KEEPER.ollama_status()
+    if ollama_status is None:
+        try:
+            response = requests.get(f"{OLLAMA_HOST}/api/tags", timeout=5)
+            ollama_status = 'connected' if response.status_code == 200 else 'error'
+        except Exception:
+            ollama_status = 'unreachable'
+    health = dict(NODE.health(), ollama_status=ollama_status, blobs=BLOBS.stats())
+    if ollama_status != 'connected':
+        health.update(status='unhealthy', error=f"Ollama {ollama_status}")
+    if DRAINING.is_set():
+        health.update(status='draining', error='Shutting down')
+    return health
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Check if the service and Ollama are running"""
+    health = node_health()
+    return jsonify(health), 200 if health['status'] == 'healthy' else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of this member's metrics"""
+    return Response(METRICS.render(), content_type=CONTENT_TYPE)
+
+def serve_generation(stage):
+    """Queue a generation for this request and answer with its result
+
+    Streamed as NDJSON events if the request asks for it. Answers sent
+    by reference that we no longer have get a 409 listing them. Identical
+    prompts already queued or running are shared, and a full queue
+    answers 429 with a Retry-After header.
+    """
+    if DRAINING.is_set():
+        return jsonify({'error': 'Member is shutting down', 'member_id': MEMBER_ID}), 503, {'Retry-After': '1'}
+    data = read_json(request) or {}
     try:
-        response = requests.get(f"{OLLAMA_HOST}/api/tags", timeout=5)
-        if response.status_code == 200:
-            return jsonify({
-                'status': 'healthy',
-                'member_id': MEMBER_ID,
-                'model': MODEL_NAME,
-                'ollama_status': 'connected'
-            }), 200
-    except Exception as e:
-        return jsonify({
-            'status': 'unhealthy',
-            'member_id': MEMBER_ID,
-            'error': str(e)
-        }), 503
+        unpack_answers(data, BLOBS)
+    except MissingBlobs as e:
+        return jsonify({'error': str(e), 'missing': e.missing}), 409
+    try:
+        job, finish, deadline = NODE.submit(stage, data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except QueueFull as e:
+        return jsonify({'error': str(e), 'member_id': MEMBER_ID}), 429, {'Retry-After': str(e.retry_after)}
+
+    if data.get('stream'):
+        events = NODE.stream(job, finish, deadline)
+        return Response((to_ndjson(event) for event in events), mimetype='application/x-ndjson')
+    return jsonify(NODE.wait(job, finish)), 200
 
 @app.route('/answer', methods=['POST'])
 def generate_answer():
     """Generate an answer to the user query"""
     try:
-        data = request.json
-        query = data.get('query', '')
-        
-        if not query:
-            return jsonify({'error': 'No query provided'}), 400
-        
-        # Call Ollama API
-        ollama_response = requests.post(
-            f"{OLLAMA_HOST}/api/generate",
-            json={
-                'model': MODEL_NAME,
-                'prompt': f"Answer the following question concisely and accurately:\n\n{query}",
-                'stream': False
-            },
-            timeout=120
-        )
-        
-        if ollama_response.status_code == 200:
-            result = ollama_response.json()
-            return jsonify({
-                'member_id': MEMBER_ID,
-                'model': MODEL_NAME,
-                'answer': result.get('response', '')
-            }), 200
-        else:
-            return jsonify({'error': 'Ollama API error'}), 500
-            
+        return serve_generation('answer')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -67,78 +190,78 @@ def generate_answer():
 def review_answers():
     """Review and rank other members' answers"""
     try:
-        data = request.json
-        query = data.get('query', '')
-        answers = data.get('answers', [])
-        
-        if not query or not answers:
-            return jsonify({'error': 'Invalid request'}), 400
-        
-        # Anonymize answers
-        anonymous_answers = []
-        for idx, ans in enumerate(answers):
-            if ans['member_id'] != MEMBER_ID:
-                anonymous_answers.append({
-                    'id': f"Answer_{idx+1}",
-                    'text': ans['answer']
-                })
-        
-        # Create review prompt
-        answers_text = "\n\n".join([
-            f"{ans['id']}:\n{ans['text']}" 
-            for ans in anonymous_answers
-        ])
-        
-        review_prompt = f"""Original Question: {query}
-
-Below are multiple answers to this question. Evaluate each answer based on accuracy, insight, and completeness.
-
-{answers_text}
-
-Rank these answers from best to worst. Provide your ranking as a comma-separated list of IDs (e.g., "Answer_2, Answer_1, Answer_3").
-Then briefly explain your reasoning for the top-ranked answer.
-
-Format your response as:
-RANKING: [your ranking]
-REASONING: [your explanation]"""
-
-        # Call Ollama for review
-        ollama_response = requests.post(
-            f"{OLLAMA_HOST}/api/generate",
-            json={
-                'model': MODEL_NAME,
-                'prompt': review_prompt,
-                'stream': False
-            },
-            timeout=120
-        )
-        
-        if ollama_response.status_code == 200:
-            result = ollama_response.json()
-            review_text = result.get('response', '')
-            
-            # Parse ranking
-            ranking = []
-            reasoning = ""
-            for line in review_text.split('\n'):
-                if 'RANKING:' in line.upper():
-                    ranking_str = line.split(':', 1)[1].strip()
-                    ranking = [r.strip() for r in ranking_str.split(',')]
-                elif 'REASONING:' in line.upper():
-                    reasoning = line.split(':', 1)[1].strip()
-            
-            return jsonify({
-                'member_id': MEMBER_ID,
-                'ranking': ranking,
-                'reasoning': reasoning,
-                'full_review': review_text
-            }), 200
-        else:
-            return jsonify({'error': 'Ollama API error'}), 500
-            
+        return serve_generation('review')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/verify', methods=['POST'])
+def verify_answer():
+    """Score the confidence in a single answer (cascade mode)"""
+    try:
+        return serve_generation('verify')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def public_url():
+    """How the frontend reaches us"""
+    return PUBLIC_URL or f"http://{socket.gethostbyname(socket.gethostname())}:{PORT}"
+
+def heartbeat_loop(url):
+    """Register with the frontend and keep refreshing the registration; deregister when draining"""
+    registered = False
+    while not DRAINING.is_set():
+        try:
+            response = requests.post(f"{REGISTRY_URL}/register", json={
+                'member_id': MEMBER_ID,
+                'model': MODEL_NAME,
+                'url': url,
+                'model_state': KEEPER.state,
+                'in_flight': NODE.in_flight,
+                'queue': ADMISSION.stats(),
+                'health': node_health()
+            }, timeout=5)
+            if response.status_code == 200 and not registered:
+                print(f"✓ Registered with {REGISTRY_URL} as {url}")
+            registered = response.status_code == 200
+        except Exception as e:
+            if registered:
+                print(f"✗ Heartbeat to {REGISTRY_URL} failed: {e}")
+            registered = False
+        DRAINING.wait(HEARTBEAT_INTERVAL)
+    # From this thread, so a heartbeat in flight cannot register us again afterwards
+    deregister()
+
+def deregister():
+    """Leave the frontend's registry, so it stops routing work here"""
+    try:
+        requests.post(f"{REGISTRY_URL}/deregister", json={'url': public_url()}, timeout=2)
+    except Exception:
+        pass
+
+def start_registration():
+    """Start heartbeating to REGISTRY_URL and deregister on exit"""
+    threading.Thread(target=heartbeat_loop, args=(public_url(),), daemon=True).start()
+    atexit.register(deregister)
+
+def start_background_tasks():
+    """Model residency, tuning and registration; run once per serving process"""
+    KEEPER.start()
+    if TUNER:
+        TUNER.start()
+    if REGISTRY_URL:
+        start_registration()
+
+def begin_drain():
+    """Stop taking generations (503) and leave the registry; those in flight finish"""
+    DRAINING.set()
+
+def in_flight():
+    """Generations still being served"""
+    return NODE.in_flight
+
 if __name__ == '__main__':
-    port = int(os.getenv('PORT', 5001))
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    # Development server; use `python serve.py member` in production
+    # Under the debug reloader only the child process (WERKZEUG_RUN_MAIN) serves requests
+    if os.getenv('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_tasks()
+    app.run(host='0.0.0.0', port=PORT, debug=True)
@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import deque
+
+
+class FirstTokenTracker:
+    """Recent time-to-first-token samples per replica, for hedge delays"""
+
+    def __init__(self, window=200):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key, seconds):
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, key, p, min_samples=1):
+        """p-th percentile (0-100) of the samples, or None with too few of them"""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < max(min_samples, 1):
+            return None
+        return samples[min(int(len(samples) * p / 100), len(samples) - 1)]
+
+
+class HedgedCall:
+    """A call raced against a duplicate of itself on another replica
+
+    `call_fn(replica, on_first_token, cancelled)` runs one attempt and
+    returns its result (None on failure). It must call `on_first_token()`
+    when its first token arrives, and give up if that returns False or
+    once `cancelled()` is true. The first attempt to produce a token wins
+    and every other attempt is cancelled, so its node stops generating.
+
+    The first attempt runs on the caller's thread; the hedge runs on
+    `executor`, so waiting for its delay ties up no thread of its own.
+    """
+
+    def __init__(self, call_fn, executor):
+        self.call_fn = call_fn
+        self.executor = executor
+        self.started = []   # replicas, in start order
+        self.outcomes = {}  # replica url -> result or exception
+        self.winner = None
+        self._cancelled = set()
+        self._closed = False  # set once the caller collects the result
+        self._cond = threading.Condition()
+
+    def _start(self, replica):
+        """Enter an attempt on `replica` into the race; False if it is already decided"""
+        with self._cond:
+            if self.winner is not None or self._closed:
+                return False
+            self.started.append(replica)
+            return True
+
+    def run(self, replica, delay, pick_backup, on_hedge=None):
+        """Run the attempt on `replica`, hedging if it has no first token after `delay` seconds
+
+        The hedge goes to `pick_backup()` (None: no hedge), and
+        `on_hedge(backup)` is called once it starts. Returns result().
+        """
+        self._start(replica)
+        hedge_at = time.time() + delay
+
+        def hedge():
+            # Queued behind other work, the executor may run this late
+            if self.wait_first_token(max(hedge_at - time.time(), 0)):
+                return
+            backup = pick_backup()
+            if backup is not None and self._start(backup):
+                if on_hedge is not None:
+                    on_hedge(backup)
+                self._run(backup)
+
+        self.executor.submit(hedge)
+        self._run(replica)
+        return self.result()
+
+    def _claim(self, replica):
+        with self._cond:
+            if self.winner is None:
+                self.winner = replica
+                self._cancelled.update(r.url for r in self.started if r is not replica)
+                self._cond.notify_all()
+            return self.winner is replica
+
+    def _run(self, replica):
+        try:
+            outcome = self.call_fn(
+                replica,
+                lambda: self._claim(replica),
+                lambda: replica.url in self._cancelled
+            )
+        except Exception as e:
+            outcome = e
+        with self._cond:
+            self.outcomes[replica.url] = outcome
+            self._cond.notify_all()
+
+    def _all_finished(self):
+        return len(self.outcomes) == len(self.started)
+
+    def wait_first_token(self, timeout):
+        """Wait until an attempt has won or all have ended; False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.winner is not None or self._all_finished(), timeout)
+
+    def result(self):
+        """The winner's outcome, or every outcome if nobody produced a token
+
+        Returns (winning replica or None, outcome or {url: outcome}).
+        No hedge starts once this is called.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.wait_for(
+                lambda: (self.winner is not None and self.winner.url in self.outcomes) or self._all_finished()
+            )
+            if self.winner is not None:
+                return self.winner, self.outcomes[self.winner.url]
+            return None, dict(self.outcomes)
@@ -0,0 +1,89 @@
+"""Reuse of Ollama's KV cache across a session's generations
+
+Ollama returns the tokens of a finished generation (prompt and output)
+as `context`; sending them back with the next request continues that
+conversation, and the runner skips prefilling whatever prefix its KV
+cache still holds. A member keeps the context of each answer it gave in
+a ContextStore and returns its id with the answer. When the session asks
+the member for its review, it sends the id back, and the review is
+generated as a continuation of the answer instead of prefilling the
+question again.
+
+Contexts are kept as compact integer arrays. The store is bounded by the
+total number of tokens it holds and by age, evicting the least recently
+used first.
+
+Every prompt of a session (answer, review, synthesis) starts with
+`question_prefix`, so even a fresh prompt shares its first tokens with
+the session's earlier ones and Ollama's prompt cache can reuse them.
+"""
+import threading
+import time
+import uuid
+from array import array
+from collections import OrderedDict
+
+
+def question_prefix(query):
+    """Opening of every council prompt; keep it first and unchanged"""
+    return f"ORIGINAL QUESTION: {query}\n\n"
+
+
+class ContextStore:
+    """Ollama contexts by id: at most `max_tokens` in total, each kept `ttl` seconds after its last use"""
+
+    def __init__(self, max_tokens=200000, ttl=600):
+        self.max_tokens = max_tokens
+        self.ttl = ttl
+        self.tokens = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # id -> (last used, array of tokens), least recent first
+        self._lock = threading.Lock()
+
+    def put(self, context):
+        """Store a context; returns its id, or None if it is larger than the store"""
+        if not context or len(context) > self.max_tokens:
+            return None
+        context_id = uuid.uuid4().hex[:16]
+        tokens = array('i', context)
+        with self._lock:
+            self._entries[context_id] = (time.time(), tokens)
+            self.tokens += len(tokens)
+            self._evict()
+        return context_id
+
+    def get(self, context_id):
+        """The stored context as a list of tokens, or None"""
+        with self._lock:
+            self._evict()
+            entry = self._entries.get(context_id) if context_id else None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries[context_id] = (time.time(), entry[1])
+            self._entries.move_to_end(context_id)
+            self.hits += 1
+            return entry[1].tolist()
+
+    def _evict(self):
+        cutoff = time.time() - self.ttl if self.ttl else None
+        while self._entries:
+            context_id, (used_at, tokens) = next(iter(self._entries.items()))
+            if self.tokens <= self.max_tokens and (cutoff is None or used_at >= cutoff):
+                break
+            del self._entries[context_id]
+            self.tokens -= len(tokens)
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'tokens': self.tokens,
+                'max_tokens': self.max_tokens,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,106 @@
+import os
+import threading
+import config
+from admission import AdmissionQueue
+from backends import add_local_backend
+from chairman_node import ChairmanNode
+from context_budget import ContextBudget
+from kv_context import ContextStore
+from member_node import MemberNode
+from metrics import register_cache_metrics, register_model_metrics
+from model_keeper import ModelKeeper
+from model_tuning import Tuner, candidate_grid
+from response_cache import ResponseCache
+
+# URL that marks a member or the chairman as hosted in the frontend's process
+LOCAL = "local"
+
+# Keepers and tuners of the in-process nodes, started with the frontend
+KEEPERS = []
+TUNERS = []
+
+
+def is_local(url):
+    return config.SINGLE_NODE or url == LOCAL
+
+
+def _cache(node_id):
+    if not config.CACHE_ENABLED:
+        return None
+    return ResponseCache(
+        f"cache_{node_id}.sqlite3",
+        max_entries=config.CACHE_MAX_ENTRIES,
+        max_bytes=config.CACHE_MAX_BYTES,
+        ttl=config.CACHE_TTL
+    )
+
+
+def _keeper(node_id, model):
+    keeper = ModelKeeper(config.OLLAMA_HOST, model, config.LOCAL_KEEP_ALIVE)
+    KEEPERS.append(keeper)
+    register_model_metrics({node_id: keeper})
+    return keeper
+
+
+def _tuner(node_id, model, stages, num_ctx, min_predict):
+    if not config.TUNING_ENABLED:
+        return None
+    tuner = Tuner(
+        config.OLLAMA_HOST, model, os.path.join(config.TUNING_DIR, f"profile_{node_id}.json"),
+        targets={stage: config.LATENCY_TARGETS.get(stage) for stage in stages},
+        grid=candidate_grid(num_ctx, config.TUNE_NUM_THREAD, config.TUNE_NUM_BATCH),
+        min_predict=min_predict
+    )
+    TUNERS.append(tuner)
+    return tuner
+
+
+def host_member(member):
+    """Run a config.py member in-process; returns its local:// URL"""
+    cache = _cache(member['id'])
+    register_cache_metrics({member['id']: cache})
+    node = MemberNode(
+        member['id'], member['model'], config.OLLAMA_HOST,
+        AdmissionQueue(workers=config.LOCAL_WORKERS, max_depth=config.LOCAL_QUEUE_DEPTH),
+        cache=cache,
+        keeper=_keeper(member['id'], member['model']),
+        keep_alive=config.LOCAL_KEEP_ALIVE,
+        tuner=_tuner(member['id'], member['model'], ('answer', 'review'), config.TUNE_NUM_CTX,
+                     {'answer': 64, 'review': 256}),
+        contexts=ContextStore(config.CONTEXT_STORE_TOKENS, config.CONTEXT_STORE_TTL) if config.CONTEXT_REUSE else None,
+        context_window=config.OLLAMA_NUM_CTX
+    )
+    print(f"  + Hosting {member['id']} in-process ({member['model']})")
+    return add_local_backend(member['id'], node, config.BACKEND_MAX_CONCURRENCY)
+
+
+def host_chairman():
+    """Run the chairman in-process; returns its local:// URL"""
+    cache = _cache('chairman')
+    register_cache_metrics({'chairman': cache})
+    budget = ContextBudget()
+    node = ChairmanNode(
+        config.CHAIRMAN_MODEL, config.OLLAMA_HOST, budget,
+        cache=cache,
+        keeper=_keeper('chairman', config.CHAIRMAN_MODEL),
+        keep_alive=config.LOCAL_KEEP_ALIVE,
+        tuner=_tuner('chairman', config.CHAIRMAN_MODEL, ('synthesis', 'light_edit'), budget.context_sizes,
+                     {'synthesis': 128, 'light_edit': 128})
+    )
+    print(f"  + Hosting the chairman in-process ({config.CHAIRMAN_MODEL})")
+    return add_local_backend('chairman', node, config.BACKEND_MAX_CONCURRENCY)
+
+
+def _tune_all():
+    # One after the other: the nodes share the box, so measuring them at
+    # the same time would measure the contention
+    for tuner in TUNERS:
+        tuner.prepare()
+
+
+def start():
+    """Preload and keep warm the models of the in-process nodes, then tune them"""
+    for keeper in KEEPERS:
+        keeper.start()
+    if TUNERS:
+        threading.Thread(target=_tune_all, daemon=True).start()
@@ -0,0 +1,340 @@
+import threading
+import time
+import ollama_client
+from admission import QueueFull
+from cascade import build_verify_prompt, parse_verification, verify_schema
+from context_budget import estimate_tokens
+from kv_context import question_prefix
+from metrics import METRICS, instrument_stream
+from response_cache import cache_options, make_key
+from review_format import (answer_ids, build_repair_prompt, build_review_continuation, build_review_prompt,
+                           parse_review_text, review_schema)
+
+# Streamed generations send a heartbeat event this often (seconds) while no
+# tokens are coming, so a frontend that gave up is noticed and its
+# generation cancelled
+STREAM_HEARTBEAT = 1.0
+
+# Tokens left free for the review itself when it continues the answer's
+# context; a continuation that would not fit prefills the plain prompt
+CONTINUATION_RESERVE = 512
+
+# A verification is a score and a short list of issues
+VERIFY_PREDICT = 160
+
+REQUESTS_REJECTED = METRICS.counter(
+    'council_member_rejected_total', "Requests answered 429 because the admission queue was full", ['stage'])
+REVIEW_PARSES = METRICS.counter(
+    'council_review_parses_total', "Reviews by outcome: valid, normalized, repaired or invalid", ['result'])
+REVIEW_CONTEXTS = METRICS.counter(
+    'council_review_contexts_total',
+    "Reviews asked to continue their answer's context: continued, missing (evicted) or too_long", ['result'])
+
+
+def coalescing_options(options):
+    """Options identifying a generation other requests may join
+
+    num_predict is rounded up to a power of two: the tuner's cap drifts
+    by a few tokens between requests, while a caller joining a generation
+    capped at up to twice its own still finishes in time most of the way.
+    """
+    options = dict(options or {})
+    if options.get('num_predict', -1) > 0:
+        options['num_predict'] = 1 << (options['num_predict'] - 1).bit_length()
+    return options
+
+
+def build_answer_prompt(query):
+    """Prompt used for Stage 1 answers"""
+    return f"{question_prefix(query)}Answer the question above concisely and accurately."
+
+
+class MemberNode:
+    """The generation side of a council member, independent of HTTP
+
+    council_member.py serves one of these over Flask; in single-node mode
+    the frontend hosts them in-process and calls handle() directly.
+    Requests are the same dicts the /answer and /review endpoints take,
+    and streamed results are the same events (token / heartbeat / final
+    'done' result / error), just not serialized.
+    """
+
+    STAGES = {'/answer': 'answer', '/review': 'review', '/verify': 'verify'}
+
+    def __init__(self, member_id, model, ollama_host, admission, cache=None, keeper=None, keep_alive=None,
+                 repair=True, tuner=None, contexts=None, context_window=2048):
+        self.member_id = member_id
+        self.model = model
+        self.ollama_host = ollama_host
+        self.admission = admission
+        self.cache = cache
+        self.keeper = keeper
+        self.keep_alive = keep_alive
+        self.repair = repair
+        self.tuner = tuner
+        self.contexts = contexts              # kv_context.ContextStore of this member's answers
+        self.context_window = context_window  # Ollama's num_ctx when the options do not set it
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def _track(self, delta):
+        with self._lock:
+            self.in_flight += delta
+
+    def cache_key_for(self, stage, prompt, data, options=None):
+        """Cache key for this request, or None when the caller asked to bypass
+
+        Keyed on the effective options but num_predict, which the tuner
+        recomputes per request; outputs cut off by it are not cached.
+        """
+        if self.cache is None or data.get('no_cache'):
+            return None
+        return make_key(stage, self.model, prompt, cache_options(options))
+
+    def prepare(self, stage, data):
+        """Prompt, output format and result builder for a request
+
+        Raises ValueError if the request is invalid. The result builder
+        takes the generated text, whether it was cut at the deadline and
+        Ollama's final chunk.
+        """
+        query = data.get('query', '')
+        if stage == 'answer':
+            if not query:
+                raise ValueError('No query provided')
+
+            def finish(text, partial=False, final=None):
+                result = {
+                    'member_id': self.member_id,
+                    'model': self.model,
+                    'answer': text
+                }
+                # Kept so this member's review can continue from it
+                if self.contexts is not None and final and final.get('context') and not partial:
+                    context_id = self.contexts.put(final['context'])
+                    if context_id is not None:
+                        result['context_id'] = context_id
+                return result
+            return build_answer_prompt(query), None, finish
+
+        if stage == 'verify':
+            if not query or not data.get('answer'):
+                raise ValueError('Invalid request')
+            return build_verify_prompt(query, data['answer']), verify_schema(), self.finish_verification
+
+        answers = data.get('answers', [])
+        if not query or not answers:
+            raise ValueError('Invalid request')
+        ids = answer_ids(self.member_id, answers)
+        # A repair, if one is needed, is queued like the review and within its deadline
+        priority = data.get('priority', 'interactive')
+        deadline = time.time() + float(data['deadline']) if data.get('deadline') is not None else None
+        return (
+            build_review_prompt(self.member_id, query, answers),
+            review_schema(ids),
+            lambda text, partial=False, final=None: self.finish_review(text, ids, partial, priority, deadline)
+        )
+
+    def finish_verification(self, text, partial=False, final=None):
+        """Confidence (0-1) in a cascade answer; None if the output was unusable"""
+        confidence, issues = parse_verification(text)
+        return {
+            'member_id': self.member_id,
+            'model': self.model,
+            'confidence': confidence,
+            'issues': issues
+        }
+
+    def finish_review(self, text, ids, partial=False, priority='interactive', deadline=None):
+        """Validated review; one short repair generation if nothing was usable"""
+        review, status = parse_review_text(text, ids)
+        if status == 'invalid' and self.repair and text.strip() and not partial:
+            review, status = self.repair_review(text, ids, priority, deadline)
+        REVIEW_PARSES.inc(result=status)
+        if status == 'invalid':
+            print(f"✗ Unusable review from {self.model}")
+        return {
+            'member_id': self.member_id,
+            'ranking': review['ranking'],
+            'scores': review['scores'],
+            'reasoning': review['reasoning'],
+            'review_status': status,
+            'full_review': text
+        }
+
+    def repair_review(self, text, ids, priority='interactive', deadline=None):
+        """Have the model restate an unusable review as JSON
+
+        The prompt holds only the review, not the answers, and the output
+        is capped, so this costs a fraction of generating the review again.
+        It goes through the admission queue like any other generation.
+        """
+        prompt = build_repair_prompt(text, ids)
+        options = {'temperature': 0, 'num_predict': 256}
+
+        def generate():
+            return instrument_stream(ollama_client.generate_stream(
+                self.ollama_host, self.model, prompt, options=options, timeout=30,
+                keep_alive=self.keep_alive, format=review_schema(ids)
+            ), 'review_repair')
+
+        try:
+            job = self.admission.submit(
+                generate, key=make_key('review_repair', self.model, prompt, options),
+                priority=priority, deadline=deadline
+            )
+        except QueueFull:
+            REQUESTS_REJECTED.inc(stage='review_repair')
+            print("✗ Review repair skipped: admission queue full")
+            return {'ranking': [], 'scores': {}, 'reasoning': ''}, 'invalid'
+        try:
+            repaired, _ = job.result()
+        except Exception as e:
+            print(f"✗ Review repair failed: {e}")
+            return {'ranking': [], 'scores': {}, 'reasoning': ''}, 'invalid'
+        finally:
+            job.leave()
+        review, status = parse_review_text(repaired, ids)
+        return review, 'invalid' if status == 'invalid' or job.partial else 'repaired'
+
+    def stored_context(self, stage, data):
+        """Ollama context of the answer a review request refers to (`context_id`), if still stored"""
+        if stage != 'review' or self.contexts is None or not data.get('context_id'):
+            return None
+        context = self.contexts.get(data['context_id'])
+        if context is None:
+            REVIEW_CONTEXTS.inc(result='missing')
+        return context
+
+    def submit(self, stage, data):
+        """Queue the generation for a request
+
+        Returns (job, finish, deadline). Raises ValueError for an invalid
+        request and QueueFull when the admission queue is full.
+        `data['deadline']` is the caller's remaining time budget in
+        seconds: the generation is cut there and whatever was produced is
+        returned with 'partial': True.
+        """
+        prompt, output_format, finish = self.prepare(stage, data)
+        deadline = None
+        if data.get('deadline') is not None:
+            deadline = time.time() + float(data['deadline'])
+
+        # A review continues the member's own answer when its context is still
+        # stored, so Ollama does not prefill the question again. The cache and
+        # coalescing keys stay those of the plain prompt and the options used
+        # (num_predict left out of the former, bucketed in the latter).
+        context = self.stored_context(stage, data)
+        generation_prompt = build_review_continuation(self.member_id, data['answers']) if context else prompt
+        prompt_tokens = estimate_tokens(generation_prompt) + len(context or [])
+        options = self.tuned_options(stage, prompt_tokens, data)
+        if context and prompt_tokens + CONTINUATION_RESERVE > (options or {}).get('num_ctx', self.context_window):
+            REVIEW_CONTEXTS.inc(result='too_long')
+            context = None
+            generation_prompt = prompt
+            options = self.tuned_options(stage, estimate_tokens(prompt), data)
+        elif context:
+            REVIEW_CONTEXTS.inc(result='continued')
+        cache_key = self.cache_key_for(stage, prompt, data, options)
+
+        def generate():
+            # Instrumented inside the job, so a coalesced generation is counted once
+            chunks = ollama_client.generate_stream(
+                self.ollama_host, self.model, generation_prompt, options=options, timeout=120,
+                cache=self.cache, cache_key=cache_key, keep_alive=self.keep_alive,
+                format=output_format, context=context
+            )
+            if self.tuner is not None:
+                chunks = self.tuner.observe_stream(chunks, options)
+            return instrument_stream(chunks, stage)
+
+        try:
+            job = self.admission.submit(
+                generate,
+                key=make_key(stage, self.model, prompt, coalescing_options(options)),
+                priority=data.get('priority', 'interactive'),
+                deadline=deadline
+            )
+        except QueueFull:
+            REQUESTS_REJECTED.inc(stage=stage)
+            raise
+        return job, finish, deadline
+
+    def tuned_options(self, stage, prompt_tokens, data):
+        """Options measured for this box, num_predict capped to the stage's latency target"""
+        base = {'num_predict': VERIFY_PREDICT} if stage == 'verify' else None
+        if self.tuner is None:
+            return base
+        return self.tuner.options(stage, prompt_tokens, base, remaining=data.get('deadline'))
+
+    def wait(self, job, finish):
+        """Block until the job is done and return the final result"""
+        self._track(1)
+        try:
+            text, final = job.result()
+        finally:
+            job.leave()
+            self._track(-1)
+        result = finish(text, job.partial, final)
+        result['cached'] = final.get('cached', False)
+        result['partial'] = job.partial
+        return result
+
+    def stream(self, job, finish, deadline=None):
+        """Yield the job's tokens as events, then a final 'done' event
+
+        Heartbeat events are sent while no tokens come. At the deadline the
+        answer so far is sent as the final event, marked partial.
+        """
+        self._track(1)
+        tokens = []
+        cached = False
+        final = None
+        try:
+            partial = True
+            for chunk in job.stream(heartbeat=STREAM_HEARTBEAT):
+                if chunk is None:
+                    if deadline is not None and time.time() >= deadline:
+                        break
+                    yield {'member_id': self.member_id, 'heartbeat': True}
+                    continue
+                token = chunk.get('response', '')
+                cached = cached or chunk.get('cached', False)
+                if chunk.get('done'):
+                    final = chunk
+                if token:
+                    tokens.append(token)
+                    yield {'member_id': self.member_id, 'token': token}
+            else:
+                partial = job.partial
+            result = finish(''.join(tokens), partial, final)
+            result['cached'] = cached
+            result['partial'] = partial
+            result['done'] = True
+            yield result
+        except Exception as e:
+            yield {'member_id': self.member_id, 'error': str(e)}
+        finally:
+            # Also runs when the caller goes away: the job is cancelled
+            # if nobody else is waiting for it
+            job.leave()
+            self._track(-1)
+
+    def handle(self, path, data):
+        """In-process equivalent of a streamed POST to /answer or /review"""
+        job, finish, deadline = self.submit(self.STAGES[path], data)
+        return self.stream(job, finish, deadline)
+
+    def health(self):
+        return {
+            'status': 'healthy',
+            'member_id': self.member_id,
+            'model': self.model,
+            'model_state': self.keeper.state if self.keeper else None,
+            'residency': self.keeper.stats() if self.keeper else None,
+            'in_flight': self.in_flight,
+            'queue': self.admission.stats(),
+            'tuning': self.tuner.stats() if self.tuner else None,
+            'contexts': self.contexts.stats() if self.contexts else None,
+            'cache': self.cache.stats() if self.cache else None
+        }
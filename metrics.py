@@ -0,0 +1,237 @@
+import threading
+import time
+
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 200, 500)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base for a labelled metric family"""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple((name, str(labels.get(name, ''))) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(Metric):
+    """Incremented directly, or read at scrape time from `fn` -> {labels dict tuple: value}
+
+    With `fn`, the values are totals kept elsewhere (e.g. a cache's hit
+    count) and must only go up.
+    """
+
+    type = 'counter'
+
+    def __init__(self, name, help_text, labelnames=(), fn=None):
+        super().__init__(name, help_text, labelnames)
+        self.fn = fn
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        if self.fn is not None:
+            try:
+                values = self.fn()
+            except Exception:
+                values = {}
+            with self._lock:
+                self._values = {self._key(dict(labels)): v for labels, v in values.items()}
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    """Set directly, or computed at scrape time by `fn` -> {labels dict tuple: value}"""
+
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = [(k, list(c), s) for k, (c, s) in self._values.items()]
+        for key, counts, total in items:
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', _format_value(bound)),))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {counts[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric of a process and renders the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text, labelnames=(), fn=None):
+        return self._add(Counter(name, help_text, labelnames, fn))
+
+    def gauge(self, name, help_text, labelnames=(), fn=None):
+        return self._add(Gauge(name, help_text, labelnames, fn))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Generation metrics, recorded by members and the chairman from the
+# counters Ollama returns in its final ('done') chunk
+GENERATION_SECONDS = METRICS.histogram(
+    'council_generation_seconds', "Wall time of one Ollama generation", ['stage'])
+TIME_TO_FIRST_TOKEN = METRICS.histogram(
+    'council_time_to_first_token_seconds', "Time until Ollama produced the first token", ['stage'])
+PROMPT_TOKENS = METRICS.counter(
+    'council_prompt_tokens_total', "Prompt tokens evaluated by Ollama (prompt_eval_count)", ['stage'])
+EVAL_TOKENS = METRICS.counter(
+    'council_eval_tokens_total', "Tokens generated by Ollama (eval_count)", ['stage'])
+EVAL_TOKENS_PER_SECOND = METRICS.histogram(
+    'council_eval_tokens_per_second', "Generation speed (eval_count / eval_duration)", ['stage'], RATE_BUCKETS)
+PROMPT_TOKENS_PER_SECOND = METRICS.histogram(
+    'council_prompt_tokens_per_second', "Prefill speed (prompt_eval_count / prompt_eval_duration)", ['stage'], RATE_BUCKETS)
+GENERATION_ERRORS = METRICS.counter(
+    'council_generation_errors_total', "Failed Ollama generations", ['stage'])
+GENERATIONS = METRICS.counter(
+    'council_generations_total', "Generations served, by whether they came from the cache", ['stage', 'cached'])
+
+
+def record_generation(stage, final, elapsed, first_token=None):
+    """Record one finished generation from Ollama's final chunk/result"""
+    cached = bool(final.get('cached'))
+    GENERATIONS.inc(stage=stage, cached=str(cached).lower())
+    if cached:
+        return
+    GENERATION_SECONDS.observe(elapsed, stage=stage)
+    if first_token is not None:
+        TIME_TO_FIRST_TOKEN.observe(first_token, stage=stage)
+    PROMPT_TOKENS.inc(final.get('prompt_eval_count', 0), stage=stage)
+    EVAL_TOKENS.inc(final.get('eval_count', 0), stage=stage)
+    if final.get('eval_duration'):
+        EVAL_TOKENS_PER_SECOND.observe(final.get('eval_count', 0) / (final['eval_duration'] / 1e9), stage=stage)
+    if final.get('prompt_eval_duration'):
+        PROMPT_TOKENS_PER_SECOND.observe(
+            final.get('prompt_eval_count', 0) / (final['prompt_eval_duration'] / 1e9), stage=stage)
+
+
+def instrument_stream(chunks, stage):
+    """Pass Ollama chunks through, recording metrics when the stream ends"""
+    started = time.time()
+    first_token = None
+    try:
+        for chunk in chunks:
+            if first_token is None and chunk.get('response'):
+                first_token = time.time() - started
+            if chunk.get('done'):
+                record_generation(stage, chunk, time.time() - started, first_token)
+            yield chunk
+    except Exception:
+        GENERATION_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        # Closing early (deadline, cancellation) must close Ollama's stream too
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+# Caches and model keepers exposed by this process; a frontend hosting
+# members in-process registers several of each
+_caches = {}
+_keepers = {}
+
+
+def register_cache_metrics(caches):
+    """Expose hit/miss counters of {layer name: ResponseCache/SemanticCache}"""
+    _caches.update(caches)
+
+    def collect():
+        values = {}
+        for layer, cache in list(_caches.items()):
+            if cache is None:
+                continue
+            stats = cache.stats()
+            values[(('layer', layer), ('result', 'hit'))] = stats['hits']
+            values[(('layer', layer), ('result', 'miss'))] = stats['misses']
+        return values
+    METRICS.counter('council_cache_lookups_total', "Cache lookups by layer and result", ['layer', 'result'], fn=collect)
+
+
+def register_model_metrics(keepers):
+    """Expose the residency state, loads and unloads of {node name: ModelKeeper}"""
+    _keepers.update(keepers)
+
+    def collect(value):
+        return lambda: {(('node', node),): value(keeper) for node, keeper in list(_keepers.items())
+                        if value(keeper) is not None}
+    METRICS.gauge('council_model_warm', "1 while the node's model is loaded in Ollama", ['node'],
+                  fn=collect(lambda keeper: 1 if keeper.state == 'warm' else 0))
+    METRICS.gauge('council_model_loads', "Model loads (preloads) done by the node", ['node'],
+                  fn=collect(lambda keeper: keeper.loads))
+    METRICS.gauge('council_model_unloads', "Times the node's model was found unloaded", ['node'],
+                  fn=collect(lambda keeper: keeper.unloads))
+    METRICS.gauge('council_model_last_load_seconds', "Duration of the node's last model load", ['node'],
+                  fn=collect(lambda keeper: keeper.last_load_seconds))
@@ -0,0 +1,237 @@
+"""Stand-in Ollama server for benchmarks and offline testing
+
+Usage:
+    python mock_ollama.py [--port 11434] [--token-rate 50] [--ttft 0.2]
+                          [--jitter 0.1] [--failure-rate 0] [--tokens 40]
+                          [--load-time 0] [--bad-review-rate 0]
+                          [--review-agreement 1] [--prefill-rate 0]
+                          [--confident-rate 0.7]
+
+Serves /api/tags, /api/ps, /api/generate (streamed or not, and
+prompt-less preloads) and /api/embeddings with a fixed, configurable
+speed, so the council's own overhead can be measured independently of
+how fast real models are. Review prompts get a well-formed review
+(JSON when a `format` is requested, "RANKING: ..." text otherwise), and
+cascade verifications a confidence of 9 or 3. A model not used for its
+keep_alive (default 5m) is unloaded, and the next request waits
+--load-time seconds for it to load again, like a cold start. With
+--prefill-rate, prompt processing also takes time per prompt token;
+tokens passed back as a request's `context` are treated as still in the
+KV cache and cost nothing.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from flask import Flask, Response, request, jsonify
+
+app = Flask(__name__)
+
+SETTINGS = {
+    'token_rate': 50.0,    # generated tokens per second
+    'ttft': 0.2,           # seconds before the first token (prompt eval)
+    'jitter': 0.1,         # +/- fraction applied to every delay
+    'failure_rate': 0.0,   # fraction of generations answered with a 500
+    'tokens': 40,          # tokens per answer
+    'load_time': 0.0,      # seconds to load a model that is not resident
+    'bad_review_rate': 0.0,  # fraction of reviews answered with unusable prose
+    'review_agreement': 1.0,  # fraction of reviews ranking in answer order (the others shuffle)
+    'prefill_rate': 0.0,   # prompt tokens processed per second on top of ttft (0 = free)
+    'confident_rate': 0.7,  # fraction of cascade verifications that are confident
+    'embedding_dim': 64
+}
+
+# model -> time it will be unloaded (None = never)
+LOADED = {}
+LOADED_LOCK = threading.Lock()
+
+
+def jittered(seconds):
+    jitter = SETTINGS['jitter']
+    return max(seconds * random.uniform(1 - jitter, 1 + jitter), 0)
+
+
+def keep_alive_seconds(value):
+    """Ollama keep_alive ("5m", "1h", "30s", seconds, -1) in seconds, None for forever"""
+    if value is None:
+        return 300
+    if isinstance(value, (int, float)):
+        return None if value < 0 else value
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    if value[-1:] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+
+def ensure_loaded(model, keep_alive):
+    """Sleep through a cold start if needed, then (re)arm the unload timer"""
+    seconds = keep_alive_seconds(keep_alive)
+    with LOADED_LOCK:
+        expires = LOADED.get(model, 0)
+        resident = model in LOADED and (expires is None or expires > time.time())
+    if not resident and SETTINGS['load_time']:
+        time.sleep(jittered(SETTINGS['load_time']))
+    with LOADED_LOCK:
+        if seconds == 0:
+            LOADED.pop(model, None)
+        else:
+            LOADED[model] = None if seconds is None else time.time() + seconds
+
+
+def prompt_tokens(prompt):
+    return max(len(prompt.split()), 1)
+
+
+def response_tokens(model, prompt, json_format=False):
+    """Tokens of the generated text, shaped like what the council expects"""
+    if 'PROPOSED ANSWER:' in prompt:
+        confidence = 9 if random.random() < SETTINGS['confident_rate'] else 3
+        text = json.dumps({'confidence': confidence, 'issues': '' if confidence > 5 else 'Misses key points.'})
+        return [word + ' ' for word in text.split(' ')]
+    labels = sorted(set(re.findall(r'Answer_\d+', prompt)), key=lambda l: int(l.split('_')[1]))
+    if labels:
+        if random.random() >= SETTINGS['review_agreement']:
+            random.shuffle(labels)
+        if json_format:
+            text = json.dumps({
+                'ranking': labels,
+                'scores': {label: 10 - i for i, label in enumerate(labels)},
+                'reasoning': f"{labels[0]} is the most complete."
+            })
+        else:
+            text = f"RANKING: {', '.join(labels)}\nREASONING: {labels[0]} is the most complete."
+        if not prompt.startswith('Convert this review') and random.random() < SETTINGS['bad_review_rate']:
+            text = "All of these answers have their merits and I cannot pick one."
+        return [word + ' ' for word in text.split(' ')]
+    filler = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit']
+    return [f"{model}: "] + [filler[i % len(filler)] + ' ' for i in range(SETTINGS['tokens'] - 1)]
+
+
+def prefill_seconds(prompt):
+    rate = SETTINGS['prefill_rate']
+    return prompt_tokens(prompt) / rate if rate else 0.0
+
+
+def final_chunk(prompt, tokens, eval_seconds, prompt_seconds, context=None, capped=False):
+    # Stand-in token ids: one per word of the conversation so far
+    length = len(context or []) + prompt_tokens(prompt) + len(tokens)
+    return {
+        'response': '',
+        'done': True,
+        'done_reason': 'length' if capped else 'stop',
+        'prompt_eval_count': prompt_tokens(prompt),
+        'prompt_eval_duration': int(prompt_seconds * 1e9),
+        'eval_count': len(tokens),
+        'eval_duration': int(eval_seconds * 1e9),
+        'context': list(range(length))
+    }
+
+
+@app.route('/api/tags', methods=['GET'])
+def tags():
+    return jsonify({'models': []})
+
+
+@app.route('/api/ps', methods=['GET'])
+def ps():
+    now = time.time()
+    with LOADED_LOCK:
+        models = [
+            {
+                'name': model if ':' in model else f"{model}:latest",
+                'expires_at': None if expires is None else time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(expires))
+            }
+            for model, expires in LOADED.items() if expires is None or expires > now
+        ]
+    return jsonify({'models': models})
+
+
+@app.route('/api/embeddings', methods=['POST'])
+def embeddings():
+    """Deterministic bag-of-words vector, so equal texts embed equally"""
+    data = request.json or {}
+    vector = [0.0] * SETTINGS['embedding_dim']
+    for word in data.get('prompt', '').lower().split():
+        digest = hashlib.md5(word.encode('utf-8')).digest()
+        vector[int.from_bytes(digest[:4], 'little') % len(vector)] += 1.0
+    return jsonify({'embedding': vector})
+
+
+@app.route('/api/generate', methods=['POST'])
+def generate():
+    data = request.json or {}
+    model = data.get('model', 'mock')
+    prompt = data.get('prompt', '')
+
+    if not prompt:
+        # Preload request
+        ensure_loaded(model, data.get('keep_alive'))
+        return jsonify({'model': model, 'response': '', 'done': True, 'done_reason': 'load'})
+
+    if random.random() < SETTINGS['failure_rate']:
+        return jsonify({'error': 'mock failure'}), 500
+
+    ensure_loaded(model, data.get('keep_alive'))
+    tokens = response_tokens(model, prompt, data.get('format') is not None)
+    num_predict = (data.get('options') or {}).get('num_predict')
+    capped = num_predict is not None and 0 <= num_predict < len(tokens)
+    if capped:
+        tokens = tokens[:num_predict]
+    context = data.get('context')
+    ttft = jittered(SETTINGS['ttft'] + prefill_seconds(prompt))
+    per_token = 1.0 / SETTINGS['token_rate']
+
+    if not data.get('stream', True):
+        eval_seconds = sum(jittered(per_token) for _ in tokens)
+        time.sleep(ttft + eval_seconds)
+        result = final_chunk(prompt, tokens, eval_seconds, ttft, context, capped)
+        result['response'] = ''.join(tokens).strip()
+        return jsonify(result)
+
+    def stream():
+        time.sleep(ttft)
+        started = time.time()
+        for token in tokens:
+            time.sleep(jittered(per_token))
+            yield json.dumps({'response': token, 'done': False}) + "\n"
+        yield json.dumps(final_chunk(prompt, tokens, time.time() - started, ttft, context, capped)) + "\n"
+
+    return Response(stream(), mimetype='application/x-ndjson')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in Ollama server with a configurable speed")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--token-rate', type=float, default=SETTINGS['token_rate'], help="tokens per second")
+    parser.add_argument('--ttft', type=float, default=SETTINGS['ttft'], help="seconds to first token")
+    parser.add_argument('--jitter', type=float, default=SETTINGS['jitter'], help="+/- fraction on every delay")
+    parser.add_argument('--failure-rate', type=float, default=SETTINGS['failure_rate'], help="fraction of 500s")
+    parser.add_argument('--tokens', type=int, default=SETTINGS['tokens'], help="tokens per answer")
+    parser.add_argument('--load-time', type=float, default=SETTINGS['load_time'], help="cold start seconds")
+    parser.add_argument('--bad-review-rate', type=float, default=SETTINGS['bad_review_rate'],
+                        help="fraction of reviews with no usable ranking")
+    parser.add_argument('--review-agreement', type=float, default=SETTINGS['review_agreement'],
+                        help="fraction of reviews ranking answers in order (the others shuffle)")
+    parser.add_argument('--prefill-rate', type=float, default=SETTINGS['prefill_rate'],
+                        help="prompt tokens per second (0: prompt processing is part of --ttft)")
+    parser.add_argument('--confident-rate', type=float, default=SETTINGS['confident_rate'],
+                        help="fraction of cascade verifications that are confident")
+    args = parser.parse_args()
+
+    SETTINGS.update(
+        token_rate=args.token_rate, ttft=args.ttft, jitter=args.jitter,
+        failure_rate=args.failure_rate, tokens=args.tokens, load_time=args.load_time,
+        bad_review_rate=args.bad_review_rate, review_agreement=args.review_agreement,
+        prefill_rate=args.prefill_rate, confident_rate=args.confident_rate
+    )
+    print(f"Mock Ollama on {args.host}:{args.port}: {args.token_rate} tok/s, "
+          f"TTFT {args.ttft}s, jitter {args.jitter}, failure rate {args.failure_rate}")
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
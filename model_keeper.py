@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import deque
+import ollama_client
+
+
+def parse_keep_alive(value):
+    """Env value to Ollama keep_alive: "30m" stays a string, "-1" / "0" become ints"""
+    return int(value) if value.lstrip('-').isdigit() else value
+
+
+def same_model(name, model):
+    """Ollama reports "llama2" as "llama2:latest" in /api/ps"""
+    def full(n):
+        return n if ':' in n else f"{n}:latest"
+    return full(name) == full(model)
+
+
+class ModelKeeper:
+    """Keeps a node's model loaded in Ollama and tracks whether it is warm
+
+    With `preload`, the model is loaded as soon as the keeper starts.
+    Then Ollama's /api/ps is polled every `check_interval` seconds: when
+    the model has been unloaded (idle expiry, evicted by another model,
+    Ollama restart) the unload is recorded and, with `keep_warm`, the
+    model is loaded again. Every generation should also pass
+    `keep_alive` so that use keeps it resident.
+
+    State is 'warm' (loaded), 'loading' or 'cold' (not in memory: the
+    next request pays the load time).
+    """
+
+    def __init__(self, host, model, keep_alive='30m', preload=True, keep_warm=True,
+                 check_interval=15, max_events=20):
+        self.host = host
+        self.model = model
+        self.keep_alive = keep_alive
+        self.preload = preload
+        self.keep_warm = keep_warm
+        self.check_interval = check_interval
+        self.state = 'cold'
+        self.loads = 0
+        self.unloads = 0
+        self.last_load_seconds = None
+        self.loaded_since = None
+        self.expires_at = None
+        self.ollama_reachable = None  # result of the last /api/ps check
+        self.checked_at = None
+        self.events = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+
+    def _event(self, kind, **details):
+        self.events.append(dict(details, event=kind, at=time.time()))
+
+    def start(self):
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def load(self):
+        """Preload the model now; returns True once it is resident"""
+        with self._lock:
+            if self.state == 'loading':
+                return False
+            self.state = 'loading'
+        self._event('load_started')
+        print(f"Preloading {self.model} (keep_alive {self.keep_alive})...")
+        started = time.time()
+        try:
+            ollama_client.preload(self.host, self.model, self.keep_alive)
+        except Exception as e:
+            print(f"✗ Could not preload {self.model}: {e}")
+            self._event('load_failed', error=str(e))
+            with self._lock:
+                self.state = 'cold'
+            return False
+        elapsed = time.time() - started
+        print(f"✓ {self.model} loaded in {elapsed:.1f}s")
+        self._event('loaded', seconds=elapsed)
+        with self._lock:
+            self.state = 'warm'
+            self.loads += 1
+            self.last_load_seconds = elapsed
+            self.loaded_since = time.time()
+        return True
+
+    def check(self):
+        """Refresh the state from Ollama's list of loaded models"""
+        try:
+            loaded = [m for m in ollama_client.running_models(self.host) if same_model(m.get('name', ''), self.model)]
+        except Exception:
+            self.ollama_reachable, self.checked_at = False, time.time()
+            return self.state  # Ollama unreachable: keep the last known state
+        self.ollama_reachable, self.checked_at = True, time.time()
+        with self._lock:
+            if self.state == 'loading':
+                return self.state
+            if loaded:
+                if self.state == 'cold':
+                    # Loaded by a request rather than by us
+                    self.loaded_since = time.time()
+                    self._event('loaded', by='request')
+                self.state = 'warm'
+                self.expires_at = loaded[0].get('expires_at')
+            elif self.state == 'warm':
+                print(f"✗ {self.model} was unloaded by Ollama")
+                self.state = 'cold'
+                self.unloads += 1
+                self.loaded_since = None
+                self.expires_at = None
+                self._event('unloaded')
+            return self.state
+
+    def _loop(self):
+        if self.check() == 'cold' and self.preload:
+            self.load()
+        while True:
+            time.sleep(self.check_interval)
+            if self.check() == 'cold' and self.keep_warm:
+                self.load()
+
+    def ollama_status(self):
+        """'connected' / 'unreachable' from the last check, None if too old to tell"""
+        if self.checked_at is None or time.time() - self.checked_at > 2 * self.check_interval:
+            return None
+        return 'connected' if self.ollama_reachable else 'unreachable'
+
+    def stats(self):
+        """Residency info for /health"""
+        with self._lock:
+            return {
+                'state': self.state,
+                'keep_alive': self.keep_alive,
+                'keep_warm': self.keep_warm,
+                'loads': self.loads,
+                'unloads': self.unloads,
+                'last_load_seconds': self.last_load_seconds,
+                'loaded_since': self.loaded_since,
+                'expires_at': self.expires_at,
+                'events': list(self.events)
+            }
@@ -0,0 +1,266 @@
+"""Per-node Ollama options, measured on the box and capped for latency targets
+
+Boxes differ (CPU cores, GPU or not, memory bandwidth), so instead of one
+set of options for everyone each node measures its own model at startup:
+a few short generations per candidate option set (the grid of `num_ctx`
+x `num_thread` x `num_batch`), recording prompt processing and generation
+speed in tokens/second. The profile is stored as JSON and reused on the
+next start as long as the model, host and grid are the same.
+
+At request time `Tuner.options()` picks the fastest measured option set
+whose context holds the prompt and caps `num_predict` so that prompt
+processing plus generation fit the stage's latency target (or the
+request's remaining deadline, if sooner). Each finished generation
+updates the measured speeds (EWMA), so the caps follow the box's actual
+load, e.g. slower tokens while several generations share it.
+"""
+import itertools
+import json
+import os
+import threading
+import time
+import ollama_client
+from metrics import METRICS
+
+PROFILE_VERSION = 1
+
+# Roughly 250 tokens of neutral text, so prompt processing is measured too
+BENCH_PROMPT = (
+    "Summarize the following notes in three sentences.\n\n"
+    + " ".join(
+        "The council runs several language models on separate machines; each one answers the "
+        "question, reviews the other answers, and a chairman writes the final synthesis."
+        for _ in range(8)
+    )
+)
+
+PREDICT_CAPS = METRICS.histogram(
+    'council_num_predict_cap', "num_predict chosen to meet the stage's latency target", ['stage'],
+    (32, 64, 128, 256, 512, 1024, 2048))
+
+
+def candidate_grid(num_ctx=(2048, 4096), num_thread=(None,), num_batch=(None,)):
+    """Option sets to measure; None leaves an option to Ollama's default"""
+    grid = []
+    for ctx, threads, batch in itertools.product(num_ctx, num_thread, num_batch):
+        options = {'num_ctx': ctx, 'num_thread': threads, 'num_batch': batch}
+        grid.append({k: v for k, v in options.items() if v is not None})
+    return grid
+
+
+def parse_values(text, cast=int):
+    """"2048,4096" -> [2048, 4096]; "default" (or nothing) stands for None"""
+    values = [v.strip() for v in (text or '').split(',') if v.strip()]
+    return [None if v == 'default' else cast(v) for v in values] or [None]
+
+
+def parse_seconds(text):
+    """Latency target from the environment; empty or "none" means no target"""
+    return None if not text or text.lower() == 'none' else float(text)
+
+
+def options_key(options):
+    return json.dumps(options, sort_keys=True)
+
+
+def measure(host, model, options, num_predict=64, runs=2, timeout=300):
+    """Prompt and generation speed (tokens/second) of `model` with `options`
+
+    The first run also pays for reloading the model when the options
+    require it (Ollama reports that as load_duration, outside the
+    measured speeds). The prompt is varied per run so Ollama cannot
+    reuse a cached prefix.
+    """
+    prompt_rates = []
+    eval_rates = []
+    for run in range(runs):
+        result = ollama_client.generate(
+            host, model, f"[{time.time():.6f} #{run}] {BENCH_PROMPT}",
+            options=dict(options, num_predict=num_predict, temperature=0),
+            timeout=timeout
+        )
+        if result.get('prompt_eval_duration'):
+            prompt_rates.append(result.get('prompt_eval_count', 0) / (result['prompt_eval_duration'] / 1e9))
+        if result.get('eval_duration'):
+            eval_rates.append(result.get('eval_count', 0) / (result['eval_duration'] / 1e9))
+    if not eval_rates:
+        raise ValueError('Ollama reported no eval timings')
+    return {
+        'options': options,
+        'prompt_tps': max(prompt_rates) if prompt_rates else None,
+        'eval_tps': max(eval_rates)
+    }
+
+
+class Tuner:
+    """Chooses a node's Ollama options per request from its measured profile
+
+    `targets` maps a stage ('answer', 'review', 'synthesis', ...) to the
+    seconds a generation of that stage should take (None: no cap), and
+    `min_predict` to the fewest tokens it may be capped to (e.g. enough
+    for a complete JSON review). Until a profile is loaded or measured,
+    options are passed through unchanged.
+    """
+
+    def __init__(self, host, model, profile_path, targets, grid=None, min_predict=None, max_predict=None,
+                 overhead=0.5, alpha=0.2, runs=2):
+        self.host = host
+        self.model = model
+        self.profile_path = profile_path
+        self.targets = targets
+        self.grid = grid or candidate_grid()
+        self.min_predict = min_predict or {}
+        self.max_predict = max_predict
+        self.overhead = overhead
+        self.alpha = alpha
+        self.runs = runs
+        self.state = 'untuned'
+        self.profile = None
+        self.current = None  # option set of the last request (changing num_ctx reloads the model)
+        self._rates = {}     # options key -> {'options', 'prompt_tps', 'eval_tps'}
+        self._lock = threading.Lock()
+
+    def start(self):
+        """prepare() in the background"""
+        threading.Thread(target=self.prepare, daemon=True).start()
+
+    def prepare(self):
+        """Load the stored profile, or measure a new one"""
+        profile = self.load()
+        if profile is not None:
+            print(f"✓ Tuning profile for {self.model} loaded from {self.profile_path}")
+            self._use(profile)
+            return profile
+        return self.benchmark()
+
+    def load(self):
+        """The stored profile if it was measured for this model, host and grid"""
+        if not self.profile_path or not os.path.exists(self.profile_path):
+            return None
+        try:
+            with open(self.profile_path, encoding='utf-8') as f:
+                profile = json.load(f)
+        except (OSError, ValueError):
+            return None
+        same = (profile.get('version') == PROFILE_VERSION and profile.get('model') == self.model
+                and profile.get('host') == self.host
+                and sorted(map(options_key, self.grid)) == sorted(options_key(c['options']) for c in profile['candidates']))
+        return profile if same else None
+
+    def benchmark(self):
+        """Measure every option set of the grid and store the profile"""
+        self.state = 'benchmarking'
+        print(f"Benchmarking {self.model} over {len(self.grid)} option sets...")
+        candidates = []
+        for options in self.grid:
+            try:
+                result = measure(self.host, self.model, options, runs=self.runs)
+            except Exception as e:
+                print(f"  ✗ {options}: {e}")
+                continue
+            print(f"  {options}: prompt {result['prompt_tps'] or 0:.0f} tok/s, generation {result['eval_tps']:.1f} tok/s")
+            candidates.append(result)
+        if not candidates:
+            print(f"✗ Benchmark of {self.model} failed, using default options")
+            self.state = 'failed'
+            return None
+        profile = {
+            'version': PROFILE_VERSION,
+            'model': self.model,
+            'host': self.host,
+            'measured_at': time.time(),
+            'candidates': candidates
+        }
+        if self.profile_path:
+            with open(self.profile_path, 'w', encoding='utf-8') as f:
+                json.dump(profile, f, indent=2)
+        self._use(profile)
+        return profile
+
+    def _use(self, profile):
+        with self._lock:
+            self.profile = profile
+            self._rates = {options_key(c['options']): dict(c) for c in profile['candidates']}
+            self.state = 'ready'
+
+    def _choose(self, needed_ctx, num_ctx=None):
+        """Option set for a prompt needing `needed_ctx` tokens of context
+
+        The last one used is kept while it fits, since a different
+        num_ctx makes Ollama reload the model; otherwise the fastest that
+        fits (or, failing that, the one with the largest context).
+        """
+        rates = list(self._rates.values())
+        if num_ctx is not None:
+            rates = [r for r in rates if r['options'].get('num_ctx') == num_ctx] or rates
+        fits = [r for r in rates if r['options'].get('num_ctx', needed_ctx) >= needed_ctx]
+        if self.current is not None and self.current in [options_key(r['options']) for r in fits]:
+            return self._rates[self.current]
+        if fits:
+            return max(fits, key=lambda r: r['eval_tps'])
+        return max(rates, key=lambda r: r['options'].get('num_ctx', 0))
+
+    def options(self, stage, prompt_tokens, base=None, remaining=None, num_ctx=None):
+        """Ollama options for one generation of `stage`
+
+        `base` holds options the caller sets itself (temperature, and the
+        chairman's num_ctx / num_predict, which pins `num_ctx`). `remaining`
+        is the request's time budget in seconds, if it has a deadline.
+        """
+        options = dict(base or {})
+        with self._lock:
+            if self.state != 'ready':
+                return options
+            floor = self.min_predict.get(stage, 32)
+            rate = self._choose(prompt_tokens + floor, num_ctx or options.get('num_ctx'))
+            self.current = options_key(rate['options'])
+            options = dict(rate['options'], **options)
+
+            limit = self.targets.get(stage)
+            if remaining is not None:
+                limit = remaining if limit is None else min(limit, remaining)
+            if limit is not None:
+                prefill = prompt_tokens / rate['prompt_tps'] if rate.get('prompt_tps') else 0
+                cap = int((limit - self.overhead - prefill) * rate['eval_tps'])
+                ceiling = min([n for n in (options.get('num_predict'), self.max_predict) if n], default=None)
+                cap = max(cap, floor)
+                if ceiling is not None:
+                    cap = min(cap, ceiling)
+                options['num_predict'] = cap
+                PREDICT_CAPS.observe(cap, stage=stage)
+        return options
+
+    def observe(self, options, final):
+        """Fold a finished generation's speeds into its option set's rates"""
+        if final.get('cached') or not final.get('eval_duration'):
+            return
+        key = options_key({k: options[k] for k in ('num_ctx', 'num_thread', 'num_batch') if k in options})
+        with self._lock:
+            rate = self._rates.get(key)
+            if rate is None:
+                return
+            eval_tps = final.get('eval_count', 0) / (final['eval_duration'] / 1e9)
+            rate['eval_tps'] += self.alpha * (eval_tps - rate['eval_tps'])
+            if final.get('prompt_eval_duration') and rate.get('prompt_tps'):
+                prompt_tps = final.get('prompt_eval_count', 0) / (final['prompt_eval_duration'] / 1e9)
+                rate['prompt_tps'] += self.alpha * (prompt_tps - rate['prompt_tps'])
+
+    def observe_stream(self, chunks, options):
+        """Pass Ollama chunks through, observing the final one"""
+        try:
+            for chunk in chunks:
+                if chunk.get('done'):
+                    self.observe(options, chunk)
+                yield chunk
+        finally:
+            chunks.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'targets': self.targets,
+                'current': json.loads(self.current) if self.current else None,
+                'measured_at': self.profile.get('measured_at') if self.profile else None,
+                'candidates': [dict(r) for r in self._rates.values()]
+            }
@@ -0,0 +1,141 @@
+import json
+import requests
+from requests.adapters import HTTPAdapter
+
+# One keep-alive connection pool for every Ollama call of the process, so
+# in-process members, the chairman and the model keepers reuse connections
+SESSION = requests.Session()
+SESSION.mount('http://', HTTPAdapter(pool_maxsize=32))
+SESSION.mount('https://', HTTPAdapter(pool_maxsize=32))
+
+
+class OllamaError(Exception):
+    """Raised when Ollama answers with a non-200 status"""
+
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+        super().__init__(f"Ollama Error ({status_code}): {text}")
+
+
+def build_payload(model, prompt, stream, options=None, keep_alive=None, format=None, context=None):
+    """Build the JSON body for Ollama's /api/generate
+
+    `format` is "json" or a JSON schema the output must follow. `context`
+    is the token list a previous generation returned: the prompt then
+    continues that conversation (see kv_context.py).
+    """
+    payload = {
+        'model': model,
+        'prompt': prompt,
+        'stream': stream
+    }
+    if options:
+        payload['options'] = options
+    if keep_alive is not None:
+        payload['keep_alive'] = keep_alive
+    if format is not None:
+        payload['format'] = format
+    if context:
+        payload['context'] = context
+    return payload
+
+
+def generate(host, model, prompt, options=None, timeout=120, cache=None, cache_key=None, keep_alive=None,
+             format=None):
+    """Run a blocking generation and return Ollama's JSON result
+
+    With a `cache` and `cache_key`, a stored response is returned instead
+    (marked 'cached': True) and fresh responses are stored, unless they
+    stopped on num_predict: cache keys leave the cap out (see
+    response_cache.cache_options), so a cut-off output must not be reused.
+    """
+    if cache is not None and cache_key:
+        hit = cache.get(cache_key)
+        if hit is not None:
+            return dict(hit, cached=True)
+
+    response = SESSION.post(
+        f"{host}/api/generate",
+        json=build_payload(model, prompt, False, options, keep_alive, format),
+        timeout=timeout
+    )
+    if response.status_code != 200:
+        raise OllamaError(response.status_code, response.text)
+    result = response.json()
+
+    if cache is not None and cache_key and result.get('done_reason') != 'length':
+        cache.put(cache_key, {'response': result.get('response', '')})
+    return result
+
+
+def generate_stream(host, model, prompt, options=None, timeout=120, cache=None, cache_key=None, keep_alive=None,
+                    format=None, context=None):
+    """Run a streaming generation, yielding each NDJSON chunk from Ollama
+
+    The last chunk has 'done': True and carries the timing/token counters.
+    A cache hit is replayed as a single chunk followed by a 'done' chunk.
+    Outputs are cached as in generate().
+    """
+    if cache is not None and cache_key:
+        hit = cache.get(cache_key)
+        if hit is not None:
+            yield {'response': hit.get('response', ''), 'done': False}
+            yield {'response': '', 'done': True, 'cached': True}
+            return
+
+    response = SESSION.post(
+        f"{host}/api/generate",
+        json=build_payload(model, prompt, True, options, keep_alive, format, context),
+        stream=True,
+        timeout=timeout
+    )
+    tokens = []
+    try:
+        if response.status_code != 200:
+            raise OllamaError(response.status_code, response.text)
+        for line in response.iter_lines():
+            if line:
+                chunk = json.loads(line)
+                tokens.append(chunk.get('response', ''))
+                if chunk.get('done') and cache is not None and cache_key and chunk.get('done_reason') != 'length':
+                    cache.put(cache_key, {'response': ''.join(tokens)})
+                yield chunk
+    finally:
+        response.close()
+
+
+def preload(host, model, keep_alive=None, timeout=600):
+    """Load `model` into memory without generating anything
+
+    Ollama treats a generate request without a prompt as a load request;
+    `keep_alive` sets how long it then stays resident (e.g. "30m", -1
+    for forever, 0 to unload right away).
+    """
+    payload = {'model': model, 'stream': False}
+    if keep_alive is not None:
+        payload['keep_alive'] = keep_alive
+    response = SESSION.post(f"{host}/api/generate", json=payload, timeout=timeout)
+    if response.status_code != 200:
+        raise OllamaError(response.status_code, response.text)
+    return response.json()
+
+
+def running_models(host, timeout=5):
+    """Models currently loaded in memory (Ollama's /api/ps)"""
+    response = SESSION.get(f"{host}/api/ps", timeout=timeout)
+    if response.status_code != 200:
+        raise OllamaError(response.status_code, response.text)
+    return response.json().get('models', [])
+
+
+def to_ndjson(obj):
+    """Serialize one event as a newline-delimited JSON line"""
+    return json.dumps(obj) + "\n"
+
+
+def iter_ndjson(response):
+    """Yield parsed events from a streaming NDJSON HTTP response"""
+    for line in response.iter_lines():
+        if line:
+            yield json.loads(line)
@@ -0,0 +1,115 @@
+import threading
+import time
+from backends import get_backend
+
+
+class Replica:
+    """One box serving a council member slot (member_id + model)"""
+
+    def __init__(self, member_id, model, backend, static=False):
+        self.member_id = member_id
+        self.model = model
+        self.backend = backend
+        self.static = static
+        self.last_heartbeat = time.time()
+        self.reported = {}
+        self.model_state = None  # 'warm' / 'loading' / 'cold' from heartbeats or health checks
+
+    @property
+    def url(self):
+        return self.backend.url
+
+    def is_alive(self, heartbeat_ttl):
+        """Static (config.py) replicas never expire; registered ones need heartbeats"""
+        return self.static or time.time() - self.last_heartbeat <= heartbeat_ttl
+
+    def is_cold(self):
+        """Known not to have its model loaded; unknown counts as warm"""
+        return self.model_state in ('cold', 'loading')
+
+    def load_score(self):
+        # The node's own in-flight count also covers calls from other frontends
+        in_flight = max(self.backend.in_flight, self.reported.get('in_flight', 0))
+        return (in_flight + 1) * (self.backend.latency_ewma or 1.0)
+
+    def to_dict(self):
+        return {
+            'member_id': self.member_id,
+            'model': self.model,
+            'url': self.url,
+            'static': self.static,
+            'in_flight': self.backend.in_flight,
+            'latency_ewma': self.backend.latency_ewma,
+            'failed': self.backend.is_failed(),
+            'model_state': self.model_state,
+            'last_heartbeat': self.last_heartbeat,
+            'reported': self.reported
+        }
+
+
+class MemberRegistry:
+    """Council member slots and the replicas that serve them
+
+    Members listed in config.py are seeded as static replicas. Further
+    replicas register (and keep heartbeating) through the frontend's
+    /register endpoint; a replica that misses heartbeats for
+    `heartbeat_ttl` seconds is no longer routed to. Each call goes to the
+    healthy replica of the slot with the lowest load score (in-flight
+    calls times latency EWMA), skipping replicas whose model is cold
+    (not loaded in Ollama) while a warm one is available.
+    """
+
+    def __init__(self, heartbeat_ttl=30, max_concurrent=2):
+        self.heartbeat_ttl = heartbeat_ttl
+        self.max_concurrent = max_concurrent
+        self._replicas = {}  # url -> Replica, in registration order
+        self._lock = threading.Lock()
+
+    def register(self, member_id, model, url, static=False, reported=None):
+        """Add or refresh a replica; also used as the heartbeat"""
+        with self._lock:
+            replica = self._replicas.get(url)
+            if replica is None or replica.member_id != member_id:
+                backend = get_backend(member_id, url, self.max_concurrent)
+                replica = Replica(member_id, model, backend, static)
+                self._replicas[url] = replica
+                print(f"  + Registered {member_id} replica at {url} ({model})")
+            replica.model = model
+            replica.last_heartbeat = time.time()
+            replica.reported = reported or {}
+            replica.model_state = replica.reported.get('model_state', replica.model_state)
+            return replica
+
+    def deregister(self, url):
+        with self._lock:
+            replica = self._replicas.pop(url, None)
+        if replica:
+            print(f"  - Deregistered {replica.member_id} replica at {url}")
+        return replica is not None
+
+    def replicas(self, member_id=None):
+        with self._lock:
+            return [
+                r for r in self._replicas.values()
+                if (member_id is None or r.member_id == member_id) and r.is_alive(self.heartbeat_ttl)
+            ]
+
+    def members(self):
+        """Current council: one {'id', 'model'} entry per slot with a live replica"""
+        slots = {}
+        for replica in self.replicas():
+            slots.setdefault(replica.member_id, {'id': replica.member_id, 'model': replica.model})
+        return list(slots.values())
+
+    def pick(self, member_id, exclude=()):
+        """Least-loaded live replica for a slot, preferring warm and not recently failed ones"""
+        candidates = [r for r in self.replicas(member_id) if r.url not in exclude]
+        if not candidates:
+            return None
+        healthy = [r for r in candidates if not r.backend.is_failed()] or candidates
+        warm = [r for r in healthy if not r.is_cold()]
+        return min(warm or healthy, key=lambda r: r.load_score())
+
+    def snapshot(self):
+        with self._lock:
+            return [r.to_dict() for r in self._replicas.values()]
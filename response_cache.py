@@ -0,0 +1,122 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+def normalize_prompt(prompt):
+    """Collapse whitespace so trivially different prompts share an entry"""
+    return " ".join(prompt.split())
+
+
+def cache_options(options):
+    """The options a cached output is keyed on
+
+    num_predict is left out: it only caps the output, and the tuner
+    recomputes it for every request, so keying on it would make repeated
+    queries miss. Outputs that stopped on the cap are not cached instead
+    (ollama_client).
+    """
+    return {k: v for k, v in (options or {}).items() if k != 'num_predict'}
+
+
+def make_key(stage, model, prompt, options=None):
+    """Content address for one generation: stage, model, prompt and options"""
+    material = json.dumps({
+        'stage': stage,
+        'model': model,
+        'prompt': normalize_prompt(prompt),
+        'options': options or {}
+    }, sort_keys=True)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """On-disk (SQLite) cache of generation results with LRU/TTL eviction
+
+    Entries expire `ttl` seconds after being written; when the store holds
+    more than `max_entries` rows or `max_bytes` of values, the least
+    recently used entries are evicted first.
+    """
+
+    def __init__(self, path, max_entries=1000, max_bytes=50 * 1024 * 1024, ttl=7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created REAL NOT NULL,
+            last_used REAL NOT NULL
+        )""")
+        self._db.commit()
+
+    def get(self, key):
+        """Return the cached value for `key`, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, created FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE entries SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        """Store a JSON-serializable value and evict if over the caps"""
+        data = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data), now, now)
+            )
+            self._evict(now)
+            self._db.commit()
+
+    def _evict(self, now):
+        cursor = self._db.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl,))
+        self.evictions += cursor.rowcount
+        count, total = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        for key, size in self._db.execute(
+            "SELECT key, size FROM entries ORDER BY last_used ASC"
+        ).fetchall():
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            count -= 1
+            total -= size
+            self.evictions += 1
+
+    def stats(self):
+        """Counters for /health"""
+        with self._lock:
+            count, total = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'entries': count,
+            'bytes': total,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
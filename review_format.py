@@ -0,0 +1,200 @@
+"""Structured review output: prompt, JSON schema, validation and repair
+
+Reviews are generated with Ollama's structured output (`format` set to
+a JSON schema), so a review is normally a JSON object:
+
+    {"ranking": ["Answer_2", "Answer_1"],
+     "scores": {"Answer_1": 6, "Answer_2": 9},
+     "reasoning": "..."}
+
+`parse_review_text` validates it against the answer IDs the reviewer was
+shown and fixes what can be fixed without the model: JSON wrapped in
+prose, IDs written as "answer 2" or "2", duplicates, answers missing from
+the ranking (placed by score), missing or out-of-range scores, and old
+"RANKING: ..." text. Only a review with nothing usable is 'invalid'.
+"""
+import json
+import re
+from kv_context import question_prefix
+
+SCORE_MIN = 0
+SCORE_MAX = 10
+
+
+def reviewed(member_id, answers):
+    """(index, answer) of the answers a member reviews
+
+    Its own answer is skipped, and so are answers the frontend's review
+    plan did not assign to it (sent with 'assigned': False, no text).
+    """
+    return [
+        (idx, ans) for idx, ans in enumerate(answers)
+        if ans['member_id'] != member_id and ans.get('assigned', True)
+    ]
+
+
+def answer_ids(member_id, answers):
+    """Anonymous IDs of the answers a member reviews
+
+    IDs are "Answer_<n>" with n the 1-based position in `answers`, so
+    they map straight back to the frontend's answers list.
+    """
+    return [f"Answer_{idx + 1}" for idx, ans in reviewed(member_id, answers)]
+
+
+def review_schema(ids):
+    """JSON schema passed as Ollama's `format` for a review of `ids`"""
+    return {
+        'type': 'object',
+        'properties': {
+            'ranking': {'type': 'array', 'items': {'type': 'string', 'enum': ids}},
+            'scores': {
+                'type': 'object',
+                'properties': {i: {'type': 'number', 'minimum': SCORE_MIN, 'maximum': SCORE_MAX} for i in ids},
+                'required': ids
+            },
+            'reasoning': {'type': 'string'}
+        },
+        'required': ['ranking', 'scores', 'reasoning']
+    }
+
+
+def review_instructions(member_id, answers):
+    """The part of a review prompt after the question: the answers and the output format"""
+    ids = answer_ids(member_id, answers)
+    answers_text = "\n\n".join([f"Answer_{idx + 1}:\n{ans['answer']}" for idx, ans in reviewed(member_id, answers)])
+
+    return f"""Below are multiple answers to this question. Evaluate each answer based on accuracy, insight, and completeness.
+
+{answers_text}
+
+Give every answer a score from {SCORE_MIN} to {SCORE_MAX}, rank the answers from best to worst, and briefly explain your reasoning for the top-ranked answer.
+
+Respond with a JSON object only:
+{{"ranking": [the IDs {', '.join(ids)}, best first], "scores": {{"<ID>": <score>, ...}}, "reasoning": "<your explanation>"}}"""
+
+
+def build_review_prompt(member_id, query, answers):
+    """Prompt used for Stage 2 reviews (other members' answers, anonymized)"""
+    return question_prefix(query) + review_instructions(member_id, answers)
+
+
+def build_review_continuation(member_id, answers):
+    """Stage 2 prompt continuing the member's own answer (sent with its Ollama context)"""
+    return ("Other council members answered the same question; your answer above is not among them. "
+            + review_instructions(member_id, answers))
+
+
+def build_repair_prompt(text, ids):
+    """Short prompt turning an unusable review into the JSON format"""
+    return f"""Convert this review of the answers {', '.join(ids)} into a JSON object with "ranking" (the IDs, best first), "scores" (a {SCORE_MIN}-{SCORE_MAX} score per ID) and "reasoning". Keep the reviewer's opinion; do not re-evaluate.
+
+Review:
+{text[:2000]}"""
+
+
+def _load_json(text):
+    """The review's JSON object, also when the model wrapped it in prose"""
+    text = text.strip()
+    try:
+        data = json.loads(text)
+        return data if isinstance(data, dict) else None, False
+    except ValueError:
+        pass
+    start, end = text.find('{'), text.rfind('}')
+    if 0 <= start < end:
+        try:
+            data = json.loads(text[start:end + 1])
+            return data if isinstance(data, dict) else None, True
+        except ValueError:
+            pass
+    return None, True
+
+
+def _legacy_fields(text):
+    """RANKING / REASONING lines of the old free-text format"""
+    ranking = []
+    reasoning = ""
+    for line in text.split('\n'):
+        if 'RANKING:' in line.upper():
+            ranking = [r.strip() for r in line.split(':', 1)[1].split(',')]
+        elif 'REASONING:' in line.upper():
+            reasoning = line.split(':', 1)[1].strip()
+    return ranking, {}, reasoning
+
+
+def normalize_id(label, ids):
+    """'Answer_2', 'answer 2', '2', '[Answer_2]' -> 'Answer_2' if it is one of `ids`"""
+    match = re.search(r'(\d+)', str(label))
+    if not match:
+        return None
+    label = f"Answer_{int(match.group(1))}"
+    return label if label in ids else None
+
+
+def _score(value):
+    try:
+        return float(min(max(float(value), SCORE_MIN), SCORE_MAX))
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_review_text(text, ids):
+    """Validate a review against `ids`, fixing what can be fixed
+
+    Returns ({'ranking', 'scores', 'reasoning'}, status) where status is
+    'valid' (well-formed as generated), 'normalized' (usable after fixes)
+    or 'invalid' (no answer ID could be recovered).
+    """
+    data, fixed = _load_json(text)
+    if data is not None:
+        raw_ranking = data.get('ranking', [])
+        if isinstance(raw_ranking, str):
+            raw_ranking = raw_ranking.split(',')
+            fixed = True
+        raw_scores = data.get('scores', {})
+        if isinstance(raw_scores, list):
+            # [{"id": ..., "score": ...}] instead of a mapping
+            raw_scores = {s.get('id'): s.get('score') for s in raw_scores if isinstance(s, dict)}
+            fixed = True
+        reasoning = str(data.get('reasoning', ''))
+    else:
+        raw_ranking, raw_scores, reasoning = _legacy_fields(text)
+        fixed = True
+
+    ranking = []
+    for label in raw_ranking if isinstance(raw_ranking, list) else []:
+        answer_id = normalize_id(label, ids)
+        if answer_id is None or answer_id in ranking:
+            fixed = True
+            continue
+        if answer_id != label:
+            fixed = True
+        ranking.append(answer_id)
+
+    scores = {}
+    for label, value in (raw_scores.items() if isinstance(raw_scores, dict) else []):
+        answer_id = normalize_id(label, ids)
+        score = _score(value)
+        if answer_id is None or score is None:
+            fixed = True
+            continue
+        if answer_id != label or score != value:
+            fixed = True
+        scores[answer_id] = score
+
+    if not ranking and not scores:
+        return {'ranking': [], 'scores': {}, 'reasoning': reasoning}, 'invalid'
+
+    # Answers left out of the ranking go after it, best score first
+    missing = [i for i in ids if i not in ranking]
+    if missing:
+        fixed = True
+        ranking += sorted(missing, key=lambda i: -scores.get(i, -1))
+    # Answers without a score get one from their rank
+    for pos, answer_id in enumerate(ranking):
+        if answer_id not in scores:
+            fixed = True
+            scores[answer_id] = round(SCORE_MAX * (len(ranking) - pos) / len(ranking), 1)
+
+    return {'ranking': ranking, 'scores': scores, 'reasoning': reasoning}, 'normalized' if fixed else 'valid'
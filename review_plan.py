@@ -0,0 +1,137 @@
+"""Which answers each member reviews in Stage 2
+
+With every member reviewing every other answer, a council of n members
+costs n reviews of n-1 answers each: Stage 2 grows as n². A ReviewPlan
+gives each reviewer a subset instead, so the total stays close to linear:
+
+  - 'all':      every other answer (the original behaviour)
+  - 'sampled':  each answer is reviewed by about `k` reviewers; faster
+                members (shorter answer times, see MemberSpeeds) take a
+                larger share of the k * n review slots, at least two
+                answers each so every review is a comparison
+  - 'pairwise': each reviewer compares two answers, paired Swiss-style:
+                answers compared least so far first, each against the
+                answer closest to it in the standings that it has not
+                met yet
+  - 'auto':     'all' up to `full_up_to` members, 'sampled' above
+
+Assignments are made as reviews start (the pipeline starts them one by
+one), always among the least reviewed answers in hand, so late answers
+still get reviewers. The aggregation of the resulting partial rankings
+is in aggregation.py.
+"""
+import random
+import threading
+from aggregation import ranked_indices
+
+MODES = ('all', 'sampled', 'pairwise', 'auto')
+
+
+class MemberSpeeds:
+    """Moving average of each member's answer time, shared across sessions"""
+
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self._seconds = {}
+        self._lock = threading.Lock()
+
+    def observe(self, member_id, seconds):
+        with self._lock:
+            previous = self._seconds.get(member_id)
+            self._seconds[member_id] = seconds if previous is None else previous + self.alpha * (seconds - previous)
+
+    def weights(self, member_ids):
+        """Relative speed per member (1/seconds); members not measured yet get the mean"""
+        with self._lock:
+            known = {m: 1 / self._seconds[m] for m in member_ids if self._seconds.get(m)}
+        default = sum(known.values()) / len(known) if known else 1.0
+        return {m: known.get(m, default) for m in member_ids}
+
+    def stats(self):
+        with self._lock:
+            return dict(self._seconds)
+
+
+class ReviewPlan:
+    """Review assignments of one session
+
+    `reviewers` are the member ids expected to review and `expected` the
+    number of answers the session expects (both size the quotas). Used
+    from the session's orchestration loop only, so it is not locked.
+    """
+
+    def __init__(self, mode, reviewers, expected, k=3, weights=None, full_up_to=5, rng=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown review plan {mode!r}")
+        if mode == 'auto':
+            mode = 'all' if len(reviewers) <= full_up_to else 'sampled'
+        self.mode = mode
+        self.k = k
+        self.rng = rng or random.Random()
+        self.planned = {}    # answer index -> reviews assigned
+        self.met = set()     # answer index pairs assigned to the same review
+        self.wins = {}       # answer index -> pairwise wins in the reviews received
+        self.quotas = self._quotas(reviewers, k * expected, weights or {})
+
+    @staticmethod
+    def _quotas(reviewers, slots, weights):
+        """Split `slots` reviews by weight (largest remainders), at least two per reviewer"""
+        total = sum(weights.get(r, 1.0) for r in reviewers) or 1.0
+        shares = {r: slots * weights.get(r, 1.0) / total for r in reviewers}
+        quotas = {r: int(share) for r, share in shares.items()}
+        for r in sorted(reviewers, key=lambda r: quotas[r] - shares[r])[:slots - sum(quotas.values())]:
+            quotas[r] += 1
+        return {r: max(2, n) for r, n in quotas.items()}
+
+    def _count(self, indices):
+        for idx in indices:
+            self.planned[idx] = self.planned.get(idx, 0) + 1
+        for pos, a in enumerate(indices):
+            for b in indices[pos + 1:]:
+                self.met.add(frozenset((a, b)))
+
+    def _least_reviewed(self, candidates):
+        # Shuffled first so ties do not always go to the first answers
+        candidates = list(candidates)
+        self.rng.shuffle(candidates)
+        return sorted(candidates, key=lambda idx: self.planned.get(idx, 0))
+
+    def assign(self, member_id, answers):
+        """Indices of the answers in hand `member_id` reviews (never its own)"""
+        candidates = [idx for idx, ans in enumerate(answers) if ans['member_id'] != member_id]
+        if self.mode == 'all' or len(candidates) <= 2:
+            chosen = candidates
+        elif self.mode == 'sampled':
+            chosen = sorted(self._least_reviewed(candidates)[:self.quotas.get(member_id, self.k)])
+        else:
+            chosen = self._pair(candidates)
+        self._count(chosen)
+        return chosen
+
+    def _pair(self, candidates):
+        first = self._least_reviewed(candidates)[0]
+        others = [idx for idx in candidates if idx != first]
+        fresh = [idx for idx in others if frozenset((first, idx)) not in self.met] or others
+        standing = self.wins.get(first, 0)
+        rivals = self._least_reviewed(fresh)
+        second = min(rivals, key=lambda idx: abs(self.wins.get(idx, 0) - standing))
+        return sorted((first, second))
+
+    def add(self, review, n_answers):
+        """Count a review already done (e.g. of a resumed session) as planned"""
+        self._count(ranked_indices(review, n_answers))
+        self.observe(review, n_answers)
+
+    def observe(self, review, n_answers):
+        """Update the standings the pairwise mode pairs answers by"""
+        ranking = ranked_indices(review, n_answers)
+        for pos, idx in enumerate(ranking):
+            self.wins[idx] = self.wins.get(idx, 0) + len(ranking) - 1 - pos
+
+    def summary(self, answers):
+        return {
+            'mode': self.mode,
+            'k': self.k if self.mode == 'sampled' else None,
+            'reviews_per_answer': {ans['member_id']: self.planned.get(idx, 0) for idx, ans in enumerate(answers)},
+            'pairs_compared': len(self.met)
+        }
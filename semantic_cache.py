@@ -0,0 +1,154 @@
+import threading
+import numpy as np
+from ollama_client import SESSION
+
+
+def embed(host, model, text, timeout=30):
+    """Embed `text` with Ollama's local embeddings endpoint"""
+    response = SESSION.post(
+        f"{host}/api/embeddings",
+        json={'model': model, 'prompt': text},
+        timeout=timeout
+    )
+    response.raise_for_status()
+    return np.asarray(response.json()['embedding'], dtype=np.float32)
+
+
+class SemanticCache:
+    """In-process vector index over completed council sessions
+
+    Lookups are a brute-force cosine similarity over all stored query
+    embeddings. Once the cache holds more than `approx_threshold` entries,
+    candidates are first narrowed with random-hyperplane LSH buckets (an
+    approximate index) and only those are scored. Oldest entries are
+    dropped beyond `max_entries`.
+
+    Each entry also records the council that produced it (e.g. its member
+    and chairman models): a lookup only matches entries of the same
+    council, so a changed council does not get the old one's results.
+    """
+
+    HISTOGRAM_BINS = 10
+
+    def __init__(self, threshold=0.92, max_entries=5000, approx_threshold=None, lsh_bits=12):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.approx_threshold = approx_threshold
+        self.lsh_bits = lsh_bits
+        self.vectors = None  # (n, dim) unit vectors
+        self.results = []
+        self.queries = []
+        self.councils = None  # (n,) council number of each entry
+        self._council_ids = {}
+        self.hits = 0
+        self.misses = 0
+        self.similarity_histogram = [0] * self.HISTOGRAM_BINS
+        self._planes = None
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector):
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _bucket(self, vector):
+        bits = ((self._planes @ vector) > 0).astype(np.int64)
+        return int(bits @ (1 << np.arange(self.lsh_bits, dtype=np.int64)))
+
+    def _use_approx(self):
+        return self.approx_threshold is not None and len(self.results) > self.approx_threshold
+
+    def _rebuild_buckets(self):
+        self._buckets = {}
+        if self._planes is None:
+            return
+        for idx, vector in enumerate(self.vectors):
+            self._buckets.setdefault(self._bucket(vector), []).append(idx)
+
+    def _council_id(self, council):
+        return self._council_ids.setdefault(council, len(self._council_ids))
+
+    def lookup(self, vector, council=None):
+        """Return (result, query, similarity) of the best match above the threshold, else None"""
+        vector = self._normalize(vector)
+        with self._lock:
+            best = -1.0
+            best_idx = None
+            if self.vectors is not None and self.vectors.shape[1] == vector.shape[0]:
+                same = self.councils == self._council_id(council)
+                if self._use_approx():
+                    candidates = [idx for idx in self._buckets.get(self._bucket(vector), []) if same[idx]]
+                else:
+                    candidates = None
+                if candidates is None:
+                    if same.any():
+                        similarities = np.where(same, self.vectors @ vector, -np.inf)
+                        best_idx = int(np.argmax(similarities))
+                        best = float(similarities[best_idx])
+                elif candidates:
+                    similarities = self.vectors[candidates] @ vector
+                    pos = int(np.argmax(similarities))
+                    best_idx = candidates[pos]
+                    best = float(similarities[pos])
+
+            if best_idx is not None:
+                bin_idx = min(int(max(best, 0.0) * self.HISTOGRAM_BINS), self.HISTOGRAM_BINS - 1)
+                self.similarity_histogram[bin_idx] += 1
+
+            if best_idx is not None and best >= self.threshold:
+                self.hits += 1
+                return self.results[best_idx], self.queries[best_idx], best
+            self.misses += 1
+            return None
+
+    def add(self, vector, query, result, council=None):
+        """Index a completed session under its query embedding and the council that ran it"""
+        vector = self._normalize(vector)[np.newaxis, :]
+        with self._lock:
+            council_id = np.array([self._council_id(council)], dtype=np.int32)
+            if self.vectors is None or self.vectors.shape[1] != vector.shape[1]:
+                self.vectors = vector
+                self.results = [result]
+                self.queries = [query]
+                self.councils = council_id
+                self._planes = None
+                self._buckets = {}
+            else:
+                self.vectors = np.vstack([self.vectors, vector])
+                self.results.append(result)
+                self.queries.append(query)
+                self.councils = np.concatenate([self.councils, council_id])
+
+            overflow = len(self.results) - self.max_entries
+            if overflow > 0:
+                self.vectors = self.vectors[overflow:]
+                self.results = self.results[overflow:]
+                self.queries = self.queries[overflow:]
+                self.councils = self.councils[overflow:]
+
+            if self.approx_threshold is not None:
+                if self._planes is None:
+                    rng = np.random.default_rng(0)
+                    self._planes = rng.standard_normal((self.lsh_bits, vector.shape[1])).astype(np.float32)
+                if overflow > 0:
+                    self._rebuild_buckets()
+                else:
+                    idx = len(self.results) - 1
+                    self._buckets.setdefault(self._bucket(self.vectors[idx]), []).append(idx)
+
+    def stats(self):
+        """Counters for /health_check"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.results),
+            'threshold': self.threshold,
+            'approximate': self._use_approx(),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'similarity_histogram': {
+                f"{i / self.HISTOGRAM_BINS:.1f}-{(i + 1) / self.HISTOGRAM_BINS:.1f}": count
+                for i, count in enumerate(self.similarity_histogram)
+            }
+        }
@@ -0,0 +1,207 @@
+"""Production launcher for the frontend, a council member or the chairman
+
+Usage:
+    python serve.py frontend [--port 8080] [--threads 32] [--drain-timeout 120]
+    python serve.py member    # configured by the same environment as council_member.py
+    python serve.py chairman  # configured by the same environment as chairman.py
+
+`python app.py` and friends run Flask's debug server with its reloader;
+this runs a role without them. With gunicorn installed (pip install
+gunicorn, not available on Windows) the role is served by a gunicorn
+gthread worker, otherwise by Werkzeug's threaded server. Either way:
+
+  - one process per role, with --threads request threads. A role's
+    state is in-process (member registry, admission queue, sessions,
+    blob and context stores, the /events channel), so more processes
+    would split it; concurrency comes from threads, while the
+    generations themselves run in Ollama
+  - on the frontend, every open /events stream (one per browser tab)
+    and every streamed query holds a thread for as long as it lasts.
+    /events is capped at config.MAX_EVENT_STREAMS (pages beyond it poll
+    instead), so size --threads as MAX_EVENT_STREAMS + the streamed
+    queries expected at once + a few for short requests
+  - the libraries are imported before the worker starts, the service
+    (which opens its caches and starts its threads) only in the worker
+  - HTTP keep-alive pools are per node and shared by every request
+    thread of the process (backends.py, ollama_client.py)
+  - SIGTERM (or Ctrl+C without gunicorn) drains: the role stops taking
+    new work (503), a member deregisters, the chairman reports itself
+    draining, and requests and councils in flight get up to
+    --drain-timeout seconds to finish
+"""
+import argparse
+import importlib
+import os
+import signal
+import sys
+import threading
+import time
+
+# Role -> (module, default port)
+ROLES = {
+    'frontend': ('app', lambda: importlib.import_module('config').FRONTEND_PORT),
+    'member': ('council_member', lambda: int(os.getenv('PORT', 5001))),
+    'chairman': ('chairman', lambda: int(os.getenv('PORT', 5000)))
+}
+
+# Imported once before the worker starts, so a worker (re)spawn only
+# imports the service's own modules
+PRELOAD = ('flask', 'flask_cors', 'requests', 'werkzeug.serving')
+
+
+class RequestCounter:
+    """WSGI middleware counting the requests whose response is not fully sent yet"""
+
+    def __init__(self, app):
+        self.app = app
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def _track(self, delta):
+        with self._lock:
+            self.active += delta
+
+    def __call__(self, environ, start_response):
+        from werkzeug.wsgi import ClosingIterator
+        self._track(1)
+        try:
+            body = self.app(environ, start_response)
+        except BaseException:
+            self._track(-1)
+            raise
+        return ClosingIterator(body, lambda: self._track(-1))
+
+
+def preload(role):
+    for name in PRELOAD:
+        importlib.import_module(name)
+    if role == 'frontend' and importlib.import_module('config').SEMANTIC_CACHE_ENABLED:
+        importlib.import_module('numpy')
+
+
+def drain(service, counter, deadline):
+    """Wait (until `deadline`) for the requests and councils in flight; True if none are left"""
+    while time.time() < deadline:
+        if counter.active == 0 and service.in_flight() == 0:
+            return True
+        time.sleep(0.2)
+    print(f"✗ Drain timed out with {counter.active} request(s) and {service.in_flight()} generation(s) in flight")
+    return False
+
+
+def run_gunicorn(module, port, args):
+    from gunicorn.app.base import BaseApplication
+    state = {}
+
+    def post_worker_init(worker):
+        service = sys.modules[module]
+        service.start_background_tasks()
+        # gunicorn's own handler stops accepting and waits for the request
+        # threads; begin_drain first so new work is refused meanwhile
+        handle_exit = signal.getsignal(signal.SIGTERM)
+
+        def on_term(signum, frame):
+            if 'deadline' not in state:
+                state['deadline'] = time.time() + args.drain_timeout - 1
+                print(f"Draining (up to {args.drain_timeout:.0f}s)...")
+                service.begin_drain()
+            handle_exit(signum, frame)
+        signal.signal(signal.SIGTERM, on_term)
+
+    def worker_exit(server, worker):
+        # Background councils (sessions, batches) run outside the request threads
+        if 'deadline' in state and drain(sys.modules[module], state['counter'], state['deadline']):
+            print("✓ Drained")
+
+    class Application(BaseApplication):
+        def load_config(self):
+            options = {
+                'bind': f"{args.host}:{port}",
+                'workers': 1,
+                'worker_class': 'gthread',
+                'threads': args.threads,
+                'graceful_timeout': int(args.drain_timeout),
+                'keepalive': 5,
+                'preload_app': False,
+                'post_worker_init': post_worker_init,
+                'worker_exit': worker_exit,
+                # Newer gunicorns open a control socket at one fixed path per
+                # user, which several roles on one box would fight over
+                'control_socket_disable': True
+            }
+            for key, value in options.items():
+                if key in self.cfg.settings:
+                    self.cfg.set(key, value)
+
+        def load(self):
+            state['counter'] = RequestCounter(importlib.import_module(module).app)
+            return state['counter']
+
+    Application().run()
+
+
+def run_werkzeug(module, port, args):
+    from werkzeug.serving import make_server
+    service = importlib.import_module(module)
+    counter = RequestCounter(service.app)
+    server = make_server(args.host, port, counter, threaded=True)
+    service.start_background_tasks()
+    deadline = []
+
+    def on_signal(signum, frame):
+        if deadline:
+            return
+        deadline.append(time.time() + args.drain_timeout)
+        print(f"Draining (up to {args.drain_timeout:.0f}s)...")
+        service.begin_drain()
+        # shutdown() waits for serve_forever() to return, so not from its thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+
+    print(f"Serving on http://{args.host}:{port} (Werkzeug, threaded; install gunicorn for a gthread worker)")
+    server.serve_forever()
+    if drain(service, counter, deadline[0]):
+        print("✓ Drained")
+    server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a council role without the debug server")
+    parser.add_argument('role', choices=sorted(ROLES))
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=None, help="defaults to the role's configured port")
+    parser.add_argument('--threads', type=int, default=32, help="request threads (gunicorn); on the frontend, above MAX_EVENT_STREAMS")
+    parser.add_argument('--drain-timeout', type=float, default=120,
+                        help="seconds in-flight work gets to finish on shutdown")
+    parser.add_argument('--server', choices=('auto', 'gunicorn', 'werkzeug'), default='auto')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    module, default_port = ROLES[args.role]
+    port = args.port or default_port()
+    if args.role != 'frontend':
+        # The node advertises this port when it registers / heartbeats
+        os.environ['PORT'] = str(port)
+    preload(args.role)
+    if args.role == 'frontend':
+        streams = importlib.import_module('config').MAX_EVENT_STREAMS
+        if args.threads <= streams:
+            print(f"⚠ --threads {args.threads} leaves no thread for queries once "
+                  f"{streams} /events streams (MAX_EVENT_STREAMS) are open")
+
+    server = args.server
+    if server == 'auto':
+        try:
+            importlib.import_module('gunicorn')
+            server = 'gunicorn'
+        except ImportError:
+            server = 'werkzeug'
+    if server == 'gunicorn':
+        run_gunicorn(module, port, args)
+    else:
+        run_werkzeug(module, port, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Append-only record of council sessions, so work survives a restart
+
+Every session gets an id and a JSONL file in the store's directory. The
+frontend appends one line per event as it happens:
+
+    {"event": "created", "query": ..., "options": {...}}
+    {"event": "stage", "stage": 2}
+    {"event": "answer", "data": {...}}      (in the order answers are used)
+    {"event": "review", "data": {...}}
+    {"event": "synthesis", "data": {...}}
+    {"event": "complete", "result": {...}}  or  {"event": "error", ...}
+    {"event": "resumed"}
+
+Replaying the file gives the session's state: its completed answers and
+reviews are what a resumed run starts from instead of regenerating them.
+"""
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+ID_PATTERN = r'[A-Za-z0-9_-]+'
+
+
+def replay(records):
+    """Session state from its records, oldest first"""
+    state = {
+        'query': None,
+        'options': {},
+        'status': 'running',
+        'stage': 0,
+        'answers': [],
+        'reviews': [],
+        'synthesis': None,
+        'result': None,
+        'error': None,
+        'created': None,
+        'updated': None
+    }
+    for record in records:
+        event = record.get('event')
+        state['updated'] = record.get('time')
+        if event == 'created':
+            state.update(query=record.get('query'), options=record.get('options', {}), created=record.get('time'))
+        elif event == 'stage':
+            state['stage'] = record.get('stage', state['stage'])
+        elif event == 'answer':
+            state['answers'].append(record['data'])
+        elif event == 'review':
+            state['reviews'].append(record['data'])
+        elif event == 'synthesis':
+            state['synthesis'] = record['data']
+        elif event == 'complete':
+            state.update(status='complete', result=record.get('result'), error=None)
+        elif event == 'error':
+            state.update(status='error', error=record.get('error'))
+        elif event == 'resumed':
+            state.update(status='running', error=None)
+    return state
+
+
+class SessionStore:
+    """One append-only JSONL file per session under `directory`"""
+
+    def __init__(self, directory, max_age=None):
+        self.directory = directory
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        if max_age:
+            self.prune()
+
+    def _path(self, session_id):
+        if not re.fullmatch(ID_PATTERN, session_id):
+            raise ValueError('Invalid session id')
+        return os.path.join(self.directory, f"{session_id}.jsonl")
+
+    def create(self, query, **options):
+        """Start a session record; returns its id"""
+        session_id = uuid.uuid4().hex[:12]
+        self.append(session_id, 'created', query=query, options=options)
+        return session_id
+
+    def append(self, session_id, event, **fields):
+        record = dict(fields, event=event, time=time.time())
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            with open(self._path(session_id), 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def recorder(self, session_id):
+        """Callable(event, **fields) appending to one session"""
+        return lambda event, **fields: self.append(session_id, event, **fields)
+
+    def load(self, session_id):
+        """Replayed state of a session, or None if it does not exist"""
+        try:
+            path = self._path(session_id)
+        except ValueError:
+            return None
+        if not os.path.exists(path):
+            return None
+        records = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue  # torn last line from a crash
+        return dict(replay(records), session_id=session_id)
+
+    def prune(self):
+        """Delete sessions not written to for `max_age` seconds"""
+        cutoff = time.time() - self.max_age
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.jsonl') and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        return removed
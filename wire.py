@@ -0,0 +1,127 @@
+"""Compact request bodies between the frontend and remote nodes
+
+Answers are the bulk of /review and /synthesize payloads and the same
+texts go to several nodes, so they travel by reference: each answer
+object carries 'answer_ref' (the SHA-256 of its text) instead of
+'answer', and the payload's 'blobs' maps the hashes the receiver may not
+have yet to their texts. Nodes keep received texts for about a session's
+lifetime; a node missing a referenced text answers 409 with the list of
+'missing' hashes and the frontend re-sends just those.
+
+Large bodies are also gzip-compressed (Content-Encoding: gzip).
+"""
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class MissingBlobs(Exception):
+    """Raised when a payload references texts the node does not have"""
+
+    def __init__(self, missing):
+        self.missing = missing
+        super().__init__(f"Missing {len(missing)} referenced text(s)")
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class BlobStore:
+    """Values by content hash, LRU-bounded and expiring after `ttl` seconds"""
+
+    def __init__(self, max_entries=2000, ttl=1800):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._items = OrderedDict()  # hash -> (value, stored at)
+        self._lock = threading.Lock()
+
+    def add(self, key, value):
+        with self._lock:
+            self._items[key] = (value, time.time())
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if time.time() - item[1] > self.ttl:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item[0]
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._items), 'max_entries': self.max_entries, 'ttl': self.ttl}
+
+
+def pack_answers(payload, sent, include=()):
+    """Replace answer texts by references, inlining those not in `sent`
+
+    `sent` holds the hashes the receiving node already got; hashes in
+    `include` are inlined regardless (the node reported them missing).
+    Returns the packed payload and the hashes it inlines.
+    """
+    if not payload.get('answers'):
+        return payload, []
+    answers = []
+    blobs = {}
+    for answer in payload['answers']:
+        text = answer.get('answer')
+        if not text:
+            answers.append(answer)
+            continue
+        key = content_hash(text)
+        if key in include or key not in sent:
+            blobs[key] = text
+        answers.append(dict({k: v for k, v in answer.items() if k != 'answer'}, answer_ref=key))
+    return dict(payload, answers=answers, blobs=blobs), list(blobs)
+
+
+def unpack_answers(payload, store):
+    """Resolve 'answer_ref's in place from the payload's blobs and `store`
+
+    Raises MissingBlobs with every hash that could not be resolved.
+    """
+    for key, text in (payload.pop('blobs', None) or {}).items():
+        store.add(key, text)
+    missing = []
+    for answer in payload.get('answers', []):
+        key = answer.pop('answer_ref', None)
+        if key is None:
+            continue
+        text = store.get(key)
+        if text is None:
+            missing.append(key)
+        else:
+            answer['answer'] = text
+    if missing:
+        raise MissingBlobs(missing)
+    return payload
+
+
+def encode_json(payload, compress_min_bytes=None):
+    """JSON request body and headers, gzipped above `compress_min_bytes`"""
+    body = json.dumps(payload).encode('utf-8')
+    headers = {'Content-Type': 'application/json'}
+    if compress_min_bytes is not None and len(body) >= compress_min_bytes:
+        body = gzip.compress(body, compresslevel=5)
+        headers['Content-Encoding'] = 'gzip'
+    return body, headers
+
+
+def read_json(request):
+    """Body of a Flask request as JSON, gunzipping it if needed"""
+    if request.headers.get('Content-Encoding') == 'gzip':
+        return json.loads(gzip.decompress(request.get_data()))
+    return request.get_json(silent=True)